@@ -1,15 +1,37 @@
-from fastapi import FastAPI, Header
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 import uvicorn
 from mangum import Mangum
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Literal, Optional
-import anyio
-from .core.retriever_pipeline import get_rag_pipeline
+from typing import Any, Dict, List, Literal, Optional
+import json
+import time
+from .config import (
+    MAX_CONCURRENT_REQUESTS, BATCH_MAX_QUESTIONS, ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_QUEUE_WAIT_SECONDS, ADMISSION_RETRY_AFTER_SECONDS,
+)
+from .core.admission import AdmissionController, Overloaded
+from .core.cached_embeddings import CachedQueryEmbeddings
+from .core.filters import normalize_where
+from .core.assets import assets_base_url, context_payload, decode_image, image_media_type
+from .core.batch_pipeline import astream_batch_answers
+from .core.metrics import REQUEST_SECONDS, render_prometheus, server_timing_header, start_request_timings
+from .core.retriever_pipeline import get_rag_components
+from .core.semantic_cache import get_semantic_cache
+from .core.singleflight import SingleFlight, normalize_key
+from .core.streaming import astream_answer, choose_stream_format, format_event, NDJSON_MEDIA_TYPE
 from contextlib import asynccontextmanager
 
 class QueryRequest(BaseModel):
     question: str
+    # Filtro de proveniência (sintaxe where do Chroma): modality, department, year, source, page
+    filters: Optional[Dict[str, Any]] = None
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    filters: Optional[Dict[str, Any]] = None
 
 class Message(BaseModel):
     role: Literal["system", "user", "assistant"]
@@ -17,11 +39,19 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[Message]
+    filters: Optional[Dict[str, Any]] = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # instancia uma única vez por processo/worker
-    app.state.pipeline = get_rag_pipeline(force_regenerate=False)
+    app.state.components = get_rag_components(force_regenerate=False)
+    app.state.pipeline = app.state.components.chain
+    # Admissão: limite de perguntas simultâneas + fila limitada (falha rápido se saturar)
+    app.state.admission = AdmissionController(
+        MAX_CONCURRENT_REQUESTS, ADMISSION_MAX_QUEUE,
+        ADMISSION_MAX_QUEUE_WAIT_SECONDS, ADMISSION_RETRY_AFTER_SECONDS,
+    )
+    app.state.singleflight = SingleFlight()
     yield
 
 
@@ -38,58 +68,180 @@ app.add_middleware(
 )
 
 
-@app.post("/ask")
-async def ask_question(req: QueryRequest, include_context: Optional[str] = Header(default="true")):
-    pipeline = app.state.pipeline
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Coleta os tempos por etapa da requisição e devolve no header Server-Timing."""
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(elapsed, getattr(route, "path", "unmatched"))
+    timings["app"] = elapsed
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": "Servidor sobrecarregado, tente novamente.", "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _should_include_context(include_context):
+    return include_context.lower() in ("true", "1", "yes")
+
+
+def _filters(raw):
+    """Filtro validado e normalizado (ou None); 400 se inválido ou se o índice não tem o campo."""
+    retriever = getattr(getattr(app.state, "components", None), "retriever", None)
+    try:
+        return normalize_where(raw, getattr(retriever, "filter_fields", None))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _ask_payload(req):
     question = f"Pergunta: {req.question}"
+    filters = _filters(req.filters)
+    return {"question": question, "filters": filters} if filters else question
+
+
+def _chat_payload(messages, filters=None):
+    """Separa o histórico (system/user) da última mensagem e monta a entrada do pipeline."""
+    history = []
+    for m in messages[:-1]:
+        if m.role in ("system", "user"):
+            history.append(f"{m.role}: {m.content}")
+    historico_str = "\n".join(history) if history else None
+
+    question = messages[-1].content
+    payload = {"question": f"Pergunta: {question}", "history": historico_str}
+    filters = _filters(filters)
+    if filters:
+        payload["filters"] = filters
+    return payload
+
+
+async def _invoke_pipeline(payload):
+    """
+    ainvoke com limite de concorrência. Perguntas idênticas (mesma pergunta
+    normalizada e mesmo histórico) simultâneas compartilham uma única execução.
+    """
+    if isinstance(payload, dict):
+        key = normalize_key(payload["question"], payload.get("history"), payload.get("filters"))
+    else:
+        key = normalize_key(payload)
+
+    async def run():
+        async with app.state.admission.admit():
+            return await app.state.pipeline.ainvoke(payload)
+
+    return await app.state.singleflight.do(key, run)
+
+
+async def _streaming_response(request, payload, include_context, accept):
+    """
+    Resposta em streaming (SSE ou JSON lines): contexto primeiro, depois tokens.
+
+    Atrás do Mangum (Lambda + API Gateway REST) não há response streaming:
+    o corpo é acumulado e entregue de uma vez, no mesmo formato de eventos.
+    """
+    pipeline = app.state.pipeline
+    media_type = choose_stream_format(accept)
+    # Admissão antes de enviar os headers, para poder responder 429/503
+    permit = await app.state.admission.acquire()
+
+    async def event_stream():
+        try:
+            async for event, data in astream_answer(pipeline, payload, include_context, assets_base_url(request.scope)):
+                yield format_event(event, data, media_type)
+        except Exception as e:
+            print(f"Error while streaming: {type(e).__name__}: {str(e)}")
+            yield format_event("error", {"error": type(e).__name__}, media_type)
+        finally:
+            permit.release()
 
-    # .invoke é bloqueante: manda pra thread pool
-    resp = await anyio.to_thread.run_sync(pipeline.invoke, question)
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Garante a liberação mesmo se o cliente desconectar antes do primeiro chunk
+        background=BackgroundTask(permit.release),
+    )
+
+
+@app.post("/ask")
+async def ask_question(req: QueryRequest, request: Request, include_context: Optional[str] = Header(default="true")):
+    resp = await _invoke_pipeline(_ask_payload(req))
     
     # Check if context should be included (default: true)
-    should_include_context = include_context.lower() in ("true", "1", "yes")
+    should_include_context = _should_include_context(include_context)
     
     result = {"response": resp["response"]}
     if should_include_context:
-        result["context"] = {
-            "texts": resp["context"]["texts"],
-            "images": resp["context"]["images"],
-        }
+        result["context"] = context_payload(resp["context"], assets_base_url(request.scope))
     
     return result
 
 
+@app.post("/ask/stream")
+async def ask_question_stream(
+    req: QueryRequest,
+    request: Request,
+    include_context: Optional[str] = Header(default="true"),
+    accept: Optional[str] = Header(default=None),
+):
+    return await _streaming_response(request, _ask_payload(req), _should_include_context(include_context), accept)
+
+
+@app.post("/ask/batch")
+async def ask_batch(req: BatchRequest, request: Request, include_context: Optional[str] = Header(default="false")):
+    """
+    Várias perguntas numa requisição: embedding e busca em lote, geração em
+    paralelo limitada (BATCH_CONCURRENCY). Responde em JSON lines, na ordem
+    em que as respostas ficam prontas (use o campo ``index``).
+    """
+    if len(req.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {BATCH_MAX_QUESTIONS} perguntas por lote.")
+    filters = _filters(req.filters)
+    # O lote inteiro ocupa uma vaga da admissão; a geração interna é limitada por BATCH_CONCURRENCY
+    permit = await app.state.admission.acquire()
+
+    async def lines():
+        try:
+            async for result in astream_batch_answers(
+                app.state.components, req.questions,
+                include_context=_should_include_context(include_context), filters=filters,
+                assets_base_url=assets_base_url(request.scope),
+            ):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"Error in /ask/batch: {type(e).__name__}: {str(e)}")
+            yield json.dumps({"error": type(e).__name__}) + "\n"
+        finally:
+            permit.release()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, background=BackgroundTask(permit.release))
+
+
 # --- Novo endpoint /chat ---
 
 @app.post("/chat")
-async def chat(req: ChatRequest, include_context: Optional[str] = Header(default="true")):
+async def chat(req: ChatRequest, request: Request, include_context: Optional[str] = Header(default="true")):
     try:
-        pipeline = app.state.pipeline
-        # Separa histórico e pergunta atual
-        history = []
-        for m in req.messages[:-1]:
-            if m.role in ("system", "user"):
-                history.append(f"{m.role}: {m.content}")
-        historico_str = "\n".join(history) if history else None
-        
-        ultima_msg = req.messages[-1]
-        question = ultima_msg.content
-        
         # Envia pergunta e histórico separadamente para o pipeline
-        resp = await anyio.to_thread.run_sync(
-            pipeline.invoke, 
-            {"question": f"Pergunta: {question}", "history": historico_str}
-        )
+        resp = await _invoke_pipeline(_chat_payload(req.messages, req.filters))
         
         # Check if context should be included (default: true)
-        should_include_context = include_context.lower() in ("true", "1", "yes")
+        should_include_context = _should_include_context(include_context)
         
         result = {"response": resp["response"]}
         if should_include_context:
-            result["context"] = {
-                "texts": resp["context"]["texts"],
-                "images": resp["context"]["images"],
-            }
+            result["context"] = context_payload(resp["context"], assets_base_url(request.scope))
         
         return result
     except Exception as e:
@@ -97,10 +249,86 @@ async def chat(req: ChatRequest, include_context: Optional[str] = Header(default
         raise
 
 
+@app.post("/chat/stream")
+async def chat_stream(
+    req: ChatRequest,
+    request: Request,
+    include_context: Optional[str] = Header(default="true"),
+    accept: Optional[str] = Header(default=None),
+):
+    return await _streaming_response(request, _chat_payload(req.messages, req.filters), _should_include_context(include_context), accept)
+
+
+@app.get("/assets/{doc_id}")
+async def get_asset(doc_id: str, if_none_match: Optional[str] = Header(default=None)):
+    """
+    Bytes originais de uma imagem do contexto. O doc_id é gerado na indexação
+    e nunca reaproveitado, então o conteúdo é imutável e serve de ETag.
+    """
+    etag = f'"{doc_id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    value = (await app.state.components.retriever.docstore.amget([doc_id]))[0]
+    data = decode_image(value)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Imagem não encontrada.")
+    return Response(content=data, media_type=image_media_type(data), headers=headers)
+
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
+
+def _stats_metric_lines():
+    """Contadores do cache semântico e do single-flight no formato Prometheus."""
+    cache = get_semantic_cache().stats()
+    flight = app.state.singleflight.stats()
+    admission = app.state.admission.stats()
+    metrics = [
+        ("rag_admission_in_flight", "gauge", admission["in_flight"]),
+        ("rag_admission_queue_depth", "gauge", admission["queue_depth"]),
+        ("rag_admission_admitted_total", "counter", admission["admitted"]),
+        ("rag_semantic_cache_hits_total", "counter", cache["hits"]),
+        ("rag_semantic_cache_misses_total", "counter", cache["misses"]),
+        ("rag_semantic_cache_entries", "gauge", cache["entries"]),
+        ("rag_singleflight_calls_total", "counter", flight["calls"]),
+        ("rag_singleflight_executions_total", "counter", flight["executions"]),
+        ("rag_singleflight_collapse_ratio", "gauge", flight["collapse_ratio"]),
+        ("rag_singleflight_in_flight", "gauge", flight["in_flight"]),
+    ]
+    lines = []
+    for name, kind, value in metrics:
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    lines.append("# TYPE rag_admission_rejected_total counter")
+    for reason, count in admission["rejected"].items():
+        lines.append(f'rag_admission_rejected_total{{reason="{reason}"}} {count}')
+    return lines
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_prometheus(_stats_metric_lines()), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "semantic_cache": get_semantic_cache().stats(),
+        "singleflight": app.state.singleflight.stats(),
+        "admission": app.state.admission.stats(),
+        "query_embedding_cache": _query_embedding_cache_stats(),
+    }
+
+
+def _query_embedding_cache_stats():
+    vectorstore = getattr(app.state.components.retriever, "vectorstore", None)
+    embeddings = getattr(vectorstore, "embeddings", None)
+    return embeddings.stats() if isinstance(embeddings, CachedQueryEmbeddings) else None
+
 if __name__ == "__main__":
     # Run this as a server directly.
     port = 8000
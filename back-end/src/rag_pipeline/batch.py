@@ -0,0 +1,83 @@
+"""
+Perguntas em lote pela linha de comando (QA noturno, atualização de FAQ).
+
+Uso:
+    python -m rag_pipeline.batch perguntas.json --out respostas.jsonl
+
+A entrada pode ser uma lista JSON de strings, JSON lines com {"question": ...}
+ou um arquivo de texto com uma pergunta por linha. A saída é JSON lines,
+uma resposta por linha, na ordem em que ficam prontas (campo ``index``).
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from .config import BATCH_CONCURRENCY
+from .core.batch_pipeline import astream_batch_answers
+from .core.retriever_pipeline import get_rag_components
+
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return [str(q) for q in json.loads(content)]
+    questions = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            questions.append(json.loads(line)["question"])
+        else:
+            questions.append(line)
+    return questions
+
+
+async def run_batch(components, questions, out, concurrency, chunk_size, include_context, filters=None):
+    done = 0
+    errors = 0
+    for start in range(0, len(questions), chunk_size):
+        chunk = questions[start:start + chunk_size]
+        async for result in astream_batch_answers(components, chunk, concurrency, include_context, filters):
+            result["index"] += start
+            errors += "error" in result
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            done += 1
+        print(f"[batch] {done}/{len(questions)} perguntas respondidas.", file=sys.stderr)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Responde perguntas em lote com a pipeline RAG.")
+    parser.add_argument("input", help="arquivo com as perguntas (JSON, JSON lines ou texto)")
+    parser.add_argument("--out", help="arquivo de saída JSON lines (padrão: stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="chamadas simultâneas ao LLM")
+    parser.add_argument("--chunk-size", type=int, default=256, help="perguntas por lote de recuperação")
+    parser.add_argument("--include-context", action="store_true", help="inclui o contexto recuperado")
+    parser.add_argument("--filters", type=json.loads, help='filtro de proveniência em JSON, ex.: \'{"modality": "table"}\'')
+    args = parser.parse_args()
+
+    questions = load_questions(args.input)
+    print(f"[batch] {len(questions)} perguntas carregadas.", file=sys.stderr)
+    components = get_rag_components(force_regenerate=False)
+
+    start_time = time.time()
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        errors = asyncio.run(
+            run_batch(components, questions, out, args.concurrency, args.chunk_size, args.include_context, args.filters)
+        )
+    finally:
+        if args.out:
+            out.close()
+    elapsed = time.time() - start_time
+    rate = len(questions) / elapsed if elapsed else 0.0
+    print(f"[batch] Concluído em {elapsed:.1f}s ({rate:.2f} perguntas/s, {errors} erros).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -39,15 +39,138 @@ if EMBEDDINGS_PROVIDER not in valid_embedding_providers:
     raise ValueError(f"Invalid EMBEDDINGS_PROVIDER '{EMBEDDINGS_PROVIDER}'. Must be one of: {', '.join(valid_embedding_providers)}")
 
 PDF_DIR = (BASE_DIR / "data_extraction" / "documentos_ufabc").resolve()
+# Cache de chunks classificados: um shard JSONL (+ imagens em binário) por PDF (data/chunk_cache.py).
+# CHUNKS_PATH é o JSON único antigo, migrado na primeira leitura.
+CHUNKS_DIR = Path(os.getenv("CHUNKS_DIR", BASE_DIR / ".cache_chunks" / "chunks")).resolve()
 CHUNKS_PATH = (BASE_DIR / ".cache_chunks" / "chunks_classificados.json").resolve()
 SUMMARIES_PATH = (BASE_DIR / ".cache_chunks" / "summaries.json").resolve()
 CHUNKS_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 PERSIST_DIR = (BASE_DIR / ".cache_chunks" / "chroma_store").resolve()
+# Hash de cada PDF e doc_ids gerados (data/manifest.py), para reindexar só o que mudou
+INDEX_MANIFEST_PATH = PERSIST_DIR / "index_manifest.json"
 PERSIST_DIR.mkdir(parents=True, exist_ok=True)
 
+# Docstore dos originais (core/packed_store.py): "packed" = um arquivo de dados + índice de
+# offsets (com compressão opcional); "files" = LocalFileStore, um arquivo por documento.
+DOCSTORE_BACKEND = os.getenv("DOCSTORE_BACKEND", "packed").lower()
+valid_docstore_backends = ["packed", "files"]
+if DOCSTORE_BACKEND not in valid_docstore_backends:
+    raise ValueError(f"Invalid DOCSTORE_BACKEND '{DOCSTORE_BACKEND}'. Must be one of: {', '.join(valid_docstore_backends)}")
+DOCSTORE_COMPRESSION = os.getenv("DOCSTORE_COMPRESSION", "zlib").lower()
+
+# Índice vetorial mapeado em memória (core/vector_index.py). Com USE_MMAP_INDEX=true e o
+# índice exportado, a API busca direto no mmap: sem copiar o Chroma para /tmp nem abrir SQLite.
+VECTOR_INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", BASE_DIR / ".cache_chunks" / "vector_index")).resolve()
+USE_MMAP_INDEX = os.getenv("USE_MMAP_INDEX", "false").lower() in ("true", "1", "yes")
+MMAP_INDEX_DTYPE = os.getenv("MMAP_INDEX_DTYPE", "float16")
+# Quantização da primeira passada no índice mmap ("none", "int8" ou "binary"); os
+# k * MMAP_INDEX_RESCORE_FACTOR melhores candidatos são reordenados em precisão cheia.
+MMAP_INDEX_QUANTIZATION = os.getenv("MMAP_INDEX_QUANTIZATION", "none").lower()
+MMAP_INDEX_RESCORE_FACTOR = int(os.getenv("MMAP_INDEX_RESCORE_FACTOR", "4"))
+
+# Backend de busca vetorial (core/vector_backends.py): "chroma", "numpy" (índice mmap acima)
+# ou "faiss" (flat, ivf ou hnsw; requer faiss-cpu). Sem VECTORSTORE_BACKEND,
+# USE_MMAP_INDEX=true equivale a "numpy".
+VECTORSTORE_BACKEND = os.getenv("VECTORSTORE_BACKEND", "numpy" if USE_MMAP_INDEX else "chroma").lower()
+valid_vectorstore_backends = ["chroma", "numpy", "faiss"]
+if VECTORSTORE_BACKEND not in valid_vectorstore_backends:
+    raise ValueError(f"Invalid VECTORSTORE_BACKEND '{VECTORSTORE_BACKEND}'. Must be one of: {', '.join(valid_vectorstore_backends)}")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "100"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "10"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+# Cache de embeddings de perguntas (core/cached_embeddings.py). QUERY_EMBEDDING_CACHE_DIR
+# liga a camada em disco (ex.: /tmp/query_embeddings no Lambda); vazio = só memória.
+QUERY_EMBEDDING_CACHE_ENABLED = os.getenv("QUERY_EMBEDDING_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+QUERY_EMBEDDING_CACHE_DIR = os.getenv("QUERY_EMBEDDING_CACHE_DIR", "")
+
+# Recuperação: RETRIEVER_K vizinhos na busca vetorial. Com HYBRID_SEARCH_ENABLED, junta
+# os LEXICAL_K melhores do BM25 (core/lexical_index.py) via reciprocal rank fusion e
+# mantém só os RETRIEVER_TOP_N primeiros no prompt.
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "20"))
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() in ("true", "1", "yes")
+LEXICAL_K = int(os.getenv("LEXICAL_K", "20"))
+RETRIEVER_TOP_N = int(os.getenv("RETRIEVER_TOP_N", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+LEXICAL_INDEX_PATH = Path(os.getenv("LEXICAL_INDEX_PATH", BASE_DIR / ".cache_chunks" / "lexical_index.json")).resolve()
+
+# Reranking com cross-encoder em CPU (core/reranker.py; requer sentence-transformers).
+# Busca RERANKER_CANDIDATES documentos e mantém os RERANKER_TOP_N de maior score.
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() in ("true", "1", "yes")
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANKER_CANDIDATES = int(os.getenv("RERANKER_CANDIDATES", "50"))
+RERANKER_TOP_N = int(os.getenv("RERANKER_TOP_N", "6"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+RERANKER_CACHE_SIZE = int(os.getenv("RERANKER_CACHE_SIZE", "10000"))
+RERANKER_MAX_CHARS = int(os.getenv("RERANKER_MAX_CHARS", "2000"))
+
+# Empacotamento do contexto (core/context_packer.py): remove quase duplicados, diversifica
+# por MMR e preenche até CONTEXT_TOKEN_BUDGET tokens.
+CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() in ("true", "1", "yes")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+
+# Prefixo das URLs de /assets/{doc_id} no contexto (ex.: a rota de um proxy que envia o
+# x-api-key). Vazio: o mesmo prefixo da requisição (estágio do API Gateway, root_path).
+ASSETS_BASE_URL = os.getenv("ASSETS_BASE_URL", "").rstrip("/")
+
 MAX_WORKERS = min(10, os.cpu_count() or 4)
 
+# Sumarização (data/summarization.py): chamadas simultâneas ao modelo por provedor (um Ollama
+# local serializa as gerações; as APIs aguentam mais) e checkpoint dos resumos em SUMMARIES_PATH
+# a cada SUMMARY_CHECKPOINT_EVERY resumos, para retomar uma indexação interrompida.
+SUMMARY_CONCURRENCY = {
+    "ollama": max(1, int(os.getenv("SUMMARY_CONCURRENCY_OLLAMA", "2"))),
+    "openai": max(1, int(os.getenv("SUMMARY_CONCURRENCY_OPENAI", "8"))),
+    "groq": max(1, int(os.getenv("SUMMARY_CONCURRENCY_GROQ", "4"))),
+}
+SUMMARY_CHECKPOINT_EVERY = max(1, int(os.getenv("SUMMARY_CHECKPOINT_EVERY", "10")))
+
+# Ingestão paralela dos PDFs (data/ingestion.py): INGEST_WORKERS processos, cada um com até
+# INGEST_THREADS_PER_WORKER threads de torch/OMP; o resultado de cada PDF fica no seu shard em CHUNKS_DIR.
+INGEST_WORKERS = max(1, int(os.getenv("INGEST_WORKERS", str(min(4, max(1, (os.cpu_count() or 2) // 2))))))
+INGEST_THREADS_PER_WORKER = max(1, int(os.getenv("INGEST_THREADS_PER_WORKER", str(max(1, (os.cpu_count() or 2) // INGEST_WORKERS)))))
+# PDFs com mais páginas que isso são particionados em trechos, em paralelo (0 = não divide)
+INGEST_SPLIT_PAGES = int(os.getenv("INGEST_SPLIT_PAGES", "20"))
+
+# Estratégia do partition_pdf (data/page_strategy.py): "auto" decide por página (fast para páginas
+# só de texto; hi_res para escaneadas, com imagens ou com tabelas), ou força "hi_res"/"fast".
+PDF_STRATEGY = os.getenv("PDF_STRATEGY", "auto").lower()
+valid_pdf_strategies = ["auto", "hi_res", "fast"]
+if PDF_STRATEGY not in valid_pdf_strategies:
+    raise ValueError(f"Invalid PDF_STRATEGY '{PDF_STRATEGY}'. Must be one of: {', '.join(valid_pdf_strategies)}")
+PDF_AUTO_MIN_TEXT_CHARS = int(os.getenv("PDF_AUTO_MIN_TEXT_CHARS", "200"))
+PDF_AUTO_MAX_IMAGE_COVERAGE = float(os.getenv("PDF_AUTO_MAX_IMAGE_COVERAGE", "0.05"))
+PDF_AUTO_MAX_RULINGS = int(os.getenv("PDF_AUTO_MAX_RULINGS", "20"))
+# Segundos por página do hi_res para estimar o tempo economizado quando a extração
+# não mandou nenhuma página para o hi_res (senão vale o custo medido na execução)
+PDF_HI_RES_SECONDS_PER_PAGE = float(os.getenv("PDF_HI_RES_SECONDS_PER_PAGE", "3.0"))
+
+# Máximo de perguntas processadas em paralelo por processo da API.
+# A chain roda com ainvoke (sem thread pool), então o limite é explícito.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))
+
+# Fila de admissão: além de MAX_CONCURRENT_REQUESTS, até ADMISSION_MAX_QUEUE esperam
+# no máximo ADMISSION_MAX_QUEUE_WAIT_SECONDS; o resto recebe 429/503 com Retry-After.
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", "30"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+
+# Lote (/ask/batch e python -m rag_pipeline.batch)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+
+# Cache semântico de respostas (perguntas sem histórico)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+
 WORKER_LAMBDA_NAME = os.environ.get("WORKER_LAMBDA_NAME", None)
 
 def copy_chroma_to_tmp():
@@ -60,7 +183,9 @@ def copy_chroma_to_tmp():
     if len(tmp_contents) == 0:
         print(f"Copying ChromaDB from {PERSIST_DIR} to {dst_chroma_path}")
         os.makedirs(dst_chroma_path, exist_ok=True)
-        shutil.copytree(PERSIST_DIR, dst_chroma_path, dirs_exist_ok=True)
+        # O docstore é só lido, direto de PERSIST_DIR: não precisa ir para /tmp
+        shutil.copytree(PERSIST_DIR, dst_chroma_path, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns("docstore", "docstore.pack*", "index_manifest.json"))
     else:
         print(f"✅ ChromaDB already exists in {dst_chroma_path}")
 
@@ -0,0 +1,97 @@
+"""
+Controle de admissão da API: limite de requisições em andamento e fila
+limitada (tamanho e tempo de espera). Com a fila saturada a API falha
+rápido (429/503 + Retry-After) em vez de acumular requisições até o
+timeout do Lambda.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from .metrics import Histogram, register
+
+QUEUE_WAIT_SECONDS = register(Histogram(
+    "rag_admission_queue_wait_seconds", "Tempo de espera na fila de admissão.",
+))
+
+
+class Overloaded(Exception):
+    """Requisição rejeitada pela admissão. ``status_code``: 429 (fila cheia) ou 503 (espera esgotada)."""
+
+    def __init__(self, reason, status_code, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Permit:
+    """Vaga obtida na admissão. ``release`` é idempotente."""
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight, max_queue, max_queue_wait, retry_after):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+
+    def _reject(self, reason, status_code):
+        self.rejected[reason] += 1
+        raise Overloaded(reason, status_code, self.retry_after)
+
+    async def acquire(self):
+        """Obtém uma vaga ou levanta ``Overloaded``. Libere com ``Permit.release``."""
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._reject("queue_full", 429)
+            self.waiting += 1
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_queue_wait)
+            except asyncio.TimeoutError:
+                self._reject("queue_timeout", 503)
+            finally:
+                self.waiting -= 1
+                QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start)
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        return Permit(self)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self):
+        permit = await self.acquire()
+        try:
+            yield
+        finally:
+            permit.release()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+        }
@@ -0,0 +1,70 @@
+"""Imagens do contexto servidas por referência (/assets/{doc_id}) em vez de base64 inline."""
+import base64
+import binascii
+
+from ..config import ASSETS_BASE_URL
+from .doc_values import decode_value, is_tagged
+
+ASSETS_PATH = "/assets"
+
+
+def assets_base_url(scope):
+    """
+    Prefixo das URLs de imagens visto pelo cliente: ASSETS_BASE_URL ou, atrás do
+    API Gateway, o estágio ("/prod") que o Mangum tira do path; senão o root_path.
+    """
+    if ASSETS_BASE_URL:
+        return ASSETS_BASE_URL
+    event = scope.get("aws.event") or {}
+    path = event.get("path") or ""
+    public_path = (event.get("requestContext") or {}).get("path") or ""
+    if path and public_path.endswith(path):
+        return public_path[:-len(path)].rstrip("/")
+    return scope.get("root_path", "").rstrip("/")
+
+
+def asset_refs(image_ids, base_url=""):
+    return [{"id": doc_id, "url": f"{base_url}{ASSETS_PATH}/{doc_id}"} for doc_id in image_ids if doc_id]
+
+
+def context_payload(context, base_url=""):
+    """Contexto para a resposta da API: textos completos e imagens só como referência (URLs sob ``base_url``)."""
+    payload = {"texts": context["texts"], "images": asset_refs(context.get("image_ids", []), base_url)}
+    if context.get("packing"):
+        payload["packing"] = context["packing"]  # relatório do empacotamento (tokens economizados)
+    return payload
+
+
+def decode_image(value):
+    """Bytes da imagem a partir do valor do docstore. None se não for imagem."""
+    if value is None:
+        return None
+    if is_tagged(value):
+        modality, data = decode_value(value)
+        return data if modality == "image" else None
+    # Valores antigos, sem modalidade: imagem em base64
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return data if image_media_type(data) else None
+
+
+def is_image_document(doc):
+    """Pela modalidade do docstore; documentos antigos, sem ela, pelo conteúdo em base64."""
+    modality = doc.metadata.get("modality")
+    if modality is not None:
+        return modality == "image"
+    return decode_image(doc.page_content) is not None
+
+
+def image_media_type(data):
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
@@ -0,0 +1,53 @@
+"""Respostas em lote: recuperação em lote e geração em paralelo limitada."""
+import asyncio
+
+from ..config import BATCH_CONCURRENCY, CONTEXT_PACKING_ENABLED
+from .assets import context_payload
+from .context_packer import pack_context
+from .metrics import stage_timer
+from .prompt_utils import parse_docs
+
+
+async def astream_batch_answers(components, questions, concurrency=BATCH_CONCURRENCY, include_context=False, filters=None,
+                               assets_base_url=""):
+    """
+    Responde ``questions`` usando as partes de ``get_rag_components``.
+
+    As N perguntas são embedadas numa única chamada, buscadas numa única
+    consulta ao vectorstore e os originais vêm de um único mget. A geração
+    roda com no máximo ``concurrency`` chamadas ao LLM ao mesmo tempo.
+    Gera um dict por pergunta ({index, question, response | error}) na
+    ordem em que ficam prontas; use ``index`` para reordenar.
+    O cache semântico não é usado: o lote sempre reflete a pipeline atual.
+    ``filters`` (proveniência, ver core/filters.py) vale para todas as perguntas.
+    """
+    payloads = [f"Pergunta: {q}" for q in questions]
+    docs_per_question = await components.retriever.abatch_retrieve(payloads, filters=filters)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(i):
+        with stage_timer("parse_docs"):
+            context = parse_docs(docs_per_question[i])
+        if CONTEXT_PACKING_ENABLED:
+            with stage_timer("pack_context"):
+                context = pack_context(context)
+        result = {"index": i, "question": questions[i]}
+        async with semaphore:
+            try:
+                result["response"] = await components.generation.ainvoke(
+                    {"context": context, "question": payloads[i], "history": None}
+                )
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                return result
+        if include_context:
+            result["context"] = context_payload(context, assets_base_url)
+        return result
+
+    tasks = [asyncio.ensure_future(answer(i)) for i in range(len(questions))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
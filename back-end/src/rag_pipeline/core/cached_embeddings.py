@@ -0,0 +1,184 @@
+"""
+Cache de embeddings de perguntas na frente do provedor (Ollama/Nomic).
+
+Cada pergunta custa uma ida ao provedor (50–300 ms). ``CachedQueryEmbeddings``
+guarda os vetores num LRU em memória, indexado pelo texto normalizado, e
+opcionalmente em disco (QUERY_EMBEDDING_CACHE_DIR, ex.: /tmp no Lambda, que
+sobrevive entre invocações quentes). Embeddings de documentos (indexação)
+passam direto.
+
+Também evita o segundo embedding da mesma pergunta numa requisição: o cache
+semântico e o retriever embedam o mesmo texto.
+"""
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .metrics import Counter, register
+
+QUERY_EMBEDDING_CACHE = register(Counter(
+    "rag_query_embedding_cache_total", "Consultas ao cache de embeddings de perguntas.", "result",
+))
+QUERY_EMBEDDING_SECONDS_SAVED = register(Counter(
+    "rag_query_embedding_seconds_saved_total",
+    "Tempo estimado economizado pelo cache (hits x latência média de um miss).",
+))
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    def __init__(self, embeddings, namespace, max_entries=4096, cache_dir=None):
+        self.embeddings = embeddings
+        self.namespace = namespace  # provedor/modelo: vetores de modelos diferentes não se misturam
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self._miss_seconds = 0.0
+
+    def __getattr__(self, name):
+        # Demais atributos (ex.: model, base_url) vêm do cliente original
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.namespace}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return self.cache_dir / f"{key}.f32"
+
+    def _get(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._hit("memory")
+                return vector
+        if self.cache_dir:
+            try:
+                vector = np.fromfile(self._disk_path(key), dtype=np.float32).tolist()
+            except (FileNotFoundError, ValueError):
+                vector = None
+            if vector:
+                self._put_memory(key, vector)
+                with self._lock:
+                    self._hit("disk")
+                return vector
+        return None
+
+    def _hit(self, layer):
+        self.hits[layer] += 1
+        QUERY_EMBEDDING_CACHE.inc(1, f"hit_{layer}")
+        if self.misses:
+            QUERY_EMBEDDING_SECONDS_SAVED.inc(self._miss_seconds / self.misses)
+
+    def _put_memory(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _put(self, key, vector):
+        self._put_memory(key, vector)
+        if self.cache_dir:
+            path = self._disk_path(key)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                np.asarray(vector, dtype=np.float32).tofile(tmp)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"[embeddings_cache] Falha ao gravar em disco: {e}")
+
+    def _record_misses(self, count, seconds):
+        with self._lock:
+            self.misses += count
+            self._miss_seconds += seconds
+        QUERY_EMBEDDING_CACHE.inc(count, "miss")
+
+    def _lookup(self, texts):
+        keys = [self._key(t) for t in texts]
+        vectors = [self._get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        return keys, vectors, missing
+
+    def _fill(self, keys, vectors, missing, computed, seconds):
+        self._record_misses(len(missing), seconds)
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+            self._put(keys[i], vector)
+        return vectors
+
+    # --- Perguntas: com cache ---
+
+    def _embed_many(self, texts):
+        if hasattr(self.embeddings, "embed_queries"):
+            return self.embeddings.embed_queries(texts)
+        if len(texts) == 1:
+            return [self.embeddings.embed_query(texts[0])]
+        return self.embeddings.embed_documents(texts)
+
+    async def _aembed_many(self, texts):
+        if hasattr(self.embeddings, "aembed_queries"):
+            return await self.embeddings.aembed_queries(texts)
+        if len(texts) == 1:
+            return [await self.embeddings.aembed_query(texts[0])]
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        if not missing:
+            return vectors
+        start = time.perf_counter()
+        computed = self._embed_many([texts[i] for i in missing])
+        return self._fill(keys, vectors, missing, computed, time.perf_counter() - start)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        if not missing:
+            return vectors
+        start = time.perf_counter()
+        computed = await self._aembed_many([texts[i] for i in missing])
+        return self._fill(keys, vectors, missing, computed, time.perf_counter() - start)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_queries([text]))[0]
+
+    # --- Documentos (indexação): sem cache ---
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self):
+        hits = sum(self.hits.values())
+        total = hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits_memory": self.hits["memory"],
+            "hits_disk": self.hits["disk"],
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "avg_miss_seconds": self._miss_seconds / self.misses if self.misses else 0.0,
+        }
@@ -0,0 +1,138 @@
+"""
+Empacotamento do contexto por orçamento de tokens, entre o retriever e o
+``build_prompt``.
+
+1. Conta os tokens de cada trecho conforme o provedor (tiktoken para
+   OpenAI; estimativa por caracteres para Llama via Groq/Ollama).
+2. Descarta trechos quase duplicados (Jaccard de shingles de palavras).
+3. Escolhe os trechos por MMR (relevância pela posição no ranking x
+   diversidade) até ``CONTEXT_TOKEN_BUDGET``; trechos que não cabem são pulados.
+4. Devolve os escolhidos na ordem do ranking (retriever/reranker): o MMR só
+   decide o que entra, não a posição no prompt.
+
+O relatório (tokens antes/depois, economizados, descartes) vai em
+``context["packing"]`` e nos contadores de /metrics.
+"""
+from .lexical_index import tokenize
+from .metrics import Counter, register
+from ..config import (
+    CONTEXT_DEDUP_THRESHOLD,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_TOKEN_BUDGET,
+    MODEL_PROVIDER,
+)
+
+# Caracteres por token para provedores sem tokenizer local (Llama 3 em português/HTML)
+CHARS_PER_TOKEN = 3.5
+SHINGLE_SIZE = 3
+
+CONTEXT_TOKENS = register(Counter(
+    "rag_context_tokens_total", "Tokens de contexto enviados ao LLM (kept) e economizados pelo empacotamento (saved).", "kind",
+))
+
+_encoder = None
+
+
+def _openai_encoder():
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # sem tiktoken ou sem o arquivo BPE (ex.: sem rede)
+            print(f"[context_packer] tiktoken indisponível ({e}); usando estimativa por caracteres.")
+            _encoder = False
+    return _encoder
+
+
+def count_tokens(text, provider=MODEL_PROVIDER):
+    if provider == "openai":
+        encoder = _openai_encoder()
+        if encoder:
+            return len(encoder.encode(text, disallowed_special=()))
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text, budget, provider=MODEL_PROVIDER):
+    """Prefixo de ``text`` com no máximo ``budget`` tokens (pela mesma contagem de ``count_tokens``)."""
+    if provider == "openai":
+        encoder = _openai_encoder()
+        if encoder:
+            tokens = encoder.encode(text, disallowed_special=())[:budget]
+            # Decodificar e recodificar pode juntar tokens diferentes na emenda: recorta até caber
+            while tokens and len(encoder.encode(encoder.decode(tokens), disallowed_special=())) > budget:
+                tokens = tokens[:-1]
+            return encoder.decode(tokens)
+    # count_tokens soma 1 ao estimado por caracteres
+    return text[: max(0, int((budget - 1) * CHARS_PER_TOKEN))]
+
+
+def _shingles(tokens):
+    if len(tokens) < SHINGLE_SIZE:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _mmr_order(candidates, terms, mmr_lambda):
+    """Índices de ``candidates`` (já em ordem de ranking) reordenados por MMR."""
+    n = len(candidates)
+    relevance = {i: 1.0 - pos / n for pos, i in enumerate(candidates)}
+    remaining = list(candidates)
+    order = []
+    while remaining:
+        def score(i):
+            redundancy = max((_jaccard(terms[i], terms[j]) for j in order), default=0.0)
+            return mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy
+        best = max(remaining, key=score)
+        order.append(best)
+        remaining.remove(best)
+    return order
+
+
+def pack_context(context, budget=CONTEXT_TOKEN_BUDGET, dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+                 mmr_lambda=CONTEXT_MMR_LAMBDA, provider=MODEL_PROVIDER):
+    """Recebe a saída de ``parse_docs`` e devolve a mesma estrutura com ``texts`` empacotado + ``packing``."""
+    texts = context["texts"]
+    token_counts = [count_tokens(t, provider) for t in texts]
+    tokens = [tokenize(t) for t in texts]
+    shingles = [_shingles(t) for t in tokens]
+
+    # Quase duplicados: mantém o de melhor posição no ranking
+    kept = []
+    for i in range(len(texts)):
+        if all(_jaccard(shingles[i], shingles[j]) < dedup_threshold for j in kept):
+            kept.append(i)
+    duplicates = len(texts) - len(kept)
+
+    selected, used = [], 0
+    for i in _mmr_order(kept, [set(t) for t in tokens], mmr_lambda):
+        if used + token_counts[i] <= budget:
+            selected.append(i)
+            used += token_counts[i]
+
+    packed = [texts[i] for i in sorted(selected)]
+    if not packed and kept:
+        # Nem o melhor trecho cabe sozinho: vai cortado no orçamento
+        packed = [truncate_to_tokens(texts[kept[0]], budget, provider)]
+        used = count_tokens(packed[0], provider)
+
+    tokens_in = sum(token_counts)
+    report = {
+        "budget": budget,
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "tokens_saved": tokens_in - used,
+        "chunks_in": len(texts),
+        "chunks_out": len(packed),
+        "dropped_duplicates": duplicates,
+        "dropped_budget": len(kept) - len(packed),
+    }
+    CONTEXT_TOKENS.inc(used, "kept")
+    CONTEXT_TOKENS.inc(tokens_in - used, "saved")
+    return {**context, "texts": packed, "packing": report}
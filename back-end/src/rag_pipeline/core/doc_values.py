@@ -0,0 +1,51 @@
+"""
+Valores do docstore com a modalidade gravada junto.
+
+Formato: ``b"\\x00" + modalidade + b"\\x00" + conteúdo``. Textos e tabelas vão
+em UTF-8; imagens vão em binário (JPEG/PNG), sem base64: ficam ~25% menores e
+o ``parse_docs`` decide pelo cabeçalho, sem regex nem ``b64decode`` por
+pergunta. O base64 só é gerado quando um provedor precisa dele (ex.: OpenAI).
+
+Valores antigos (sem cabeçalho) continuam legíveis, com modalidade None; a
+pipeline os regrava com a modalidade dos metadados (``tag_docstore_values``).
+"""
+import base64
+
+MODALITIES = ("text", "table", "image")
+_MARK = b"\x00"
+_HEADERS = {m: _MARK + m.encode("ascii") + _MARK for m in MODALITIES}
+
+
+def encode_value(content, modality):
+    """Bytes para o docstore. Imagens podem vir em base64 (cache de chunks) ou já em bytes."""
+    if modality not in _HEADERS:
+        raise ValueError(f"Modalidade inválida: {modality}. Use: {', '.join(MODALITIES)}.")
+    if modality == "image":
+        data = base64.b64decode(content) if isinstance(content, str) else bytes(content)
+    else:
+        data = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+    return _HEADERS[modality] + data
+
+
+def is_tagged(raw):
+    return isinstance(raw, (bytes, bytearray)) and raw[:1] == _MARK
+
+
+def decode_value(raw):
+    """
+    (modalidade, conteúdo): bytes para imagem, str para texto/tabela.
+    Valores antigos, sem cabeçalho, voltam como (None, str).
+    """
+    if is_tagged(raw):
+        end = raw.index(_MARK, 1)
+        modality, data = raw[1:end].decode("ascii"), bytes(raw[end + 1:])
+        if modality == "image":
+            return modality, data
+        return modality, data.decode("utf-8", errors="ignore")
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8", errors="ignore")
+    return None, raw
+
+
+def to_base64(data):
+    return base64.b64encode(data).decode("ascii")
@@ -0,0 +1,131 @@
+"""
+Filtros de metadados (sintaxe ``where`` do Chroma) sobre a proveniência dos chunks.
+
+Campos: modality (text | table | image), department (pasta sob PDF_DIR),
+year, source (caminho do PDF relativo a PDF_DIR) e page.
+Operadores: $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $and, $or.
+Um dict com vários campos ({"modality": "table", "year": 2025}) vira $and.
+
+O mesmo filtro roda no Chroma, no índice mmap (máscara NumPy) e no BM25;
+como no Chroma, um chunk sem o campo nunca casa (nem com $ne/$nin). Texto
+vazio conta como ausente (é o valor das colunas mmap para o campo ausente).
+
+Um índice antigo pode não ter alguns campos em nenhum chunk (ex.: só
+``modality``): com ``available`` (``present_fields``), filtrar por eles é
+rejeitado em vez de devolver um contexto vazio sem aviso.
+"""
+import operator
+
+import numpy as np
+
+FILTERABLE_FIELDS = ("modality", "department", "year", "source", "page")
+INT_FIELDS = ("year", "page")
+MISSING_INT = -1
+
+_COMPARISONS = {
+    "$eq": operator.eq, "$ne": operator.ne,
+    "$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le,
+}
+_LIST_OPERATORS = ("$in", "$nin")
+
+
+def normalize_where(where, available=None):
+    """
+    Valida o filtro e o converte para a forma aceita pelo Chroma. Levanta ValueError
+    se inválido ou se usa um campo fora de ``available`` (campos presentes no índice).
+    """
+    if not where:
+        return None
+    if not isinstance(where, dict):
+        raise ValueError("Filtro deve ser um objeto JSON.")
+    clauses = []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"{key} espera uma lista não vazia de filtros.")
+            value = [normalize_where(v, available) for v in value]
+            # O Chroma exige ao menos dois itens em $and/$or
+            clauses.append(value[0] if len(value) == 1 else {key: value})
+        elif key in FILTERABLE_FIELDS:
+            if available is not None and key not in available:
+                present = ", ".join(f for f in FILTERABLE_FIELDS if f in available) or "nenhum"
+                raise ValueError(f"O índice não tem '{key}' nos metadados (reindexe os PDFs para filtrar por ele). "
+                                 f"Campos disponíveis: {present}.")
+            clauses.append({key: _normalize_condition(key, value)})
+        else:
+            raise ValueError(f"Campo de filtro inválido: {key}. Use: {', '.join(FILTERABLE_FIELDS)}.")
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def present_fields(metadatas):
+    """Campos filtráveis com valor em ao menos um chunk; um filtro pelos demais não casaria com nada."""
+    return frozenset(f for m in metadatas if m for f in FILTERABLE_FIELDS if m.get(f) not in (None, ""))
+
+
+def _normalize_condition(field, condition):
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    if len(condition) != 1:
+        raise ValueError(f"Condição de '{field}' deve ter exatamente um operador.")
+    op, value = next(iter(condition.items()))
+    if op in _LIST_OPERATORS:
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"{op} espera uma lista não vazia.")
+        value = [_coerce(field, v) for v in value]
+    elif op in _COMPARISONS:
+        value = _coerce(field, value)
+    else:
+        raise ValueError(f"Operador inválido: {op}.")
+    return {op: value}
+
+
+def _coerce(field, value):
+    if field in INT_FIELDS:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{field}' deve ser inteiro.")
+    if not isinstance(value, str):
+        raise ValueError(f"'{field}' deve ser texto.")
+    return value
+
+
+def matches(metadata, where):
+    """Avalia o filtro (já normalizado) sobre um dict de metadados. Campo ausente não casa."""
+    if not where:
+        return True
+    (key, value), = where.items()
+    if key == "$and":
+        return all(matches(metadata, w) for w in value)
+    if key == "$or":
+        return any(matches(metadata, w) for w in value)
+    (op, target), = value.items()
+    actual = metadata.get(key)
+    if actual is None or actual == "":
+        return False
+    if op == "$in":
+        return actual in target
+    if op == "$nin":
+        return actual not in target
+    return _COMPARISONS[op](actual, target)
+
+
+def where_mask(columns, where, n):
+    """Máscara booleana (n linhas) do filtro sobre colunas NumPy (campo -> array; inteiros ausentes = -1, textos = "")."""
+    if not where:
+        return np.ones(n, dtype=bool)
+    (key, value), = where.items()
+    if key == "$and":
+        return np.logical_and.reduce([where_mask(columns, w, n) for w in value])
+    if key == "$or":
+        return np.logical_or.reduce([where_mask(columns, w, n) for w in value])
+    (op, target), = value.items()
+    column = columns.get(key)
+    if column is None:
+        return np.zeros(n, dtype=bool)
+    present = column != (MISSING_INT if key in INT_FIELDS else "")
+    if op == "$in":
+        return present & np.isin(column, target)
+    if op == "$nin":
+        return present & ~np.isin(column, target)
+    return present & _COMPARISONS[op](column, target)
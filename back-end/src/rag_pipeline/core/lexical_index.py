@@ -0,0 +1,182 @@
+"""
+Índice lexical (BM25) em português, complementar à busca vetorial.
+
+Perguntas com tokens exatos (códigos de disciplina, "2025.1", números de
+resolução, nomes de formulários) costumam escapar dos embeddings dos
+resumos. O índice cobre originais e resumos de cada doc_id, com
+normalização de acentos e um stemmer leve de português, e é persistido em
+JSON ao lado do chroma_store. ``reciprocal_rank_fusion`` junta os rankings
+lexical e vetorial.
+"""
+import json
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from .assets import decode_image
+from .doc_values import decode_value
+from .filters import matches
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./:\-][a-z0-9]+)*")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de dela dele deles do dos e ela elas ele eles em entre era essa esse
+esta este eu foi for ha isso isto ja la lhe mais mas me mesmo meu minha muito na nas nao nem no nos
+o os ou para pela pelas pelo pelos por qual quando que quem se sem ser seu sua suas seus so sobre
+tambem te tem tu um uma umas uns voce voces pergunta
+""".split())
+
+# Stemmer leve: plural -> sufixo derivacional -> vogal final (radical com >= 3 letras)
+_PLURALS = [("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("res", "r"), ("s", "")]
+_SUFFIXES = [
+    "amento", "imento", "mente", "idade", "ancia", "encia", "adora", "ador", "cao",
+    "avel", "ivel", "ismo", "ista", "oso", "osa", "ivo", "iva",
+]
+_MIN_STEM = 3
+
+
+def fold_accents(text):
+    """Minúsculas e sem acentos ("Matrícula" -> "matricula")."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def stem(token):
+    """Stemmer leve para português (plural, gênero e sufixos derivacionais comuns)."""
+    if not token.isalpha():
+        return token  # códigos, datas e números ficam exatos
+    for suffix, replacement in _PLURALS:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            token = token[: -len(suffix)] + replacement
+            break
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            token = token[: -len(suffix)]
+            break
+    if token[-1] in "aoe" and len(token) > _MIN_STEM:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Tokens normalizados. Tokens compostos ("2025.1", "06/01") entram inteiros e também em partes."""
+    tokens = []
+    for match in _TOKEN_RE.findall(fold_accents(_TAG_RE.sub(" ", text))):
+        parts = re.split(r"[./:\-]", match)
+        if len(parts) > 1:
+            tokens.append(match)
+        for part in parts:
+            if part and part not in STOPWORDS:
+                tokens.append(stem(part))
+    return tokens
+
+
+class LexicalIndex:
+    """Índice invertido BM25 sobre doc_ids."""
+
+    def __init__(self, doc_ids, doc_lengths, postings, index_version=None, metadatas=None):
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings  # termo -> [[posição do doc, tf], ...]
+        self.index_version = index_version
+        self.metadatas = metadatas  # proveniência de cada doc (para filtros); None em índices antigos
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, documents, index_version=None):
+        """``documents``: iterável de (doc_id, texto, metadados)."""
+        doc_ids, doc_lengths, metadatas = [], [], []
+        postings = defaultdict(list)
+        for doc_id, text, metadata in documents:
+            counts = Counter(tokenize(text))
+            position = len(doc_ids)
+            doc_ids.append(doc_id)
+            doc_lengths.append(sum(counts.values()))
+            metadatas.append(metadata)
+            for term, tf in counts.items():
+                postings[term].append([position, tf])
+        return cls(doc_ids, doc_lengths, dict(postings), index_version, metadatas)
+
+    def search(self, query, k=20, where=None):
+        """[(doc_id, score)] dos k documentos com maior BM25, em ordem decrescente. ``where``: filtro normalizado."""
+        n = len(self.doc_ids)
+        if not n:
+            return []
+        allowed = None
+        if where:
+            metadatas = self.metadatas or [{} for _ in self.doc_ids]
+            allowed = {i for i, meta in enumerate(metadatas) if matches(meta, where)}
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for position, tf in posting:
+                if allowed is not None and position not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[position] / self.avg_length)
+                scores[position] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[position], score) for position, score in best]
+
+    def save(self, path):
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "index_version": self.index_version,
+                "doc_ids": self.doc_ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+                "metadatas": self.metadatas,
+            }, f, ensure_ascii=False, separators=(",", ":"))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["doc_ids"], data["doc_lengths"], data["postings"], data.get("index_version"), data.get("metadatas"))
+
+
+def collect_documents(vectorstore, docstore, id_key="doc_id"):
+    """
+    (doc_id, texto, metadados) de cada doc_id: resumos (vectorstore) + original
+    (docstore). Imagens entram só pelo resumo.
+    """
+    data = vectorstore.get(include=["documents", "metadatas"])
+    texts = defaultdict(list)
+    metadatas = {}
+    for summary, meta in zip(data.get("documents") or [], data.get("metadatas") or []):
+        doc_id = (meta or {}).get(id_key)
+        if doc_id:
+            texts[doc_id].append(summary or "")
+            metadatas.setdefault(doc_id, {k: v for k, v in meta.items() if k != id_key})
+    doc_ids = list(texts)
+    for doc_id, value in zip(doc_ids, docstore.mget(doc_ids)):
+        if value is None:
+            continue
+        modality, content = decode_value(value)
+        if modality == "image" or (modality is None and decode_image(content) is not None):
+            continue
+        texts[doc_id].append(content)
+    return [(doc_id, "\n".join(texts[doc_id]), metadatas[doc_id]) for doc_id in doc_ids]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Funde listas de ids ordenadas: score(id) = soma de 1 / (k + posição)."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
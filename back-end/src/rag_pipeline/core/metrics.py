@@ -0,0 +1,192 @@
+"""
+Métricas de latência por etapa da pipeline, em formato Prometheus.
+
+Cada etapa (embedding da pergunta, busca vetorial, mget do docstore,
+parse_docs, build_prompt, LLM) é medida com ``stage_timer`` e vai para:
+- um histograma do processo (exportado em /metrics);
+- os tempos da requisição atual (contextvar), usados no header Server-Timing.
+
+O custo por medição é um perf_counter e uma busca binária nos buckets.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_request_timings = contextvars.ContextVar("rag_request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_name=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = tuple(buckets)
+        self._series = {}  # label -> [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, label=None):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda kv: kv[0] or "")
+            for label, (counts, total_sum, count) in items:
+                base = f'{self.label_name}="{label}",' if self.label_name else ""
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    lines.append(f'{self.name}_bucket{{{base}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{base}le="+Inf"}} {count}')
+                suffix = f"{{{base.rstrip(',')}}}" if base else ""
+                lines.append(f"{self.name}_sum{suffix} {total_sum}")
+                lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, label=None):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label, value in sorted(self._values.items(), key=lambda kv: kv[0] or ""):
+                suffix = f'{{{self.label_name}="{label}"}}' if self.label_name else ""
+                lines.append(f"{self.name}{suffix} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Duração de cada etapa da pipeline RAG.", "stage")
+REQUEST_SECONDS = Histogram("rag_request_duration_seconds", "Duração das requisições HTTP.", "path")
+LLM_TTFT_SECONDS = Histogram("rag_llm_time_to_first_token_seconds", "Tempo até o primeiro token do LLM.")
+LLM_OUTPUT_TOKENS = Counter("rag_llm_output_tokens_total", "Tokens gerados pelo LLM.")
+LLM_INPUT_TOKENS = Counter("rag_llm_input_tokens_total", "Tokens de prompt enviados ao LLM.")
+
+_registry = [STAGE_SECONDS, REQUEST_SECONDS, LLM_TTFT_SECONDS, LLM_OUTPUT_TOKENS, LLM_INPUT_TOKENS]
+
+
+def register(metric):
+    """Registra uma métrica extra (Histogram/Counter ou objeto com ``render()``) em /metrics."""
+    _registry.append(metric)
+    return metric
+
+
+def record_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def timed(stage, fn):
+    """Versão de ``fn`` que registra sua duração como ``stage``."""
+    def wrapper(x):
+        with stage_timer(stage):
+            return fn(x)
+    return wrapper
+
+
+def start_request_timings():
+    """Inicia a coleta de tempos da requisição atual (chamado pelo middleware)."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def render_prometheus(extra_lines=()):
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """Mede tempo até o primeiro token, duração total e tokens do LLM."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}  # run_id -> [início, primeiro_token, tokens_streamados]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._runs[run_id] = [time.perf_counter(), None, 0]
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._runs[run_id] = [time.perf_counter(), None, 0]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is None:
+            return
+        if run[1] is None:
+            run[1] = time.perf_counter()
+            LLM_TTFT_SECONDS.observe(run[1] - run[0])
+            record_stage("llm_ttft", run[1] - run[0])
+        run[2] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        elapsed = time.perf_counter() - run[0]
+        if run[1] is None:
+            # Sem streaming, o primeiro token chega junto com a resposta inteira
+            LLM_TTFT_SECONDS.observe(elapsed)
+        record_stage("llm", elapsed)
+
+        input_tokens, output_tokens = _token_usage(response)
+        LLM_INPUT_TOKENS.inc(input_tokens)
+        LLM_OUTPUT_TOKENS.inc(output_tokens or run[2])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+def _token_usage(response):
+    """(entrada, saída) a partir do usage_metadata da mensagem ou do llm_output do provedor."""
+    try:
+        message = response.generations[0][0].message
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    except (AttributeError, IndexError):
+        pass
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
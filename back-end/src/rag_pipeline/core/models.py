@@ -1,11 +1,12 @@
-from langchain_ollama import ChatOllama
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
-from langchain_ollama.embeddings import OllamaEmbeddings
-from .nomic_embeddings import NomicEmbeddings
 from ..config import OLLAMA_BASE_URL, MODEL_PROVIDER, EMBEDDINGS_PROVIDER, NOMIC_KEY
+from ..config import QUERY_EMBEDDING_CACHE_ENABLED, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_DIR
+
+# Os clientes de cada provedor são importados dentro das funções: só o provedor
+# configurado é carregado (reduz tempo de import e memória no cold start do Lambda).
 
 def get_llava_model():
+    from langchain_ollama import ChatOllama
+
     try:
         model = ChatOllama(model="llava:13b", base_url=OLLAMA_BASE_URL).bind()
         print("Usando modelo local para imagens: llava:13b")
@@ -15,6 +16,8 @@ def get_llava_model():
 
 def get_llama_model():
     if MODEL_PROVIDER == "ollama":
+        from langchain_ollama import ChatOllama
+
         try:
             model = ChatOllama(model="llama3.1:8b", base_url=OLLAMA_BASE_URL).bind()
             print("Usando modelo Ollama para texto: llama3.1:8b")
@@ -23,6 +26,8 @@ def get_llama_model():
             raise RuntimeError(f"Erro ao usar modelo Ollama: {e}")
     
     if MODEL_PROVIDER == "openai":
+        from langchain_openai import ChatOpenAI
+
         try:
             model = ChatOpenAI(model="gpt-4o-mini")
             print("Usando modelo OpenAI: gpt-4o-mini")
@@ -31,6 +36,8 @@ def get_llama_model():
             raise RuntimeError(f"Erro ao usar modelo OpenAI: {e}")
     
     if MODEL_PROVIDER == "groq":
+        from langchain_groq import ChatGroq
+
         try:
             model = ChatGroq(model="llama-3.1-8b-instant")
             print("Usando modelo Groq: llama-3.1-8b-instant")
@@ -40,12 +47,36 @@ def get_llama_model():
     
     raise RuntimeError(f"Provedor de modelo inválido: {MODEL_PROVIDER}")
 
+_embeddings_model = None
+
+
 def get_embeddings_model():
     """
     Retorna o modelo de embeddings baseado na variável de ambiente EMBEDDINGS_PROVIDER.
     Opções: 'ollama' (padrão) ou 'nomic'.
+    Com QUERY_EMBEDDING_CACHE_ENABLED, os embeddings de perguntas passam por um
+    cache LRU (e opcionalmente em disco), compartilhado por todo o processo.
     """
+    global _embeddings_model
+    if _embeddings_model is None:
+        model = _get_provider_embeddings()
+        if QUERY_EMBEDDING_CACHE_ENABLED:
+            from .cached_embeddings import CachedQueryEmbeddings
+
+            model = CachedQueryEmbeddings(
+                model,
+                namespace=f"{EMBEDDINGS_PROVIDER}:{getattr(model, 'model', '')}",
+                max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+                cache_dir=QUERY_EMBEDDING_CACHE_DIR or None,
+            )
+        _embeddings_model = model
+    return _embeddings_model
+
+
+def _get_provider_embeddings():
     if EMBEDDINGS_PROVIDER == "ollama":
+        from langchain_ollama.embeddings import OllamaEmbeddings
+
         try:
             model = OllamaEmbeddings(model="nomic-embed-text", base_url=OLLAMA_BASE_URL)
             print("Usando Ollama para embeddings: nomic-embed-text")
@@ -56,6 +87,8 @@ def get_embeddings_model():
     if EMBEDDINGS_PROVIDER == "nomic":
         if not NOMIC_KEY:
             raise RuntimeError("NOMIC_KEY não configurado. Defina a variável de ambiente NOMIC_KEY para usar Nomic API.")
+        from .nomic_embeddings import NomicEmbeddings
+
         try:
             model = NomicEmbeddings(api_key=NOMIC_KEY)
             print("Usando Nomic API para embeddings: nomic-embed-text-v1.5")
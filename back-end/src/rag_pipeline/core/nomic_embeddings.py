@@ -1,5 +1,6 @@
 """Custom embeddings implementation for Nomic API."""
 import requests
+import httpx
 import logging
 from typing import List
 from langchain_core.embeddings import Embeddings
@@ -15,6 +16,7 @@ class NomicEmbeddings(Embeddings):
         self.api_key = api_key
         self.model = model
         self.api_url = "https://api-atlas.nomic.ai/v1/embedding/text"
+        self._async_client = None
         logger.info(f"NomicEmbeddings initialized with model: {model}")
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
@@ -83,3 +85,67 @@ class NomicEmbeddings(Embeddings):
         except Exception as e:
             logger.error(f"Unexpected error in embed_query: {e}", exc_info=True)
             raise
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # Cliente compartilhado para reaproveitar conexões entre requisições
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(timeout=60.0)
+        return self._async_client
+
+    async def _apost(self, texts: List[str], task_type: str) -> List[List[float]]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "texts": texts,
+            "task_type": task_type
+        }
+        try:
+            response = await self._get_async_client().post(self.api_url, json=payload, headers=headers)
+            response.raise_for_status()
+            return response.json().get("embeddings", [])
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Error calling Nomic API ({task_type}): {e}")
+            logger.error(f"Response status: {e.response.status_code}, Response body: {e.response.text}")
+            raise
+        except httpx.HTTPError as e:
+            logger.error(f"Error calling Nomic API ({task_type}): {e}")
+            raise
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents using Nomic API without blocking a thread."""
+        logger.info(f"aembed_documents called with {len(texts)} texts")
+        return await self._apost(texts, "search_document")
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in a single Nomic API call (task_type search_query)."""
+        logger.info(f"embed_queries called with {len(texts)} texts")
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "texts": texts,
+            "task_type": "search_query"
+        }
+        try:
+            response = requests.post(self.api_url, json=payload, headers=headers)
+            response.raise_for_status()
+            return response.json().get("embeddings", [])
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error calling Nomic API for embed_queries: {e}")
+            raise
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries in a single async Nomic API call."""
+        logger.info(f"aembed_queries called with {len(texts)} texts")
+        return await self._apost(texts, "search_query")
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a query using Nomic API without blocking a thread."""
+        logger.info(f"aembed_query called with text length: {len(text)}")
+        embeddings = await self._apost([text], "search_query")
+        return embeddings[0] if embeddings else []
@@ -0,0 +1,223 @@
+"""
+Docstore num único arquivo (append-only) + índice de offsets.
+
+O ``LocalFileStore`` grava cada original (texto, tabela HTML, imagem em
+base64) como um arquivo: cada pergunta faz ~20 open/read e a cópia para /tmp
+no Lambda vira milhares de arquivos pequenos. ``PackedFileStore`` guarda
+todos os valores em ``<path>`` e as posições em ``<path>.idx`` (JSON lines:
+chave, offset, tamanho, compressão):
+
+- ``mget`` ordena as posições pedidas por offset e lê trechos contíguos de
+  uma vez (uma passada pelo arquivo, sem abrir um arquivo por documento);
+- ``mset`` anexa os valores e só depois as entradas do índice, então uma
+  gravação interrompida nunca deixa o índice apontando para dados
+  incompletos; regravar uma chave anexa uma versão nova (a última vale);
+- compressão opcional por valor (zlib), guardada em cada entrada.
+
+Um único processo grava (indexação); leitura funciona em sistema de arquivos
+somente leitura (Lambda).
+
+Migração do diretório ``docstore`` antigo:
+    python -m rag_pipeline.core.packed_store --src .cache_chunks/chroma_store/docstore
+"""
+import argparse
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.stores import BaseStore
+
+PACK_FILE = "docstore.pack"
+COMPRESSIONS = ("none", "zlib")
+# Lacuna máxima (bytes) entre dois valores pedidos para lê-los numa só leitura
+READ_GAP_BYTES = 64 * 1024
+MIGRATION_BATCH = 500
+
+
+class PackedFileStore(BaseStore[str, bytes]):
+    def __init__(self, path, compression="zlib", compression_level=6):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Compressão inválida: {compression}. Use: {', '.join(COMPRESSIONS)}.")
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self.compression = compression
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._reader = None
+        self._index = self._load_index()  # chave -> (offset, tamanho, compressão)
+
+    def _load_index(self):
+        index = {}
+        if not self.index_path.exists():
+            return index
+        data_size = self.path.stat().st_size if self.path.exists() else 0
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # última linha cortada por uma gravação interrompida
+                if entry.get("deleted"):
+                    index.pop(entry["key"], None)
+                elif entry["offset"] + entry["size"] <= data_size:
+                    index[entry["key"]] = (entry["offset"], entry["size"], entry.get("compression", "none"))
+        return index
+
+    def __len__(self):
+        return len(self._index)
+
+    def _encode(self, value):
+        if self.compression == "zlib":
+            return zlib.compress(value, self.compression_level)
+        return value
+
+    @staticmethod
+    def _decode(raw, compression):
+        return zlib.decompress(raw) if compression == "zlib" else raw
+
+    def _read_ranges(self, positions: List[Tuple[int, int]]) -> List[bytes]:
+        """Bytes de cada (offset, tamanho), lendo em ordem de offset e juntando trechos próximos."""
+        order = sorted(range(len(positions)), key=lambda i: positions[i][0])
+        result = [b""] * len(positions)
+        with self._lock:
+            if self._reader is None:
+                self._reader = open(self.path, "rb", buffering=0)
+            group = []
+            for i in order + [None]:
+                if group and (i is None or positions[i][0] - group_end > READ_GAP_BYTES):
+                    start = positions[group[0]][0]
+                    self._reader.seek(start)
+                    block = self._reader.read(group_end - start)
+                    for j in group:
+                        offset, size = positions[j]
+                        result[j] = block[offset - start: offset - start + size]
+                    group = []
+                if i is None:
+                    break
+                offset, size = positions[i]
+                group_end = max(group_end, offset + size) if group else offset + size
+                group.append(i)
+        return result
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        entries = [self._index.get(k) for k in keys]
+        found = [i for i, e in enumerate(entries) if e is not None]
+        values = [None] * len(keys)
+        if not found:
+            return values
+        raw = self._read_ranges([entries[i][:2] for i in found])
+        for i, data in zip(found, raw):
+            values[i] = self._decode(data, entries[i][2])
+        return values
+
+    def _append(self, records, index_lines):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                positions = []
+                for data in records:
+                    f.write(data)
+                    positions.append(offset)
+                    offset += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+            lines = index_lines(positions)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        pairs = list(key_value_pairs)
+        if not pairs:
+            return
+        records = [self._encode(value) for _, value in pairs]
+
+        def index_lines(positions):
+            lines = []
+            for (key, _), data, offset in zip(pairs, records, positions):
+                self._index[key] = (offset, len(data), self.compression)
+                lines.append(json.dumps({
+                    "key": key, "offset": offset, "size": len(data), "compression": self.compression,
+                }) + "\n")
+            return lines
+
+        self._append(records, index_lines)
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        keys = [k for k in keys if k in self._index]
+        if not keys:
+            return
+
+        def index_lines(_):
+            for key in keys:
+                self._index.pop(key, None)
+            return [json.dumps({"key": key, "deleted": True}) + "\n" for key in keys]
+
+        self._append([], index_lines)
+
+    def compact(self):
+        """Regrava só a versão atual de cada chave (descarta valores substituídos ou apagados)."""
+        tmp_path = self.path.with_name(self.path.name + ".compact")
+        for path in (tmp_path, tmp_path.with_name(tmp_path.name + ".idx")):
+            path.unlink(missing_ok=True)
+        tmp = PackedFileStore(tmp_path, self.compression, self.compression_level)
+        migrate_docstore(self, tmp)
+        tmp.close()
+        for path in (tmp.path, tmp.index_path):
+            path.touch()  # docstore vazio: nada foi gravado
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            os.replace(tmp.path, self.path)
+            os.replace(tmp.index_path, self.index_path)
+            self._index = tmp._index
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        for key in list(self._index):
+            if prefix is None or key.startswith(prefix):
+                yield key
+
+    def close(self):
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+
+def migrate_docstore(source, dest, batch_size=MIGRATION_BATCH):
+    """Copia todos os valores de um docstore (ex.: LocalFileStore) para ``dest``, em lotes."""
+    keys = sorted(source.yield_keys())
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        dest.mset([(k, v) for k, v in zip(batch, source.mget(batch)) if v is not None])
+    return len(keys)
+
+
+def main():
+    from langchain.storage import LocalFileStore
+
+    from ..config import DOCSTORE_COMPRESSION, PERSIST_DIR
+
+    parser = argparse.ArgumentParser(description="Migra o docstore de um arquivo por documento para o arquivo único.")
+    parser.add_argument("--src", default=str(PERSIST_DIR / "docstore"), help="Diretório do LocalFileStore.")
+    parser.add_argument("--dest", default=str(PERSIST_DIR / PACK_FILE), help="Arquivo de dados de destino.")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DOCSTORE_COMPRESSION)
+    args = parser.parse_args()
+
+    dest = Path(args.dest)
+    if dest.exists():
+        parser.error(f"{dest} já existe; apague-o (e o .idx) para migrar de novo.")
+    store = PackedFileStore(dest, args.compression)
+    count = migrate_docstore(LocalFileStore(args.src), store)
+    src_bytes = sum(p.stat().st_size for p in Path(args.src).rglob("*") if p.is_file())
+    print(f"[docstore] {count} documentos migrados: {src_bytes} -> {dest.stat().st_size if dest.exists() else 0} bytes em {dest}")
+
+
+if __name__ == "__main__":
+    main()
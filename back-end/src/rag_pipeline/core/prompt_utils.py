@@ -1,6 +1,9 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage
+from langchain_core.documents import Document
 from ..config import MODEL_PROVIDER
+from .assets import image_media_type
+from .doc_values import decode_value, to_base64
 
 # core/prompt_utils.py (ou onde estiver o parse_docs)
 import base64
@@ -25,23 +28,36 @@ def _looks_like_base64(s: str) -> bool:
         return False
 
 def parse_docs(docs):
-    b64_imgs, texts = [], []
+    """
+    Separa textos e imagens pela modalidade gravada no docstore. ``images``
+    traz os bytes de cada imagem e ``image_ids`` o doc_id (None se o retriever
+    não informar), para servi-las por referência. Só valores antigos, sem
+    modalidade, ainda são classificados pelo formato base64.
+    """
+    images, image_ids, texts = [], [], []
     for doc in docs:
-        # docstore -> bytes; converte pra str
-        if isinstance(doc, (bytes, bytearray)):
-            doc = doc.decode("utf-8", errors="ignore")
+        doc_id = None
+        if isinstance(doc, Document):
+            doc_id = doc.metadata.get("doc_id")
+            modality = doc.metadata.get("modality")
+            content = doc.metadata.get("image") if modality == "image" else doc.page_content
+        else:
+            modality, content = decode_value(doc)
 
-        if _looks_like_base64(doc):
-            b64_imgs.append(doc)
+        if modality is None and _looks_like_base64(content):
+            modality, content = "image", b64decode(content)
+        if modality == "image":
+            images.append(content)
+            image_ids.append(doc_id)
         else:
-            texts.append(doc)
-    return {"images": b64_imgs, "texts": texts}
+            texts.append(content)
+    return {"images": images, "image_ids": image_ids, "texts": texts}
 
 def build_prompt(kwargs):
     docs = kwargs["context"]
     question = kwargs["question"]
     history = kwargs.get("history")
-    context_text = "".join(docs["texts"])
+    context_text = "\n\n".join(docs["texts"])
     
     # For Groq, limit context size to avoid token limits (roughly 400000 chars ≈ 100K tokens)
     if MODEL_PROVIDER == "groq" and len(context_text) > 400000:
@@ -67,9 +83,11 @@ Formate a resposta em HTML simples. Toda a resposta deve estar dentro de uma div
     if MODEL_PROVIDER == "openai" and docs["images"]:
         prompt_content = [{"type": "text", "text": base_prompt}]
         for image in docs["images"]:
+            # base64 só aqui, quando o provedor recebe a imagem
+            media_type = image_media_type(image) or "image/jpeg"
             prompt_content.append({
                 "type": "image_url", 
-                "image_url": {"url": f"data:image/jpeg;base64,{image}"}
+                "image_url": {"url": f"data:{media_type};base64,{to_base64(image)}"}
             })
         return ChatPromptTemplate.from_messages([HumanMessage(content=prompt_content)])
     
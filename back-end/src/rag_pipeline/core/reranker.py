@@ -0,0 +1,94 @@
+"""
+Reranking com cross-encoder em CPU.
+
+O retriever busca largo (RERANKER_CANDIDATES, ~50) e o cross-encoder
+reordena os textos, mantendo só os RERANKER_TOP_N melhores no prompt.
+Os scores de cada par (pergunta, doc_id) ficam num cache LRU: perguntas
+repetidas não passam pelo modelo de novo.
+
+Dependência opcional: ``pip install sentence-transformers``. Sem ela o
+reranker é desativado e a pipeline segue só com a fusão vetorial + BM25.
+"""
+import threading
+from collections import OrderedDict
+
+from .assets import is_image_document
+from .metrics import Counter, register, stage_timer
+
+RERANKER_CACHE = register(Counter(
+    "rag_reranker_cache_total", "Consultas ao cache de scores do reranker.", "result",
+))
+
+
+def _normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+class CrossEncoderReranker:
+    def __init__(self, model, batch_size=16, cache_size=10000, max_chars=2000):
+        self.model = model  # qualquer objeto com predict(pares, batch_size=...) -> scores
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.max_chars = max_chars
+        self._cache = OrderedDict()  # (pergunta normalizada, doc_id) -> score
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, model_name, **kwargs):
+        """Carrega o cross-encoder em CPU. Retorna None se sentence-transformers não estiver instalado."""
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            print("[reranker] sentence-transformers não instalado; reranking desativado.")
+            return None
+        print(f"[reranker] Carregando cross-encoder {model_name} (CPU)...")
+        return cls(CrossEncoder(model_name, device="cpu", max_length=512), **kwargs)
+
+    def _cached(self, key):
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, scores):
+        with self._lock:
+            self._cache.update(scores)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def scores(self, query, docs, id_key="doc_id"):
+        """Score de cada doc (mesma ordem); só os pares fora do cache vão ao modelo, num único lote."""
+        q = _normalize_query(query)
+        keys = [(q, d.metadata.get(id_key)) for d in docs]
+        scores = [self._cached(k) if k[1] else None for k in keys]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        RERANKER_CACHE.inc(len(docs) - len(missing), "hit")
+        RERANKER_CACHE.inc(len(missing), "miss")
+        if missing:
+            pairs = [(query, docs[i].page_content[: self.max_chars]) for i in missing]
+            predicted = self.model.predict(pairs, batch_size=self.batch_size)
+            new = {}
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                if keys[i][1]:
+                    new[keys[i]] = scores[i]
+            self._store(new)
+        return scores
+
+    def rerank(self, query, docs, top_n, id_key="doc_id"):
+        """
+        Os ``top_n`` textos de maior score. Imagens não passam pelo
+        cross-encoder: ficam as que já estavam entre as ``top_n`` primeiras.
+        """
+        texts = [d for d in docs if not is_image_document(d)]
+        images = [d for d in docs[:top_n] if is_image_document(d)]
+        if not texts:
+            return images
+        with stage_timer("rerank"):
+            scores = self.scores(query, texts, id_key)
+        ranked = sorted(zip(scores, range(len(texts))), key=lambda item: item[0], reverse=True)
+        return [texts[i] for _, i in ranked[:top_n]] + images
+
+    def stats(self):
+        return {"entries": len(self._cache), "max_entries": self.cache_size}
@@ -0,0 +1,190 @@
+import asyncio
+from typing import Any, List, Optional
+
+from langchain.retrievers.multi_vector import MultiVectorRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+
+from .doc_values import decode_value
+from .filters import normalize_where
+from .lexical_index import reciprocal_rank_fusion
+from .metrics import stage_timer
+
+
+class MultiModalRetriever(MultiVectorRetriever):
+    """
+    MultiVectorRetriever com as etapas explícitas: embedding da pergunta ->
+    busca por vetor no vectorstore -> mget dos originais no docstore.
+
+    No caminho assíncrono o embedding usa ``aembed_query`` do cliente (HTTP
+    assíncrono), então a requisição não ocupa uma thread durante a chamada
+    de rede; busca e mget são locais e rápidos.
+
+    Retorna ``Document``s com o original em ``page_content`` e ``doc_id`` e
+    ``modality`` nos metadados (o doc_id serve imagens por referência).
+    Imagens têm ``page_content`` vazio e os bytes em ``metadata["image"]``.
+
+    Com ``lexical_index`` (BM25), o ranking vetorial é fundido com o lexical
+    por reciprocal rank fusion e só os ``top_n`` primeiros são buscados no
+    docstore.
+
+    Com ``reranker`` (cross-encoder), esses candidatos são reordenados e só
+    os ``rerank_top_n`` melhores seguem para o prompt. No caminho assíncrono
+    o modelo roda no executor para não travar o event loop.
+
+    ``filters`` (sintaxe ``where`` do Chroma sobre a proveniência: modality,
+    department, year, source, page) restringe as buscas vetorial e lexical:
+    ``retriever.invoke(pergunta, filters={"modality": "table"})``. Com
+    ``filter_fields`` (campos presentes no índice), filtrar por outro campo
+    levanta ValueError em vez de não achar nada.
+    """
+
+    lexical_index: Optional[Any] = None
+    lexical_k: int = 20
+    top_n: Optional[int] = None
+    rrf_k: int = 60
+    reranker: Optional[Any] = None
+    rerank_top_n: int = 6
+    filter_fields: Optional[frozenset] = None
+
+    def _ordered_ids(self, sub_docs):
+        ids = []
+        for d in sub_docs:
+            doc_id = d.metadata.get(self.id_key)
+            if doc_id and doc_id not in ids:
+                ids.append(doc_id)
+        return ids
+
+    def _search_kwargs(self, where):
+        return {**self.search_kwargs, "filter": where} if where else self.search_kwargs
+
+    def _fuse(self, query, vector_ids, where=None):
+        """Ids finais: vetoriais, fundidos com o BM25 se houver índice lexical, cortados em ``top_n``."""
+        ids = vector_ids
+        if self.lexical_index is not None:
+            with stage_timer("lexical_search"):
+                lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, self.lexical_k, where)]
+            ids = reciprocal_rank_fusion([vector_ids, lexical_ids], self.rrf_k)
+        return ids[: self.top_n] if self.top_n else ids
+
+    def _rerank(self, query, docs):
+        if self.reranker is None:
+            return docs
+        return self.reranker.rerank(query, docs, self.rerank_top_n, self.id_key)
+
+    async def _arerank(self, query, docs):
+        if self.reranker is None:
+            return docs
+        return await asyncio.get_running_loop().run_in_executor(None, self._rerank, query, docs)
+
+    def _as_documents(self, ids, values):
+        docs = []
+        for doc_id, value in zip(ids, values):
+            if value is None:
+                continue
+            if isinstance(value, Document):
+                value.metadata.setdefault(self.id_key, doc_id)
+                docs.append(value)
+                continue
+            modality, content = decode_value(value)
+            metadata = {self.id_key: doc_id}
+            if modality == "image":
+                docs.append(Document(page_content="", metadata={**metadata, "modality": modality, "image": content}))
+                continue
+            if modality:
+                metadata["modality"] = modality
+            docs.append(Document(page_content=content, metadata=metadata))
+        return docs
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, filters: Optional[dict] = None
+    ) -> List:
+        where = normalize_where(filters, self.filter_fields)
+        with stage_timer("query_embedding"):
+            embedding = self.vectorstore.embeddings.embed_query(query)
+        with stage_timer("vector_search"):
+            sub_docs = self.vectorstore.similarity_search_by_vector(embedding, **self._search_kwargs(where))
+        ids = self._fuse(query, self._ordered_ids(sub_docs), where)
+        with stage_timer("docstore_mget"):
+            values = self.docstore.mget(ids)
+        return self._rerank(query, self._as_documents(ids, values))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, filters: Optional[dict] = None
+    ) -> List:
+        where = normalize_where(filters, self.filter_fields)
+        with stage_timer("query_embedding"):
+            embedding = await self.vectorstore.embeddings.aembed_query(query)
+        with stage_timer("vector_search"):
+            sub_docs = await self.vectorstore.asimilarity_search_by_vector(embedding, **self._search_kwargs(where))
+        ids = self._fuse(query, self._ordered_ids(sub_docs), where)
+        with stage_timer("docstore_mget"):
+            values = await self.docstore.amget(ids)
+        return await self._arerank(query, self._as_documents(ids, values))
+
+    # --- Lote: um embedding para N perguntas, uma busca em lote e um único mget ---
+
+    def _embed_queries(self, queries):
+        embeddings = self.vectorstore.embeddings
+        if hasattr(embeddings, "embed_queries"):
+            return embeddings.embed_queries(queries)
+        return embeddings.embed_documents(queries)
+
+    async def _aembed_queries(self, queries):
+        embeddings = self.vectorstore.embeddings
+        if hasattr(embeddings, "aembed_queries"):
+            return await embeddings.aembed_queries(queries)
+        return await embeddings.aembed_documents(queries)
+
+    def _search_ids_batch(self, vectors, where=None):
+        k = self.search_kwargs.get("k", 4)
+        if hasattr(self.vectorstore, "search_doc_ids"):
+            # Índice mmap: uma multiplicação de matrizes para todas as perguntas
+            return [list(dict.fromkeys(ids)) for ids in self.vectorstore.search_doc_ids(vectors, k, where)]
+        collection = getattr(self.vectorstore, "_collection", None)
+        if collection is not None:
+            # Chroma aceita várias query_embeddings numa única consulta
+            result = collection.query(query_embeddings=vectors, n_results=k, where=where, include=["metadatas"])
+            return [
+                list(dict.fromkeys(m.get(self.id_key) for m in metas if m and m.get(self.id_key)))
+                for metas in result["metadatas"]
+            ]
+        return [
+            self._ordered_ids(self.vectorstore.similarity_search_by_vector(v, **self._search_kwargs(where)))
+            for v in vectors
+        ]
+
+    def _collect(self, ids_per_query, unique_ids, values):
+        by_id = {d.metadata[self.id_key]: d for d in self._as_documents(unique_ids, values)}
+        return [[by_id[i] for i in ids if i in by_id] for ids in ids_per_query]
+
+    def batch_retrieve(self, queries: List[str], filters: Optional[dict] = None) -> List[List]:
+        """Documentos de cada pergunta, na mesma ordem de ``queries`` (``filters`` vale para todas)."""
+        if not queries:
+            return []
+        where = normalize_where(filters, self.filter_fields)
+        with stage_timer("query_embedding"):
+            vectors = self._embed_queries(queries)
+        with stage_timer("vector_search"):
+            ids_per_query = self._search_ids_batch(vectors, where)
+        ids_per_query = [self._fuse(q, ids, where) for q, ids in zip(queries, ids_per_query)]
+        unique_ids = list(dict.fromkeys(i for ids in ids_per_query for i in ids))
+        with stage_timer("docstore_mget"):
+            values = self.docstore.mget(unique_ids)
+        docs_per_query = self._collect(ids_per_query, unique_ids, values)
+        return [self._rerank(q, docs) for q, docs in zip(queries, docs_per_query)]
+
+    async def abatch_retrieve(self, queries: List[str], filters: Optional[dict] = None) -> List[List]:
+        if not queries:
+            return []
+        where = normalize_where(filters, self.filter_fields)
+        with stage_timer("query_embedding"):
+            vectors = await self._aembed_queries(queries)
+        with stage_timer("vector_search"):
+            ids_per_query = await asyncio.get_running_loop().run_in_executor(None, self._search_ids_batch, vectors, where)
+        ids_per_query = [self._fuse(q, ids, where) for q, ids in zip(queries, ids_per_query)]
+        unique_ids = list(dict.fromkeys(i for ids in ids_per_query for i in ids))
+        with stage_timer("docstore_mget"):
+            values = await self.docstore.amget(unique_ids)
+        docs_per_query = self._collect(ids_per_query, unique_ids, values)
+        return [await self._arerank(q, docs) for q, docs in zip(queries, docs_per_query)]
@@ -1,9 +1,10 @@
+import hashlib
 import json
 import os
 import sys
 from pathlib import Path
-from bs4 import BeautifulSoup
 import shutil
+from typing import Any, NamedTuple
 
 from langchain_community.vectorstores import Chroma
 from langchain.storage import LocalFileStore
@@ -11,11 +12,35 @@ from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 
-from ..config import PDF_DIR, CHUNKS_PATH, SUMMARIES_PATH, PERSIST_DIR, get_runtime_chroma_path, IS_USING_IMAGE_RUNTIME, copy_chroma_to_tmp
+from ..config import PDF_DIR, CHUNKS_DIR, CHUNKS_PATH, SUMMARIES_PATH, PERSIST_DIR, INDEX_MANIFEST_PATH, get_runtime_chroma_path, IS_USING_IMAGE_RUNTIME, copy_chroma_to_tmp, SEMANTIC_CACHE_ENABLED
+from ..config import DOCSTORE_BACKEND, DOCSTORE_COMPRESSION
+from ..config import INGEST_WORKERS, INGEST_THREADS_PER_WORKER, INGEST_SPLIT_PAGES
+from ..config import VECTORSTORE_BACKEND, VECTOR_INDEX_DIR, MMAP_INDEX_DTYPE, MMAP_INDEX_QUANTIZATION, MMAP_INDEX_RESCORE_FACTOR
+from ..config import FAISS_INDEX_TYPE, FAISS_NLIST, FAISS_NPROBE, FAISS_HNSW_M, FAISS_EF_SEARCH
+from ..config import CONTEXT_PACKING_ENABLED
+from ..config import RERANKER_ENABLED, RERANKER_MODEL, RERANKER_CANDIDATES, RERANKER_TOP_N, RERANKER_BATCH_SIZE, RERANKER_CACHE_SIZE, RERANKER_MAX_CHARS
+from ..config import RETRIEVER_K, RETRIEVER_TOP_N, HYBRID_SEARCH_ENABLED, LEXICAL_K, RRF_K, LEXICAL_INDEX_PATH
 from .models import get_llama_model, get_embeddings_model
-from ..data.pdf_utils import extract_chunks_from_pdf, classify_chunks
-from ..data.summarization import summarize_elements, summarize_images, add_documents
+# Módulos de ingestão (unstructured, torch, bs4, sumarização) são importados só
+# quando é preciso extrair/indexar: servir perguntas com um índice pronto não os carrega.
 from .prompt_utils import parse_docs, build_prompt, clean_summary
+from .metrics import LLMTimingCallback, timed
+from .retriever import MultiModalRetriever
+from .semantic_cache import SemanticCachedChain, get_semantic_cache
+from .context_packer import pack_context
+from .reranker import CrossEncoderReranker
+from .lexical_index import LexicalIndex, collect_documents
+from .doc_values import MODALITIES, decode_value, encode_value, is_tagged
+from .filters import FILTERABLE_FIELDS, present_fields
+from .packed_store import PACK_FILE, PackedFileStore, migrate_docstore
+from .vector_backends import get_vector_backend
+from ..data.manifest import KINDS, MODALITY_BY_KIND, diff_sources, doc_ids_of, empty_manifest, forget_sources, load_manifest, record_documents, save_manifest, scan_sources, source_pairs
+from ..data.chunk_cache import chunk_counts, iter_chunks, load_chunks, load_index, load_metadata, open_cache, read_shard, save_index, update_cache
+
+# Doc_ids por chamada de delete no Chroma
+DELETE_BATCH = 500
+# Originais por mset na reidratação do docstore
+REHYDRATE_BATCH = 500
 
 
 def _docstore_is_empty(docstore_dir: Path) -> bool:
@@ -28,36 +53,191 @@ def _docstore_is_empty(docstore_dir: Path) -> bool:
         return True
 
 
-def _rehydrate_docstore_only(retriever: MultiVectorRetriever, all_texts, all_tables, all_images):
-    """Rehidrata SOMENTE o docstore com os ORIGINAIS, sem re-embedar.
-    Mantém a MESMA ordem de indexação: textos -> tabelas -> imagens.
+def _store_is_empty(store) -> bool:
+    return next(iter(store.yield_keys()), None) is None
+
+
+def _open_docstore():
+    """
+    Docstore dos originais conforme DOCSTORE_BACKEND. Com "packed", um diretório
+    ``docstore`` antigo (um arquivo por documento) é migrado na primeira abertura.
+    """
+    legacy_dir = PERSIST_DIR / "docstore"
+    if DOCSTORE_BACKEND == "files":
+        legacy_dir.mkdir(parents=True, exist_ok=True)
+        return LocalFileStore(str(legacy_dir))
+    store = PackedFileStore(PERSIST_DIR / PACK_FILE, DOCSTORE_COMPRESSION)
+    if len(store) == 0 and not _docstore_is_empty(legacy_dir):
+        try:
+            count = migrate_docstore(LocalFileStore(str(legacy_dir)), store)
+            print(f"[docstore] {count} documentos migrados de {legacy_dir} para {store.path}")
+        except OSError as e:
+            print(f"[docstore] Não foi possível migrar o docstore ({e}); usando {legacy_dir}")
+            return LocalFileStore(str(legacy_dir))
+    return store
+
+
+def _chunk_cache():
+    """Diretório do cache de chunks (migra o JSON único antigo na primeira vez), ou None se não há cache."""
+    return open_cache(CHUNKS_DIR, CHUNKS_PATH)
+
+
+def _load_cached_chunks():
+    """
+    (textos, tabelas, imagens, proveniência): o corpus inteiro, para resumir e
+    indexar. Caches antigos, sem proveniência, têm só a modalidade.
+    """
+    print("Usando cache de chunks existente.")
+    all_texts, all_tables, all_images, metadata = load_chunks(_chunk_cache())
+    print(f"\nTextos: {len(all_texts)}, Tabelas: {len(all_tables)}, Imagens: {len(all_images)}")
+    return all_texts, all_tables, all_images, metadata
+
+
+def _table_label(meta):
+    source = meta.get("source")
+    return Path(source).stem.upper().replace("_", " ") if source else "DOCUMENTO"
+
+
+def _backfill_metadata(vectorstore, metadata=None):
     """
+    Índices criados antes da proveniência só têm doc_id nos metadados. Completa-os
+    com a proveniência do cache de chunks, na mesma ordem de indexação
+    (textos -> tabelas -> imagens) usada em ``_rehydrate_docstore_only``.
+    """
+    data = vectorstore.get(include=["metadatas"])
+    ids, current = data.get("ids", []), data.get("metadatas", [])
+    if not current or all("modality" in (m or {}) for m in current):
+        return False
+    if metadata is None:
+        root = _chunk_cache()
+        if root is None:
+            print("[metadata] Sem cache de chunks; vetores ficam sem proveniência.")
+            return False
+        metadata = load_metadata(root)
+    ordered = metadata["texts"] + metadata["tables"] + metadata["images"]
+    n = min(len(ids), len(ordered))
+    if len(ids) != len(ordered):
+        print(f"[metadata] Aviso: contagem não bate (chunks={len(ordered)} vs vetores={len(ids)}).")
+    vectorstore._collection.update(
+        ids=ids[:n],
+        metadatas=[{**ordered[i], **(current[i] or {})} for i in range(n)],
+    )
+    print(f"[metadata] Proveniência adicionada a {n} vetores.")
+    return True
+
+
+def _rehydrate_docstore_only(retriever: MultiVectorRetriever):
+    """Rehidrata SOMENTE o docstore com os ORIGINAIS do cache de chunks, sem re-embedar,
+    lendo um PDF (shard) por vez, com as imagens direto em binário.
+    Com manifesto, pareia cada chunk ao seu doc_id por PDF (vale também após
+    atualizações incrementais); senão, usa a MESMA ordem de indexação:
+    textos -> tabelas -> imagens.
+    """
+    root = _chunk_cache()
+    if root is None:
+        print("[rehydrate] Sem cache de chunks; não há originais para reidratar o docstore.")
+        return
+    manifest = load_manifest(INDEX_MANIFEST_PATH)
+    if manifest is not None:
+        shards = {shard["source"]: shard for shard in load_index(root)}
+        total = 0
+        for source, entry in manifest["files"].items():
+            chunks = read_shard(root, shards[source], binary_images=True)[0] if source in shards else {}
+            pairs = [(doc_id, encode_value(orig, modality)) for doc_id, orig, modality in source_pairs(source, entry, chunks)]
+            retriever.docstore.mset(pairs)
+            total += len(pairs)
+        print(f"[rehydrate] Docstore reidratado pelo manifesto com {total} itens.")
+        return
+
     # Recupera os doc_ids que já estão no Chroma (na mesma ordem em que foram inseridos)
     meta = retriever.vectorstore.get(include=["metadatas"]).get("metadatas", [])
     doc_ids = [m.get("doc_id") for m in meta]
 
-    # Concatena os originais na mesma ordem usada no indexing inicial
-    all_originals = list(all_texts) + list(all_tables) + list(all_images)
-
-    if len(all_originals) != len(doc_ids):
-        print(f"[rehydrate] Aviso: contagem não bate (originais={len(all_originals)} vs doc_ids={len(doc_ids)}).")
-        # Em caso de divergência, tenta limitar ao mínimo comum:
-        n = min(len(all_originals), len(doc_ids))
-        all_originals = all_originals[:n]
-        doc_ids = doc_ids[:n]
-
-    # Grava em bytes no docstore
-    pairs = []
-    for i, orig in enumerate(all_originals):
-        if isinstance(orig, str):
-            pairs.append((doc_ids[i], orig.encode("utf-8")))
-        else:
-            pairs.append((doc_ids[i], orig))
-    retriever.docstore.mset(pairs)
-    print(f"[rehydrate] Docstore reidratado com {len(pairs)} itens.")
+    # Percorre os originais na mesma ordem usada no indexing inicial
+    originals = (
+        (orig, MODALITY_BY_KIND[kind])
+        for kind in KINDS
+        for orig, _ in iter_chunks(root, kind, binary_images=True)
+    )
+    count = sum(chunk_counts(root).values())
+    if count != len(doc_ids):
+        # Em caso de divergência, o zip limita ao mínimo comum
+        print(f"[rehydrate] Aviso: contagem não bate (originais={count} vs doc_ids={len(doc_ids)}).")
+
+    # Grava em bytes no docstore, com a modalidade (imagens em binário), em lotes
+    total, batch = 0, []
+    for doc_id, (orig, modality) in zip(doc_ids, originals):
+        batch.append((doc_id, encode_value(orig, modality)))
+        if len(batch) >= REHYDRATE_BATCH:
+            retriever.docstore.mset(batch)
+            total, batch = total + len(batch), []
+    retriever.docstore.mset(batch)
+    print(f"[rehydrate] Docstore reidratado com {total + len(batch)} itens.")
+
+
+def _tag_docstore_values(vectorstore, store):
+    """
+    Regrava no formato de ``core/doc_values.py`` (modalidade no valor, imagens em
+    binário) um docstore gravado antes dele, usando a modalidade dos metadados.
+    """
+    sample = vectorstore.get(limit=1, include=["metadatas"]).get("metadatas") or []
+    sample_id = (sample[0] or {}).get("doc_id") if sample else None
+    value = store.mget([sample_id])[0] if sample_id else None
+    if value is None or is_tagged(value):
+        return False
+    modalities = {
+        m["doc_id"]: m.get("modality")
+        for m in vectorstore.get(include=["metadatas"]).get("metadatas", [])
+        if m and m.get("doc_id")
+    }
+    ids = list(modalities)
+    pairs = [
+        (doc_id, encode_value(decode_value(value)[1], modalities[doc_id]))
+        for doc_id, value in zip(ids, store.mget(ids))
+        if value is not None and not is_tagged(value) and modalities[doc_id] in MODALITIES
+    ]
+    try:
+        store.mset(pairs)
+        if hasattr(store, "compact"):
+            store.compact()  # descarta as versões antigas do arquivo único
+    except OSError as e:
+        print(f"[docstore] Não foi possível regravar o docstore com a modalidade: {e}")
+        return False
+    print(f"[docstore] {len(pairs)} valores regravados com a modalidade (imagens em binário).")
+    return True
+
+def _filter_fields(vectorstore):
+    """Campos de proveniência presentes no índice; filtros pelos demais retornam erro (400 na API)."""
+    if hasattr(vectorstore, "present_fields"):
+        fields = vectorstore.present_fields()
+    else:
+        fields = present_fields(vectorstore.get(include=["metadatas"]).get("metadatas", []))
+    missing = [f for f in FILTERABLE_FIELDS if f not in fields]
+    if missing:
+        print(f"[filtros] Índice sem {', '.join(missing)} nos metadados: filtros por esses campos são rejeitados "
+              "(reindexe os PDFs para habilitá-los).")
+    return fields
+
+
+def compute_index_version(vectorstore) -> str:
+    """Versão do índice: hash dos ids indexados. Muda sempre que vetores entram ou saem."""
+    if getattr(vectorstore, "index_version", None):
+        return vectorstore.index_version  # índice mmap: calculada na exportação
+    ids = sorted(vectorstore.get().get("ids", []))
+    return hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()[:12]
+
+
+def _inline_lambda(fn):
+    """RunnableLambda que, no ainvoke/astream, roda a função inline em vez de mandá-la ao executor."""
+    async def afn(x):
+        return fn(x)
+    return RunnableLambda(fn, afunc=afn)
+
 
 def table_to_text(html):
     """Converte uma tabela HTML em texto plano, preservando estrutura e conteúdo."""
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     rows = []
     for tr in soup.find_all("tr"):
@@ -67,45 +247,198 @@ def table_to_text(html):
     return "\n".join(rows)
 
 
+class RagComponents(NamedTuple):
+    """Partes da pipeline, para quem precisa de mais que a chain (ex.: lote)."""
+    chain: Any        # chain completa (com cache semântico, se habilitado)
+    retriever: MultiModalRetriever
+    generation: Any   # build_prompt | modelo | parser; entrada: {context, question, history}
+
+
+def build_generation_chain(model):
+    return _inline_lambda(timed("build_prompt", build_prompt)) | model | StrOutputParser()
+
+
 # --- FUNÇÃO PRINCIPAL DE INICIALIZAÇÃO DA PIPELINE (Opção B) ---
-def get_rag_pipeline(force_regenerate=False):
+def get_rag_pipeline(force_regenerate=False, update_index=False):
+    """Inicializa e retorna a chain RAG (ver ``get_rag_components``)."""
+    return get_rag_components(force_regenerate, update_index).chain
+
+
+def _extract_all_pdfs():
+    """Extrai todos os PDFs de PDF_DIR (um shard por PDF + pool de processos) e grava o índice do cache de chunks."""
+    from ..data.ingestion import extract_pdfs
+
+    pdf_files = sorted(PDF_DIR.rglob("*.pdf"))
+    print(f"{len(pdf_files)} arquivos PDF encontrados.")
+    shards = []
+    all_texts, all_tables, all_images, all_metadata = extract_pdfs(
+        pdf_files, INGEST_WORKERS, INGEST_THREADS_PER_WORKER, CHUNKS_DIR, split_pages=INGEST_SPLIT_PAGES, shards=shards
+    )
+    save_index(CHUNKS_DIR, shards)
+    print(f"\nTextos: {len(all_texts)}, Tabelas: {len(all_tables)}, Imagens: {len(all_images)} ({len(shards)} shards em {CHUNKS_DIR})")
+    return all_texts, all_tables, all_images, all_metadata
+
+
+def _load_summaries():
+    try:
+        with open(SUMMARIES_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return {kind: data.get(f"{kind[:-1]}_summaries", []) for kind in KINDS}
+
+
+def _write_summaries(summaries):
+    """Grava as listas finais de resumos (e descarta o checkpoint da sumarização)."""
+    tmp = SUMMARIES_PATH.with_name(SUMMARIES_PATH.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "text_summaries": summaries["texts"],
+            "table_summaries": summaries["tables"],
+            "image_summaries": summaries["images"]
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, SUMMARIES_PATH)
+
+
+def _summarize_and_index(retriever, all_texts, all_tables, all_images, all_metadata):
+    """
+    Resume os chunks e indexa resumos (vectorstore) e originais (docstore). Retorna
+    (resumos, doc_ids) por tipo. Os resumos prontos ficam num checkpoint em
+    SUMMARIES_PATH: se a indexação cair, a próxima só resume o que faltou.
+    """
+    from ..data.summarization import SummaryCheckpoint, summarize_elements, summarize_images, add_documents
+
+    print("\nResumindo os elementos extraídos...")
+    checkpoint = SummaryCheckpoint(SUMMARIES_PATH)
+    text_summaries = summarize_elements(all_texts, checkpoint=checkpoint)
+
+    # 🔹 Tabelas HTML completas (para o vetorstore)
+    all_tables_html = list(all_tables)
+
+    # 🔹 Versão textificada para os summaries, rotulada com o PDF de origem da tabela
+    table_summaries = []
+    for t, meta in zip(all_tables_html, all_metadata["tables"]):
+        filename = _table_label(meta)
+        plain_table = table_to_text(t)
+        plain_table = plain_table.replace("\n", " ").replace("  ", " ")
+        table_summaries.append(f"[TABELA EXTRAÍDA DE {filename}]\n{plain_table}")
+
+    image_summaries = summarize_images(all_images, checkpoint=checkpoint) if all_images else []
+    summaries = {"texts": text_summaries, "tables": table_summaries, "images": image_summaries}
+
+    # 🔹 Indexa os embeddings com cada tipo
+    ids = {
+        "texts": add_documents(all_texts, text_summaries, retriever, all_metadata["texts"]),
+        "tables": add_documents(all_tables_html, table_summaries, retriever, all_metadata["tables"]),
+        "images": add_documents(all_images, image_summaries, retriever, all_metadata["images"]),
+    }
+    return summaries, ids
+
+
+def _save_full_manifest(all_metadata, ids):
+    """Manifesto de uma indexação completa. Chunks sem ``source`` (cache antigo) não permitem manifesto."""
+    if any("source" not in meta for kind in KINDS for meta in all_metadata[kind]):
+        print("[manifest] Cache de chunks sem proveniência; manifesto não gerado (a próxima atualização reindexa tudo).")
+        INDEX_MANIFEST_PATH.unlink(missing_ok=True)
+        return
+    hashes = scan_sources(sorted(PDF_DIR.rglob("*.pdf")))
+    indexed = {meta["source"] for kind in KINDS for meta in all_metadata[kind]}
+    sources = [s for s in hashes if s in indexed]
+    save_manifest(record_documents(empty_manifest(), hashes, all_metadata, ids, sources), INDEX_MANIFEST_PATH)
+    print(f"[manifest] {len(sources)} PDFs registrados em {INDEX_MANIFEST_PATH}")
+
+
+def _delete_documents(vectorstore, store, doc_ids):
+    """Apaga vetores (por doc_id nos metadados) e originais."""
+    if not doc_ids:
+        return
+    for start in range(0, len(doc_ids), DELETE_BATCH):
+        vectorstore._collection.delete(where={"doc_id": {"$in": doc_ids[start:start + DELETE_BATCH]}})
+    store.mdelete(doc_ids)
+    if hasattr(store, "compact"):
+        store.compact()
+
+
+def _clear_index(vectorstore, store):
+    ids = vectorstore.get().get("ids", [])
+    for start in range(0, len(ids), DELETE_BATCH):
+        vectorstore.delete(ids=ids[start:start + DELETE_BATCH])
+    _delete_documents(vectorstore, store, list(store.yield_keys()))
+
+
+def _update_index(retriever, vectorstore, store):
+    """
+    Reindexação incremental pelo manifesto: extrai, resume e indexa só os PDFs
+    novos ou alterados e apaga vetores e originais dos removidos (e da versão
+    anterior dos alterados). Retorna False se não há manifesto.
+    """
+    from ..data.ingestion import extract_pdfs, relative_source
+
+    manifest = load_manifest(INDEX_MANIFEST_PATH)
+    if manifest is None:
+        return False
+    pdf_files = sorted(PDF_DIR.rglob("*.pdf"))
+    hashes = scan_sources(pdf_files)
+    changes = diff_sources(manifest, hashes)
+    if not changes:
+        print("[update] Nenhum PDF novo, alterado ou removido.")
+        return True
+    print(f"[update] {len(changes.added)} novos, {len(changes.changed)} alterados, {len(changes.removed)} removidos.")
+
+    stale = set(changes.changed + changes.removed)
+    stale_ids = doc_ids_of(manifest, stale)
+    if stale_ids:
+        _delete_documents(vectorstore, store, stale_ids)
+        print(f"[update] {len(stale_ids)} documentos apagados de PDFs alterados/removidos.")
+    forget_sources(manifest, stale)
+    save_manifest(manifest, INDEX_MANIFEST_PATH)
+
+    to_index = set(changes.added + changes.changed)
+    root = _chunk_cache()
+    failed, shards = [], []
+    texts, tables, images, metadata = extract_pdfs(
+        [pdf for pdf in pdf_files if relative_source(pdf) in to_index],
+        INGEST_WORKERS, INGEST_THREADS_PER_WORKER, root or CHUNKS_DIR,
+        failed_sources=failed, split_pages=INGEST_SPLIT_PAGES, shards=shards,
+    )
+    summaries, ids = _summarize_and_index(retriever, texts, tables, images, metadata)
+    record_documents(manifest, hashes, metadata, ids, sorted(to_index - set(failed)))
+    save_manifest(manifest, INDEX_MANIFEST_PATH)
+
+    # Caches de chunks e resumos: tira os PDFs alterados/removidos e acrescenta os novos
+    old_summaries = _load_summaries() if root is not None else None
+    if old_summaries is not None:
+        old_metadata = load_metadata(root)
+        for kind in KINDS:
+            keep = [meta.get("source") not in stale for meta in old_metadata[kind]]
+            if len(old_summaries[kind]) == len(keep):
+                summaries[kind] = [s for s, k in zip(old_summaries[kind], keep) if k] + summaries[kind]
+    update_cache(root or CHUNKS_DIR, stale, shards)
+    _write_summaries(summaries)
+    print(f"[update] {len(to_index) - len(failed)} PDFs indexados.")
+    return True
+
+
+def get_rag_components(force_regenerate=False, update_index=False):
     """
     Inicializa o retriever e a pipeline RAG.
     - Se force_regenerate=True ou não há vetores: refaz chunks, summaries, embeddings e docstore.
+    - Se update_index=True: reindexa só os PDFs novos, alterados ou removidos (manifesto).
     - Senão: se docstore está vazio, rehidrata só o docstore (sem re-embedar).
     """
     #0) Limpa docstore se pedir para regerar.
     if force_regenerate and PERSIST_DIR.exists():
         shutil.rmtree(PERSIST_DIR)
         print("[force_regenerate] Limpando diretório persistente...")
-    
-    # 1) Carrega/gera chunks (originais)
-    if not CHUNKS_PATH.exists() or force_regenerate:
-        pdf_files = list(PDF_DIR.rglob("*.pdf"))
-        print(f"{len(pdf_files)} arquivos PDF encontrados.")
-
-        all_texts, all_tables, all_images = [], [], []
-        for pdf in pdf_files:
-            chunks = extract_chunks_from_pdf(pdf)
-            texts, tables, images = classify_chunks(chunks)
-            
-            all_texts.extend(texts)
-            all_tables.extend(tables)
-            all_images.extend(images)
-
-        with open(CHUNKS_PATH, "w", encoding="utf-8") as f:
-            json.dump({"texts": all_texts, "tables": all_tables, "images": all_images}, f, ensure_ascii=False, indent=2)
-    else:
-        print("Usando cache de chunks existente.")
-        with open(CHUNKS_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        all_texts = data["texts"]
-        all_tables = data["tables"]
-        all_images = data["images"]
-
-    print(f"\nTextos: {len(all_texts)}, Tabelas: {len(all_tables)}, Imagens: {len(all_images)}")
 
-    # 2) Vectorstore + docstore (persistidos)
+    # Serviço com índice exportado pronto (numpy/faiss): não toca no Chroma nem nos chunks
+    backend = get_configured_backend()
+    if backend is not None and not force_regenerate and not update_index:
+        components = _load_index_components(backend)
+        if components is not None:
+            return components
+    
+    # 1) Vectorstore + docstore (persistidos)
     embedding_functions = get_embeddings_model()
 
     # Hack needed for AWS Lambda's base Python image (to work with an updated version of SQLite).
@@ -119,58 +452,172 @@ def get_rag_pipeline(force_regenerate=False):
         embedding_function=embedding_functions,
         persist_directory=get_runtime_chroma_path()
     )
-    docstore_dir = PERSIST_DIR / "docstore"
-    docstore_dir.mkdir(parents=True, exist_ok=True)
-    store = LocalFileStore(str(docstore_dir))
-    retriever = MultiVectorRetriever(vectorstore=vectorstore, docstore=store, id_key="doc_id", search_kwargs={"k": 20})
+    store = _open_docstore()
+    retriever = _make_retriever(vectorstore, store)
 
     vector_ids = vectorstore.get().get("ids", [])
     has_vectors = len(vector_ids) > 0
-    docstore_empty = _docstore_is_empty(docstore_dir)
-
-    # 3) Fluxos
-    if force_regenerate or not has_vectors:
-        print("\n[regen] Resumindo os elementos extraídos...")
-        text_summaries = summarize_elements(all_texts)
-
-        # 🔹 Tabelas HTML completas (para o vetorstore)
-        all_tables_html = list(all_tables)
+    docstore_empty = _store_is_empty(store)
 
-        # 🔹 Versão textificada para os summaries
-        table_summaries = []
-        for i, t in enumerate(all_tables_html):
-            filename = pdf_files[i % len(pdf_files)].stem.upper().replace("_", " ")
-            plain_table = table_to_text(t)
-            plain_table = plain_table.replace("\n", " ").replace("  ", " ")
-            table_summaries.append(f"[TABELA EXTRAÍDA DE {filename}]\n{plain_table}")
+    # 2) Fluxos. O cache de chunks só é aberto quando é usado (regen, rehydrate, backfill):
+    # servir com vetores e docstore prontos não o lê.
+    all_texts = all_tables = all_images = all_metadata = None
+    regenerate = force_regenerate or not has_vectors
+    if update_index and not regenerate and not _update_index(retriever, vectorstore, store):
+        # Índice anterior ao manifesto: não há como saber o que cada PDF gerou
+        print("[update] Índice sem manifesto; reindexando tudo uma vez (as próximas atualizações são incrementais).")
+        _clear_index(vectorstore, store)
+        all_texts, all_tables, all_images, all_metadata = _extract_all_pdfs()
+        regenerate = True
 
-        image_summaries = summarize_images(all_images) if all_images else []
+    if regenerate:
+        if all_texts is None:
+            # Chunks (originais): extrai se pedido ou se não há cache
+            if force_regenerate or _chunk_cache() is None:
+                all_texts, all_tables, all_images, all_metadata = _extract_all_pdfs()
+            else:
+                all_texts, all_tables, all_images, all_metadata = _load_cached_chunks()
+        summaries, ids = _summarize_and_index(retriever, all_texts, all_tables, all_images, all_metadata)
 
         # 🔹 Salva tudo no summaries.json
-        with open(SUMMARIES_PATH, "w", encoding="utf-8") as f:
-            json.dump({
-                "text_summaries": text_summaries,
-                "table_summaries": table_summaries,
-                "image_summaries": image_summaries
-            }, f, ensure_ascii=False, indent=2)
-
-        # 🔹 Indexa os embeddings com cada tipo
-        add_documents(all_texts, text_summaries, retriever)
-        add_documents(all_tables_html, table_summaries, retriever)
-        add_documents(all_images, image_summaries, retriever)
+        _write_summaries(summaries)
+        _save_full_manifest(all_metadata, ids)
 
         print("[regen] Embeddings, summaries e docstore gerados do zero.")
-    else:
+    elif not update_index:
         print("\nVetores indexados:", len(vector_ids))
         if docstore_empty:
             print("[rehydrate] Vetores existem, mas docstore está vazio. Rehidratando...")
-            # Precisamos apenas dos ORIGINAIS (CHUNKS_PATH). Summaries não são necessários aqui.
-            _rehydrate_docstore_only(retriever, all_texts, all_tables, all_images)
+            # Precisamos apenas dos ORIGINAIS (cache de chunks). Summaries não são necessários aqui.
+            _rehydrate_docstore_only(retriever)
         else:
             print("\nUsando embeddings e documentos previamente gerados.")
+        _backfill_metadata(vectorstore)
+        _tag_docstore_values(vectorstore, store)
+
+    retriever.filter_fields = _filter_fields(vectorstore)
+    index_version = compute_index_version(vectorstore)
+    if backend is not None:
+        _refresh_vector_index(backend, vectorstore)
+    if HYBRID_SEARCH_ENABLED:
+        retriever.lexical_index = _load_lexical_index(index_version, vectorstore, store)
+
+    return _assemble_components(retriever, embedding_functions, index_version)
+
 
-    # 4) Monta a chain
-    model = get_llama_model()
+_reranker = None
+
+
+def get_reranker():
+    """Cross-encoder único por processo (carregado na primeira pipeline que o usa)."""
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoderReranker.load(
+            RERANKER_MODEL,
+            batch_size=RERANKER_BATCH_SIZE,
+            cache_size=RERANKER_CACHE_SIZE,
+            max_chars=RERANKER_MAX_CHARS,
+        ) or False
+    return _reranker or None
+
+
+def _make_retriever(vectorstore, store, lexical_index=None):
+    reranker = get_reranker() if RERANKER_ENABLED else None
+    top_n = RETRIEVER_TOP_N if HYBRID_SEARCH_ENABLED else None
+    k = RETRIEVER_K
+    if reranker is not None:
+        # Busca largo e barato; o cross-encoder escolhe os RERANKER_TOP_N
+        top_n = RERANKER_CANDIDATES
+        k = max(RETRIEVER_K, RERANKER_CANDIDATES)
+    return MultiModalRetriever(
+        vectorstore=vectorstore,
+        docstore=store,
+        id_key="doc_id",
+        search_kwargs={"k": k},
+        lexical_index=lexical_index,
+        lexical_k=max(LEXICAL_K, top_n or 0),
+        top_n=top_n,
+        rrf_k=RRF_K,
+        reranker=reranker,
+        rerank_top_n=RERANKER_TOP_N,
+    )
+
+
+def _load_lexical_index(index_version, vectorstore=None, store=None):
+    """
+    Carrega o índice BM25 de LEXICAL_INDEX_PATH. Se ele falta ou é de outra versão
+    do índice vetorial, reconstrói a partir de resumos + originais (quando há
+    vectorstore/docstore com escrita) ou desativa a busca híbrida.
+    """
+    if LEXICAL_INDEX_PATH.exists():
+        lexical = LexicalIndex.load(LEXICAL_INDEX_PATH)
+        if lexical.index_version == index_version and (lexical.metadatas is not None or vectorstore is None):
+            print(f"[bm25] Índice lexical carregado: {len(lexical)} documentos.")
+            return lexical
+    if vectorstore is None or not hasattr(vectorstore, "_collection"):
+        print("[bm25] Índice lexical ausente ou desatualizado; usando só a busca vetorial.")
+        return None
+    lexical = LexicalIndex.build(collect_documents(vectorstore, store), index_version)
+    try:
+        lexical.save(LEXICAL_INDEX_PATH)
+        print(f"[bm25] Índice lexical gerado com {len(lexical)} documentos em {LEXICAL_INDEX_PATH}")
+    except OSError as e:
+        print(f"[bm25] Índice lexical gerado em memória (não foi possível salvar: {e})")
+    return lexical
+
+
+def get_configured_backend():
+    """Backend de VECTORSTORE_BACKEND (None = Chroma)."""
+    return get_vector_backend(
+        VECTORSTORE_BACKEND,
+        dtype=MMAP_INDEX_DTYPE,
+        quantization=MMAP_INDEX_QUANTIZATION,
+        rescore_factor=MMAP_INDEX_RESCORE_FACTOR,
+        faiss_options={
+            "index_type": FAISS_INDEX_TYPE,
+            "nlist": FAISS_NLIST,
+            "nprobe": FAISS_NPROBE,
+            "hnsw_m": FAISS_HNSW_M,
+            "ef_search": FAISS_EF_SEARCH,
+        },
+    )
+
+
+def _load_index_components(backend):
+    """Componentes sobre o índice exportado do backend, ou None se ele (ou o docstore) não está pronto."""
+    if not backend.is_current(VECTOR_INDEX_DIR):
+        # Cai no Chroma, que (re)exporta o índice com a configuração atual (se houver escrita)
+        print(f"[{backend.name}] Índice ausente ou com outra configuração; usando o Chroma.")
+        return None
+    store = _open_docstore()
+    if _store_is_empty(store):
+        print(f"[{backend.name}] Docstore vazio; usando o Chroma.")
+        return None
+    embedding_functions = get_embeddings_model()
+    vectorstore = backend.load(VECTOR_INDEX_DIR, embedding_functions)
+    print(f"[{backend.name}] Usando índice {backend.describe()}: {len(vectorstore)} vetores.")
+    lexical = _load_lexical_index(vectorstore.index_version) if HYBRID_SEARCH_ENABLED else None
+    retriever = _make_retriever(vectorstore, store, lexical)
+    retriever.filter_fields = _filter_fields(vectorstore)
+    return _assemble_components(retriever, embedding_functions, vectorstore.index_version)
+
+
+def _refresh_vector_index(backend, vectorstore):
+    """(Re)exporta o índice do backend se ele não existe ou está desatualizado em relação ao Chroma."""
+    if backend.is_current(VECTOR_INDEX_DIR, compute_index_version(vectorstore)):
+        return
+    try:
+        backend.build(vectorstore, VECTOR_INDEX_DIR)
+    except OSError as e:
+        # Ex.: Lambda com sistema de arquivos somente leitura; o índice deve vir pronto na imagem
+        print(f"[{backend.name}] Não foi possível exportar o índice para {VECTOR_INDEX_DIR}: {e}")
+
+
+def _assemble_components(retriever, embedding_functions, index_version):
+    # 3) Monta a chain
+    # Callback mede tempo até o primeiro token, duração e tokens do LLM (/metrics)
+    model = get_llama_model().with_config(callbacks=[LLMTimingCallback()])
+    generation = build_generation_chain(model)
     
     def extract_question(input_data):
         if isinstance(input_data, dict):
@@ -182,14 +629,35 @@ def get_rag_pipeline(force_regenerate=False):
             return input_data.get("history")
         return None
     
+    def extract_filters(input_data):
+        if isinstance(input_data, dict):
+            return input_data.get("filters")
+        return None
+
+    # Recuperação com os filtros de proveniência da entrada ({"question", "filters"})
+    def retrieve(input_data, config):
+        return retriever.invoke(extract_question(input_data), config, filters=extract_filters(input_data))
+
+    async def aretrieve(input_data, config):
+        return await retriever.ainvoke(extract_question(input_data), config, filters=extract_filters(input_data))
+
+    context_chain = RunnableLambda(retrieve, afunc=aretrieve) | _inline_lambda(timed("parse_docs", parse_docs))
+    if CONTEXT_PACKING_ENABLED:
+        context_chain = context_chain | _inline_lambda(timed("pack_context", pack_context))
+
+    # Funciona com invoke (CLI) e ainvoke/astream (API): no caminho assíncrono,
+    # embeddings, retriever e modelo usam os clientes assíncronos de cada provedor.
     chain_with_sources = (
         {
-            "context": RunnableLambda(extract_question) | retriever | RunnableLambda(parse_docs), 
-            "question": RunnableLambda(extract_question),
-            "history": RunnableLambda(extract_history)
+            "context": context_chain,
+            "question": _inline_lambda(extract_question),
+            "history": _inline_lambda(extract_history)
         }
-        | RunnablePassthrough().assign(
-            response=(RunnableLambda(build_prompt) | model | StrOutputParser())
-        )
+        | RunnablePassthrough().assign(response=generation)
     )
-    return chain_with_sources
\ No newline at end of file
+
+    if SEMANTIC_CACHE_ENABLED:
+        cache = get_semantic_cache()
+        cache.ensure_index_version(index_version)
+        chain_with_sources = SemanticCachedChain(chain_with_sources, embedding_functions, cache)
+    return RagComponents(chain_with_sources, retriever, generation)
\ No newline at end of file
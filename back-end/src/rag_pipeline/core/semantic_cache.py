@@ -0,0 +1,178 @@
+"""
+Cache semântico de respostas na frente da chain RAG.
+
+Perguntas sem histórico são embedadas e comparadas (cosseno) com as
+perguntas já respondidas; acima do limiar, a resposta e o contexto
+guardados são devolvidos sem chamar retriever nem LLM.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.runnables import Runnable
+
+from .metrics import stage_timer
+from ..config import (
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+
+
+def _normalize(vector):
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class SemanticCache:
+    """Cache LRU + TTL indexado pelo embedding da pergunta."""
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (vetor normalizado, valor, criado_em)
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def ensure_index_version(self, index_version):
+        """Invalida tudo se o índice (vetores/docstore) mudou desde o último uso."""
+        with self._lock:
+            if self.index_version != index_version:
+                if self._entries:
+                    print(f"[semantic_cache] Índice mudou ({self.index_version} -> {index_version}). Limpando cache.")
+                self._entries.clear()
+                self.index_version = index_version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self, now):
+        expired = [k for k, (_, _, created) in self._entries.items() if now - created > self.ttl_seconds]
+        for k in expired:
+            del self._entries[k]
+
+    def lookup(self, vector):
+        """Retorna o valor guardado mais similar (>= threshold) ou None."""
+        query = _normalize(vector)
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            if not self._entries:
+                self.misses += 1
+                return None
+            keys = list(self._entries.keys())
+            matrix = np.stack([self._entries[k][0] for k in keys])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][1]
+
+    def store(self, vector, value):
+        with self._lock:
+            self._entries[self._next_key] = (_normalize(vector), value, time.monotonic())
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "index_version": self.index_version,
+        }
+
+
+_semantic_cache = None
+
+
+def get_semantic_cache():
+    """Cache único por processo (sobrevive a reconstruções da pipeline)."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+
+def _cacheable_question(input_data):
+    """Só perguntas sem histórico nem filtros entram no cache. Retorna a pergunta ou None."""
+    if isinstance(input_data, dict):
+        if input_data.get("history") or input_data.get("filters"):
+            return None
+        return input_data.get("question")
+    return input_data
+
+
+class SemanticCachedChain(Runnable):
+    """Envolve a chain de ``get_rag_pipeline`` consultando o cache semântico antes."""
+
+    def __init__(self, chain, embeddings, cache):
+        self.chain = chain
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def _hit(self, cached, question):
+        return {**cached, "question": question, "history": None}
+
+    def _to_store(self, result):
+        return {"context": result["context"], "response": result["response"]}
+
+    def invoke(self, input, config=None, **kwargs):
+        question = _cacheable_question(input)
+        if question is None:
+            return self.chain.invoke(input, config, **kwargs)
+        with stage_timer("semantic_cache"):
+            vector = self.embeddings.embed_query(question)
+            cached = self.cache.lookup(vector)
+        if cached is not None:
+            return self._hit(cached, question)
+        result = self.chain.invoke(input, config, **kwargs)
+        self.cache.store(vector, self._to_store(result))
+        return result
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        question = _cacheable_question(input)
+        if question is None:
+            return await self.chain.ainvoke(input, config, **kwargs)
+        with stage_timer("semantic_cache"):
+            vector = await self.embeddings.aembed_query(question)
+            cached = self.cache.lookup(vector)
+        if cached is not None:
+            return self._hit(cached, question)
+        result = await self.chain.ainvoke(input, config, **kwargs)
+        self.cache.store(vector, self._to_store(result))
+        return result
+
+    async def astream(self, input, config=None, **kwargs):
+        question = _cacheable_question(input)
+        if question is None:
+            async for chunk in self.chain.astream(input, config, **kwargs):
+                yield chunk
+            return
+        with stage_timer("semantic_cache"):
+            vector = await self.embeddings.aembed_query(question)
+            cached = self.cache.lookup(vector)
+        if cached is not None:
+            # Hit: contexto e resposta completos num único chunk
+            yield self._hit(cached, question)
+            return
+        final = None
+        async for chunk in self.chain.astream(input, config, **kwargs):
+            final = chunk if final is None else final + chunk
+            yield chunk
+        if final is not None and "response" in final and "context" in final:
+            self.cache.store(vector, self._to_store(final))
@@ -0,0 +1,49 @@
+"""Coalescência (single-flight) de perguntas idênticas simultâneas."""
+import asyncio
+import json
+
+
+def normalize_key(question, history=None, filters=None):
+    """Chave da pergunta: minúsculas e espaços colapsados, junto com o histórico e os filtros."""
+    def norm(text):
+        return " ".join(text.lower().split()) if text else ""
+    return norm(question), norm(history), json.dumps(filters, sort_keys=True) if filters else ""
+
+
+class SingleFlight:
+    """
+    Enquanto uma computação para a chave está em andamento, chamadas com a
+    mesma chave aguardam o mesmo resultado em vez de iniciar outra.
+    Nada é guardado depois que a computação termina (sem risco de resposta velha).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key, fn):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        # shield: se um cliente desconectar, a computação segue para os demais
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # marca a exceção como consumida
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.calls - self.executions,
+            "collapse_ratio": (self.calls - self.executions) / self.calls if self.calls else 0.0,
+            "in_flight": len(self._inflight),
+        }
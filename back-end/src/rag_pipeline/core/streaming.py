@@ -0,0 +1,46 @@
+"""Streaming da resposta da chain RAG (SSE ou JSON lines)."""
+import json
+
+from .assets import context_payload
+
+SSE_MEDIA_TYPE = "text/event-stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def choose_stream_format(accept):
+    """
+    Escolhe o formato do stream a partir do header Accept.
+    Padrão: SSE. Use 'Accept: application/x-ndjson' para JSON lines.
+    """
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        return NDJSON_MEDIA_TYPE
+    return SSE_MEDIA_TYPE
+
+
+def format_event(event, data, media_type=SSE_MEDIA_TYPE):
+    """Serializa um evento no formato escolhido (SSE ou uma linha JSON)."""
+    if media_type == NDJSON_MEDIA_TYPE:
+        return json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def astream_answer(pipeline, payload, include_context=True, assets_base_url=""):
+    """
+    Itera a chain de ``get_rag_pipeline`` emitindo pares (evento, dados).
+
+    A chain termina em ``RunnablePassthrough().assign(response=...)``, que
+    repassa as chaves de entrada (context, question, history) assim que o
+    retriever termina e só depois transmite os tokens do modelo. Por isso o
+    evento 'context' sai com a latência da busca, seguido dos 'token'.
+    Ao final é emitido 'done' com a resposta completa. ``assets_base_url``:
+    prefixo das URLs das imagens (ver core/assets.py).
+    """
+    tokens = []
+    async for chunk in pipeline.astream(payload):
+        if "context" in chunk and include_context:
+            yield "context", context_payload(chunk["context"], assets_base_url)
+        token = chunk.get("response")
+        if token:
+            tokens.append(token)
+            yield "token", {"token": token}
+    yield "done", {"response": "".join(tokens)}
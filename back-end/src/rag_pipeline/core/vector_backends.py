@@ -0,0 +1,208 @@
+"""
+Backends de busca vetorial, escolhidos por VECTORSTORE_BACKEND.
+
+A indexação sempre grava no Chroma (``add_documents``); os demais backends são
+índices somente leitura exportados a partir dele para VECTOR_INDEX_DIR e
+reexportados quando a coleção (ou a configuração do backend) muda:
+
+- ``chroma``: busca direto na coleção (HNSW do Chroma, SQLite);
+- ``numpy``: ``MmapVectorStore``, força bruta NumPy sobre mmap (quantização opcional);
+- ``faiss``: FAISS ``flat`` (exato), ``ivf`` ou ``hnsw`` sobre os mesmos arquivos.
+  Buscas com filtro usam a varredura exata NumPy nas linhas filtradas.
+
+Cada backend implementa ``build`` (exporta e persiste), ``is_current``
+(índice em disco corresponde à coleção e à configuração) e ``load``
+(VectorStore somente leitura com ``search_doc_ids`` para buscas em lote).
+
+Dependência opcional: ``pip install faiss-cpu``. Sem ela, ``faiss`` cai no ``numpy``.
+
+Uso (gera o índice do backend configurado e, com HYBRID_SEARCH_ENABLED, o BM25;
+o Dockerfile roda isto no build da imagem, já que o Lambda não escreve fora de /tmp):
+    VECTORSTORE_BACKEND=faiss FAISS_INDEX_TYPE=hnsw python -m rag_pipeline.core.vector_backends
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from .filters import normalize_where
+from .vector_index import META_FILE, MmapVectorStore, export_vector_index, read_index_meta, vector_index_exists
+
+BACKENDS = ("chroma", "numpy", "faiss")
+FAISS_INDEX_TYPES = ("flat", "ivf", "hnsw")
+FAISS_FILE = "faiss.index"
+# Pontos de treino por lista que o FAISS recomenda no IVF
+IVF_POINTS_PER_LIST = 39
+HNSW_EF_CONSTRUCTION = 200
+
+
+class NumpyBackend:
+    name = "numpy"
+
+    def __init__(self, dtype="float16", quantization="none", rescore_factor=4):
+        self.dtype = str(np.dtype(dtype))
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+
+    def settings(self):
+        """Configuração que, se mudar, exige reexportar o índice."""
+        return {"dtype": self.dtype, "quantization": self.quantization}
+
+    def describe(self):
+        return f"{self.name} ({self.dtype}, quantização {self.quantization})"
+
+    def is_current(self, index_dir, index_version=None):
+        if not vector_index_exists(index_dir):
+            return False
+        meta = read_index_meta(index_dir)
+        if index_version is not None and meta.get("index_version") != index_version:
+            return False
+        # "fields": colunas de proveniência; índices exportados antes delas são refeitos
+        defaults = {"quantization": "none"}
+        return "fields" in meta and all(meta.get(k, defaults.get(k)) == v for k, v in self.settings().items())
+
+    def build(self, vectorstore, index_dir):
+        return export_vector_index(vectorstore, index_dir, self.dtype, quantization=self.quantization)
+
+    def load(self, index_dir, embedding):
+        return MmapVectorStore(index_dir, embedding, self.rescore_factor)
+
+
+class FaissBackend(NumpyBackend):
+    name = "faiss"
+
+    def __init__(self, dtype="float16", index_type="flat", nlist=100, nprobe=10, hnsw_m=32, ef_search=64):
+        super().__init__(dtype)
+        if index_type not in FAISS_INDEX_TYPES:
+            raise ValueError(f"FAISS_INDEX_TYPE inválido: {index_type}. Use: {', '.join(FAISS_INDEX_TYPES)}.")
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+
+    @staticmethod
+    def available():
+        try:
+            import faiss  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def settings(self):
+        params = {"type": self.index_type}
+        if self.index_type == "ivf":
+            params["nlist"] = self.nlist
+        elif self.index_type == "hnsw":
+            params["m"] = self.hnsw_m
+        return {**super().settings(), "faiss": params}
+
+    def describe(self):
+        return f"faiss {self.index_type} ({self.dtype})"
+
+    def build(self, vectorstore, index_dir):
+        meta = super().build(vectorstore, index_dir)
+        build_faiss_index(index_dir, self.settings()["faiss"])
+        meta["faiss"] = self.settings()["faiss"]
+        _write_meta(index_dir, meta)
+        return meta
+
+    def load(self, index_dir, embedding):
+        return FaissVectorStore(index_dir, embedding, nprobe=self.nprobe, ef_search=self.ef_search)
+
+
+def _write_meta(index_dir, meta):
+    with open(Path(index_dir) / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def build_faiss_index(index_dir, params):
+    """Cria o índice FAISS a partir dos vetores exportados (vectors.npy) e grava em ``index_dir``."""
+    import faiss
+
+    store = MmapVectorStore(index_dir, None)
+    vectors = np.ascontiguousarray(store._vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    if params["type"] == "ivf":
+        # Listas demais para poucos vetores deixam o treino instável
+        nlist = max(1, min(params["nlist"], count // IVF_POINTS_PER_LIST))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        index.train(vectors)
+    elif params["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["m"])
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    faiss.write_index(index, str(Path(index_dir) / FAISS_FILE))
+    print(f"[faiss] Índice {params['type']} com {count} vetores gravado em {index_dir}")
+
+
+class FaissVectorStore(MmapVectorStore):
+    """``MmapVectorStore`` cuja busca sem filtro usa um índice FAISS (distâncias L2² como o Chroma)."""
+
+    def __init__(self, index_dir, embedding, nprobe=10, ef_search=64):
+        import faiss
+
+        super().__init__(index_dir, embedding)
+        self._faiss = faiss.read_index(str(Path(index_dir) / FAISS_FILE))
+        if hasattr(self._faiss, "nprobe"):
+            self._faiss.nprobe = nprobe
+        if hasattr(self._faiss, "hnsw"):
+            self._faiss.hnsw.efSearch = ef_search
+
+    def _top_k(self, queries, k, where=None):
+        if normalize_where(where):
+            return super()._top_k(queries, k, where)
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        k = min(k, len(self))
+        if k == 0:
+            return super()._top_k(queries, k)
+        dist, rows = self._faiss.search(queries, k)
+        # IVF com nprobe baixo pode achar menos de k vizinhos (-1): essas perguntas vão pela busca exata
+        short = (rows < 0).any(axis=1)
+        if short.any():
+            rows[short], dist[short] = super()._top_k(queries[short], k)
+        return rows, dist
+
+
+def get_vector_backend(name, dtype="float16", quantization="none", rescore_factor=4, faiss_options=None):
+    """Backend configurado, ou None para o Chroma. ``faiss`` sem a biblioteca cai no ``numpy``."""
+    if name == "chroma":
+        return None
+    if name == "faiss":
+        if FaissBackend.available():
+            return FaissBackend(dtype, **(faiss_options or {}))
+        print("[vector_backend] faiss-cpu não instalado; usando o backend numpy.")
+    return NumpyBackend(dtype, quantization, rescore_factor)
+
+
+def main():
+    from langchain_community.vectorstores import Chroma
+
+    from ..config import HYBRID_SEARCH_ENABLED, VECTOR_INDEX_DIR, get_runtime_chroma_path
+    from .models import get_embeddings_model
+    from .retriever_pipeline import _load_lexical_index, _open_docstore, compute_index_version, get_configured_backend
+
+    parser = argparse.ArgumentParser(description="Exporta a coleção do Chroma para o backend de VECTORSTORE_BACKEND.")
+    parser.add_argument("--out", default=str(VECTOR_INDEX_DIR), help="Diretório do índice.")
+    args = parser.parse_args()
+
+    backend = get_configured_backend()
+    if backend is None:
+        parser.error("VECTORSTORE_BACKEND=chroma busca direto na coleção; não há índice a exportar.")
+    vectorstore = Chroma(
+        collection_name="multi_modal_rag",
+        embedding_function=get_embeddings_model(),
+        persist_directory=get_runtime_chroma_path(),
+    )
+    backend.build(vectorstore, args.out)
+    print(f"[vector_backend] Índice {backend.describe()} pronto em {args.out}")
+    # O serviço sobre o índice exportado só carrega o BM25 (não o gera sem o Chroma)
+    if HYBRID_SEARCH_ENABLED:
+        _load_lexical_index(compute_index_version(vectorstore), vectorstore, _open_docstore())
+
+
+if __name__ == "__main__":
+    main()
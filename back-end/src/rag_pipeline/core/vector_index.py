@@ -0,0 +1,325 @@
+"""
+Índice vetorial somente leitura, mapeado em memória (NumPy mmap).
+
+``export_vector_index`` copia os vetores da coleção do Chroma para uma
+matriz compacta (float32 ou float16) e arrays paralelos de ids/doc_ids.
+``MmapVectorStore`` faz o top-k com NumPy direto sobre o mmap: não precisa
+copiar o Chroma para /tmp, nem de SQLite ou permissão de escrita, e o
+cold start só lê as páginas que a busca toca. Com filtro (``where``), só as
+linhas que passam nas colunas de proveniência são lidas.
+
+A distância é a mesma do Chroma (L2 ao quadrado), então a ordem dos
+resultados é a mesma da coleção original.
+
+Quantização opcional (``quantization``): além dos vetores, grava códigos int8
+(escala por dimensão, 1 byte por dimensão) ou binários (sinal em relação à
+média, 1 bit por dimensão). A primeira passada percorre só os códigos; os
+``k * rescore_factor`` melhores candidatos são reordenados com os vetores de
+precisão cheia, lidos do mmap apenas nessas linhas.
+
+Uso (exporta a coleção atual):
+    python -m rag_pipeline.core.vector_index [--dtype float16] [--quantization int8]
+"""
+import argparse
+import json
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from .filters import FILTERABLE_FIELDS, INT_FIELDS, MISSING_INT, normalize_where, where_mask
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.npy"
+SQ_NORMS_FILE = "sq_norms.npy"
+IDS_FILE = "ids.npy"
+DOC_IDS_FILE = "doc_ids.npy"
+FIELD_FILE = "field_{}.npy"  # uma coluna por campo de proveniência (filtros)
+CODES_FILE = "codes.npy"
+QUANT_PARAMS_FILE = "quant_params.npy"  # int8: escala por dimensão; binary: média por dimensão
+
+QUANTIZATIONS = ("none", "int8", "binary")
+# Bits ligados em cada byte (distância de Hamming dos códigos binários)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Linhas convertidas para float32 por vez na busca (limita memória com float16)
+SEARCH_BLOCK_ROWS = 65536
+EXPORT_PAGE_SIZE = 5000
+
+
+def vector_index_exists(index_dir):
+    return (Path(index_dir) / META_FILE).exists()
+
+
+def read_index_meta(index_dir):
+    with open(Path(index_dir) / META_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_codes(tmp_dir, vectors, quantization, abs_max, total):
+    """Códigos da primeira passada, calculados bloco a bloco sobre os vetores já gravados."""
+    count, dim = vectors.shape
+    if quantization == "int8":
+        params = np.where(abs_max > 0, abs_max / 127.0, 1.0).astype(np.float32)
+        shape, dtype = (count, dim), np.int8
+    else:
+        params = (total / count).astype(np.float32)
+        shape, dtype = (count, (dim + 7) // 8), np.uint8
+    codes = np.lib.format.open_memmap(tmp_dir / CODES_FILE, mode="w+", dtype=dtype, shape=shape)
+    for start in range(0, count, SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        if quantization == "int8":
+            codes[start:start + len(block)] = np.clip(np.rint(block / params), -127, 127)
+        else:
+            codes[start:start + len(block)] = np.packbits(block > params, axis=1)
+    codes.flush()
+    del codes
+    np.save(tmp_dir / QUANT_PARAMS_FILE, params)
+
+
+def export_vector_index(vectorstore, index_dir, dtype="float16", id_key="doc_id", quantization="none"):
+    """
+    Exporta os vetores de um Chroma para ``index_dir``. Escreve num diretório
+    temporário e troca no final, então um índice antigo nunca fica pela metade.
+    """
+    from .retriever_pipeline import compute_index_version
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Quantização inválida: {quantization}. Use: {', '.join(QUANTIZATIONS)}.")
+    index_dir = Path(index_dir)
+    collection = vectorstore._collection
+    count = collection.count()
+    if count == 0:
+        raise ValueError("Coleção vazia: nada para exportar.")
+
+    first = collection.get(limit=1, include=["embeddings"])
+    dim = len(first["embeddings"][0])
+
+    tmp_dir = index_dir.with_name(index_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    vectors = np.lib.format.open_memmap(tmp_dir / VECTORS_FILE, mode="w+", dtype=np.dtype(dtype), shape=(count, dim))
+    sq_norms = np.empty(count, dtype=np.float32)
+    abs_max, total = np.zeros(dim, dtype=np.float32), np.zeros(dim, dtype=np.float64)
+    ids, doc_ids = [], []
+    fields = {f: [] for f in FILTERABLE_FIELDS}
+    for offset in range(0, count, EXPORT_PAGE_SIZE):
+        page = collection.get(limit=EXPORT_PAGE_SIZE, offset=offset, include=["embeddings", "metadatas"])
+        block = np.asarray(page["embeddings"], dtype=np.float32)
+        end = offset + len(block)
+        vectors[offset:end] = block
+        # Normas calculadas sobre o valor armazenado (após o cast), coerentes com a busca
+        stored = vectors[offset:end].astype(np.float32)
+        sq_norms[offset:end] = np.einsum("ij,ij->i", stored, stored)
+        abs_max = np.maximum(abs_max, np.abs(stored).max(axis=0))
+        total += stored.sum(axis=0)
+        ids.extend(page["ids"])
+        doc_ids.extend((m or {}).get(id_key, "") for m in page["metadatas"])
+        for field, column in fields.items():
+            missing = MISSING_INT if field in INT_FIELDS else ""
+            column.extend((m or {}).get(field, missing) for m in page["metadatas"])
+    vectors.flush()
+    if quantization != "none":
+        _write_codes(tmp_dir, vectors, quantization, abs_max, total)
+    del vectors
+
+    np.save(tmp_dir / SQ_NORMS_FILE, sq_norms)
+    np.save(tmp_dir / IDS_FILE, np.array(ids))
+    np.save(tmp_dir / DOC_IDS_FILE, np.array(doc_ids))
+    for field, column in fields.items():
+        column_dtype = np.int32 if field in INT_FIELDS else np.str_
+        np.save(tmp_dir / FIELD_FILE.format(field), np.array(column, dtype=column_dtype))
+    meta = {
+        "count": count,
+        "dim": dim,
+        "dtype": str(np.dtype(dtype)),
+        "metric": "l2",
+        "quantization": quantization,
+        "id_key": id_key,
+        "fields": list(FILTERABLE_FIELDS),
+        "index_version": compute_index_version(vectorstore),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    if index_dir.exists():
+        shutil.rmtree(index_dir)
+    tmp_dir.rename(index_dir)
+    print(f"[vector_index] {count} vetores ({dim}d, {meta['dtype']}, quantização {quantization}) exportados para {index_dir}")
+    return meta
+
+
+class MmapVectorStore(VectorStore):
+    """VectorStore somente leitura sobre o índice exportado por ``export_vector_index``."""
+
+    def __init__(self, index_dir, embedding, rescore_factor=4):
+        index_dir = Path(index_dir)
+        self.index_dir = index_dir
+        self.meta = read_index_meta(index_dir)
+        self.id_key = self.meta.get("id_key", "doc_id")
+        self.index_version = self.meta.get("index_version")
+        self._embedding = embedding
+        self._vectors = np.load(index_dir / VECTORS_FILE, mmap_mode="r")
+        self._sq_norms = np.load(index_dir / SQ_NORMS_FILE, mmap_mode="r")
+        self._ids = np.load(index_dir / IDS_FILE, mmap_mode="r")
+        self._doc_ids = np.load(index_dir / DOC_IDS_FILE, mmap_mode="r")
+        self._fields = {
+            f: np.load(index_dir / FIELD_FILE.format(f), mmap_mode="r") for f in self.meta.get("fields", [])
+        }
+        self.quantization = self.meta.get("quantization", "none")
+        self.rescore_factor = max(1, rescore_factor)
+        if self.quantization != "none":
+            self._codes = np.load(index_dir / CODES_FILE, mmap_mode="r")
+            self._quant_params = np.load(index_dir / QUANT_PARAMS_FILE)
+
+    def __len__(self):
+        return self._vectors.shape[0]
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("MmapVectorStore é somente leitura; reexporte o índice a partir do Chroma.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Use export_vector_index para criar o índice.")
+
+    def get(self, include=None):
+        """Subconjunto de ``Chroma.get`` (ids e metadados), usado para versionar o índice."""
+        return {
+            "ids": [str(i) for i in self._ids],
+            "metadatas": [{self.id_key: str(d)} for d in self._doc_ids],
+        }
+
+    def present_fields(self):
+        """Campos filtráveis com valor em ao menos uma linha (ver ``filters.present_fields``)."""
+        return frozenset(
+            f for f, column in self._fields.items()
+            if (np.asarray(column) != (MISSING_INT if f in INT_FIELDS else "")).any()
+        )
+
+    def _candidate_rows(self, where):
+        """Linhas que passam no filtro (None = todas)."""
+        where = normalize_where(where)
+        if not where:
+            return None
+        return np.flatnonzero(where_mask(self._fields, where, len(self)))
+
+    def _block_distances(self, queries, rows):
+        """Distâncias (L2², sem o termo ||q||²) das perguntas às linhas ``rows``, na precisão cheia."""
+        # ||v - q||² = ||v||² - 2 v·q + ||q||² (o último termo não muda a ordem)
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        return self._sq_norms[rows] - 2.0 * (queries @ block.T)
+
+    def _block_approx(self, prepared, rows):
+        """Distâncias aproximadas sobre os códigos quantizados (primeira passada)."""
+        codes = np.asarray(self._codes[rows])
+        if self.quantization == "int8":
+            return self._sq_norms[rows] - 2.0 * (prepared @ codes.astype(np.float32).T)
+        # binary: distância de Hamming entre os sinais (uma pergunta por vez limita a memória)
+        return np.stack([_POPCOUNT[np.bitwise_xor(q, codes)].sum(axis=1, dtype=np.float32) for q in prepared])
+
+    def _prepare(self, queries):
+        if self.quantization == "int8":
+            return queries * self._quant_params
+        return np.packbits(queries > self._quant_params, axis=1)
+
+    def _scan(self, queries, candidates, n, distances):
+        dist = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, n)
+            rows = slice(start, end) if candidates is None else candidates[start:end]
+            dist[:, start:end] = distances(queries, rows)
+        return dist
+
+    def _rescore(self, queries, rows, k):
+        """Reordena os candidatos de cada pergunta com os vetores de precisão cheia."""
+        out_rows = np.empty((len(queries), k), dtype=np.int64)
+        out_dist = np.empty((len(queries), k), dtype=np.float32)
+        for i, (query, candidates) in enumerate(zip(queries, rows)):
+            candidates = np.sort(candidates)  # leitura do mmap em ordem de disco
+            dist = self._block_distances(query[None, :], candidates)
+            best = _smallest(dist, k)[0]
+            out_rows[i], out_dist[i] = candidates[best], dist[0, best]
+        return out_rows, out_dist
+
+    def _top_k(self, queries, k, where=None):
+        """Linhas das k mais próximas (L2) de cada pergunta, em ordem crescente de distância."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        candidates = self._candidate_rows(where)
+        n = len(self) if candidates is None else len(candidates)
+        k = min(k, n)
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        q_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+        if self.quantization == "none":
+            dist = self._scan(queries, candidates, n, self._block_distances)
+            positions = _smallest(dist, k)
+            scores = np.take_along_axis(dist, positions, axis=1) + q_sq
+            return (positions if candidates is None else candidates[positions]), scores
+        approx = self._scan(self._prepare(queries), candidates, n, self._block_approx)
+        positions = _smallest(approx, min(n, k * self.rescore_factor))
+        rows, dist = self._rescore(queries, positions if candidates is None else candidates[positions], k)
+        return rows, dist + q_sq
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        rows, scores = self._top_k(embedding, k, filter)
+        return [
+            (Document(page_content="", metadata={self.id_key: str(self._doc_ids[r])}), float(s))
+            for r, s in zip(rows[0], scores[0])
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def search_doc_ids(self, vectors, k=4, where=None):
+        """Busca em lote: doc_ids das k linhas mais próximas de cada vetor (uma multiplicação de matrizes)."""
+        rows, _ = self._top_k(vectors, k, where)
+        return [[str(self._doc_ids[r]) for r in row] for row in rows]
+
+
+def _smallest(dist, k):
+    """Posições das k menores distâncias de cada linha, em ordem crescente."""
+    n = dist.shape[1]
+    if k < n:
+        part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n), (len(dist), 1))
+    order = np.take_along_axis(dist, part, axis=1).argsort(axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def main():
+    from langchain_community.vectorstores import Chroma
+
+    from ..config import MMAP_INDEX_DTYPE, MMAP_INDEX_QUANTIZATION, VECTOR_INDEX_DIR, get_runtime_chroma_path
+    from .models import get_embeddings_model
+
+    parser = argparse.ArgumentParser(description="Exporta a coleção do Chroma para o índice mmap.")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default=MMAP_INDEX_DTYPE)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=MMAP_INDEX_QUANTIZATION,
+                        help="Códigos da primeira passada (reordenada com os vetores de precisão cheia).")
+    parser.add_argument("--out", default=str(VECTOR_INDEX_DIR), help="Diretório do índice.")
+    args = parser.parse_args()
+
+    vectorstore = Chroma(
+        collection_name="multi_modal_rag",
+        embedding_function=get_embeddings_model(),
+        persist_directory=get_runtime_chroma_path(),
+    )
+    export_vector_index(vectorstore, args.out, args.dtype, quantization=args.quantization)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Cache de chunks classificados em shards, um por PDF.
+
+O antigo ``chunks_classificados.json`` era um único JSON indentado com todos os
+textos, tabelas e imagens em base64: qualquer leitura (até só dos metadados)
+carregava o corpus inteiro na memória. Aqui cada PDF (``source``) tem:
+
+- ``<nome>.jsonl``: uma linha de informações ({"kind": "info", "source",
+  "counts", "extraction"}) e uma linha por chunk ({"kind", "meta", "content"}),
+  na ordem da extração; imagens têm ``offset``/``size`` no lugar de ``content``;
+- ``<nome>.bin``: as imagens em binário, uma após a outra (sem base64).
+
+A extração (data/ingestion.py) grava cada PDF direto no seu shard, com nome
+derivado do PDF e da configuração de extração: o mesmo shard serve para
+retomar uma extração interrompida e para reidratar o docstore.
+
+``index.json`` lista os shards na ordem de indexação (a ordem global de cada
+tipo é a concatenação dos shards). As leituras são em streaming, shard a
+shard: só os metadados, só um tipo, só alguns PDFs, imagens em bytes ou base64.
+Gravações são atômicas (arquivo temporário + ``os.replace``) e o índice é o
+último a ser gravado.
+
+Um ``chunks_classificados.json`` antigo é migrado na primeira leitura.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from .manifest import KINDS, MODALITY_BY_KIND
+
+CHUNK_CACHE_VERSION = 1
+INDEX_FILE = "index.json"
+INFO_KIND = "info"
+# Chunks de caches antigos, sem proveniência
+NO_SOURCE = "_sem_fonte"
+_SLUG_RE = re.compile(r"[^\w-]+")
+_SHARD_SUFFIXES = (".jsonl.tmp", ".bin.tmp", ".jsonl", ".bin")
+
+
+def shard_name(source, digest):
+    """Nome do shard: o PDF legível e um hash (do PDF + extração, ou do conteúdo), então versões não colidem."""
+    return f"{_SLUG_RE.sub('_', Path(source or NO_SOURCE).stem)[:60]}.{digest[:12]}"
+
+
+def _content_digest(source, body, images):
+    digest = hashlib.sha1((source or NO_SOURCE).encode("utf-8") + b"\x00" + body)
+    for data in images:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _replace_atomic(path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def load_index(root):
+    """Shards na ordem de indexação, ou None se não há cache (ou é de outra versão)."""
+    try:
+        with open(Path(root) / INDEX_FILE, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return index["shards"] if index.get("version") == CHUNK_CACHE_VERSION else None
+
+
+def _save_index(root, shards):
+    data = json.dumps({"version": CHUNK_CACHE_VERSION, "shards": shards}, ensure_ascii=False, indent=2)
+    _replace_atomic(Path(root) / INDEX_FILE, lambda f: f.write(data.encode("utf-8")))
+
+
+def write_shard(root, source, chunks, metadata, name=None, extraction=None):
+    """
+    Grava o shard de um PDF e devolve a sua entrada no índice. ``chunks``/``metadata``:
+    {tipo: [...]} alinhados; ``name`` (senão, pelo conteúdo); ``extraction``:
+    estatísticas da extração, guardadas na linha de informações.
+    """
+    lines, images = [], []
+    offset = 0
+    for kind in KINDS:
+        for content, meta in zip(chunks.get(kind, []), metadata.get(kind, [])):
+            record = {"kind": kind, "meta": meta}
+            if kind == "images":
+                data = base64.b64decode(content) if isinstance(content, str) else bytes(content)
+                record.update(offset=offset, size=len(data))
+                images.append(data)
+                offset += len(data)
+            else:
+                record["content"] = content
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+    counts = {kind: min(len(chunks.get(kind, [])), len(metadata.get(kind, []))) for kind in KINDS}
+    info = {"kind": INFO_KIND, "source": source, "counts": counts}
+    if extraction is not None:
+        info["extraction"] = extraction
+
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    body = (json.dumps(info, ensure_ascii=False) + "\n" + "".join(lines)).encode("utf-8")
+    name = name or shard_name(source, _content_digest(source, body, images))
+    # O .jsonl é o último: se ele existe, o shard está completo
+    _replace_atomic(root / f"{name}.bin", lambda f: f.writelines(images))
+    _replace_atomic(root / f"{name}.jsonl", lambda f: f.write(body))
+    return {"source": source, "name": name, "counts": counts}
+
+
+def read_info(root, name):
+    """Linha de informações do shard ``name`` (com a entrada do índice em ``shard``), ou None se ele não existe."""
+    try:
+        with open(Path(root) / f"{name}.jsonl", "r", encoding="utf-8") as f:
+            info = json.loads(f.readline())
+    except (OSError, json.JSONDecodeError):
+        return None
+    if info.get("kind") != INFO_KIND:
+        return None
+    info["shard"] = {"source": info["source"], "name": name, "counts": info["counts"]}
+    return info
+
+
+def _group_by_source(chunks, metadata, order=None):
+    """{source: ({tipo: chunks}, {tipo: metadados})}, na ordem de ``order`` e depois na de aparição."""
+    groups = {source: ({k: [] for k in KINDS}, {k: [] for k in KINDS}) for source in order or []}
+    for kind in KINDS:
+        for content, meta in zip(chunks[kind], metadata[kind]):
+            source = meta.get("source")
+            if source not in groups:
+                groups[source] = ({k: [] for k in KINDS}, {k: [] for k in KINDS})
+            groups[source][0][kind].append(content)
+            groups[source][1][kind].append(meta)
+    return {s: g for s, g in groups.items() if any(g[0].values())}
+
+
+def _remove_orphans(root, shards):
+    """Apaga arquivos de shards fora do índice (PDFs removidos, gravações interrompidas)."""
+    keep = {shard["name"] for shard in shards}
+    for path in Path(root).iterdir():
+        for suffix in _SHARD_SUFFIXES:
+            if path.name.endswith(suffix):
+                if path.name[:-len(suffix)] not in keep:
+                    path.unlink(missing_ok=True)
+                break
+
+
+def save_index(root, shards):
+    """Grava o índice (ordem de indexação) e apaga os shards que ficaram de fora."""
+    _save_index(root, shards)
+    _remove_orphans(root, shards)
+    return shards
+
+
+def write_cache(root, texts, tables, images, metadata, sources=None):
+    """Regrava o cache inteiro (um shard por PDF). ``sources``: ordem dos PDFs."""
+    chunks = {"texts": texts, "tables": tables, "images": images}
+    return save_index(root, [
+        write_shard(root, source, group_chunks, group_meta)
+        for source, (group_chunks, group_meta) in _group_by_source(chunks, metadata, sources).items()
+    ])
+
+
+def update_cache(root, removed_sources, shards):
+    """
+    Tira do índice os shards de ``removed_sources`` e acrescenta (no fim da ordem)
+    ``shards``, já gravados pela extração. Um PDF alterado sai e volta com o shard novo.
+    """
+    removed = set(removed_sources) | {shard["source"] for shard in shards}
+    kept = [shard for shard in load_index(root) or [] if shard["source"] not in removed]
+    return save_index(root, kept + list(shards))
+
+
+def iter_shard(root, shard, kinds=KINDS, binary_images=False):
+    """(tipo, conteúdo, metadados) dos chunks de um shard; imagens em base64 ou bytes."""
+    root = Path(root)
+    images = None
+    try:
+        with open(root / f"{shard['name']}.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                kind = record["kind"]
+                if kind not in kinds:
+                    continue
+                if kind == "images":
+                    if images is None:
+                        images = open(root / f"{shard['name']}.bin", "rb")
+                    images.seek(record["offset"])
+                    data = images.read(record["size"])
+                    yield kind, data if binary_images else base64.b64encode(data).decode("ascii"), record["meta"]
+                else:
+                    yield kind, record["content"], record["meta"]
+    finally:
+        if images is not None:
+            images.close()
+
+
+def iter_chunks(root, kind, binary_images=False):
+    """(conteúdo, metadados) de um tipo, na ordem global de indexação, um shard por vez."""
+    for shard in load_index(root) or []:
+        if shard["counts"].get(kind):
+            for _, content, meta in iter_shard(root, shard, (kind,), binary_images):
+                yield content, meta
+
+
+def read_shard(root, shard, binary_images=False):
+    """({tipo: chunks}, {tipo: metadados}) de um PDF."""
+    chunks, metadata = {k: [] for k in KINDS}, {k: [] for k in KINDS}
+    for kind, content, meta in iter_shard(root, shard, binary_images=binary_images):
+        chunks[kind].append(content)
+        metadata[kind].append(meta)
+    return chunks, metadata
+
+
+def load_metadata(root):
+    """{tipo: [metadados]} na ordem global, sem ler as imagens."""
+    metadata = {k: [] for k in KINDS}
+    for shard in load_index(root) or []:
+        with open(Path(root) / f"{shard['name']}.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["kind"] in metadata:
+                    metadata[record["kind"]].append(record["meta"])
+    return metadata
+
+
+def load_chunks(root):
+    """(textos, tabelas, imagens em base64, metadados): o corpus inteiro, para resumir e indexar."""
+    lists = {k: [] for k in KINDS}
+    metadata = {k: [] for k in KINDS}
+    for kind in KINDS:
+        for content, meta in iter_chunks(root, kind):
+            lists[kind].append(content)
+            metadata[kind].append(meta)
+    return lists["texts"], lists["tables"], lists["images"], metadata
+
+
+def chunk_counts(root):
+    counts = {k: 0 for k in KINDS}
+    for shard in load_index(root) or []:
+        for kind in KINDS:
+            counts[kind] += shard["counts"].get(kind, 0)
+    return counts
+
+
+def _migrate_legacy(legacy_path, root):
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    metadata = data.get("metadata") or {}
+    for kind in KINDS:
+        if len(metadata.get(kind, [])) != len(data[kind]):
+            metadata[kind] = [{"modality": MODALITY_BY_KIND[kind]} for _ in data[kind]]
+    shards = write_cache(root, data["texts"], data["tables"], data["images"], metadata)
+    print(f"[chunks] {legacy_path.name} migrado para {len(shards)} shards em {root}")
+
+
+def open_cache(root, legacy_path=None):
+    """
+    Diretório do cache pronto para leitura, ou None se não há cache. Migra o
+    JSON antigo na primeira vez; sem escrita (ex.: Lambda), migra para /tmp.
+    """
+    root = Path(root)
+    targets = (root, Path(tempfile.gettempdir()) / root.name)
+    for target in targets:
+        if load_index(target) is not None:
+            return target
+    if legacy_path is None or not Path(legacy_path).exists():
+        return None
+    for target in targets:
+        try:
+            _migrate_legacy(Path(legacy_path), target)
+            return target
+        except OSError as e:
+            print(f"[chunks] Não foi possível migrar o cache de chunks para {target}: {e}")
+    return None
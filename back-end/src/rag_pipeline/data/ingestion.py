@@ -0,0 +1,344 @@
+"""
+Extração paralela dos PDFs.
+
+``partition_pdf`` com ``hi_res`` + Tesseract leva minutos por PDF; em série, a
+árvore inteira leva horas. ``extract_pdfs`` distribui os PDFs num
+``ProcessPoolExecutor`` (INGEST_WORKERS processos, ``spawn``), cada processo
+limitado a INGEST_THREADS_PER_WORKER threads de torch/OpenMP/BLAS para os
+processos não disputarem os mesmos núcleos. PDFs com mais de INGEST_SPLIT_PAGES
+páginas viram trechos de páginas particionados em paralelo (os maiores primeiro);
+os elementos são juntados em ordem de página e o ``by_title`` roda uma vez sobre
+todos, então nenhum chunk é cortado na emenda entre trechos.
+
+O resultado classificado de cada PDF (textos, tabelas, imagens e proveniência)
+vai para o seu shard no cache de chunks (CHUNKS_DIR, data/chunk_cache.py), com
+nome derivado do caminho e do conteúdo do PDF: se a ingestão cair no meio, a
+próxima execução só extrai os PDFs que faltam, e o mesmo shard é o que a
+indexação lê. Shards de PDFs que não entram no índice são apagados quando ele
+é gravado.
+
+Uso (só extrai para o cache, sem resumir nem embedar nem gravar o índice):
+    python -m rag_pipeline.data.ingestion [--workers 4] [--threads 2] [--split-pages 20]
+"""
+import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from ..config import PDF_DIR
+
+# Suba quando a extração/classificação mudar de forma que invalide os caches
+CACHE_VERSION = 1
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+_HASH_BLOCK = 1 << 20
+SLOWEST_REPORTED = 5
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def relative_source(pdf):
+    """Caminho do PDF relativo a PDF_DIR (o mesmo ``source`` da proveniência)."""
+    pdf = Path(pdf).resolve()
+    try:
+        return pdf.relative_to(PDF_DIR).as_posix()
+    except ValueError:
+        return pdf.name
+
+
+def _extraction_settings():
+    from ..config import PDF_AUTO_MAX_IMAGE_COVERAGE, PDF_AUTO_MAX_RULINGS, PDF_AUTO_MIN_TEXT_CHARS, PDF_STRATEGY
+
+    if PDF_STRATEGY != "auto":
+        return PDF_STRATEGY
+    return f"auto/{PDF_AUTO_MIN_TEXT_CHARS}/{PDF_AUTO_MAX_IMAGE_COVERAGE}/{PDF_AUTO_MAX_RULINGS}"
+
+
+def pdf_shard_name(pdf):
+    """Shard do PDF no cache de chunks; muda se o caminho, o conteúdo, a estratégia ou CACHE_VERSION mudarem."""
+    from .chunk_cache import shard_name
+
+    source = relative_source(pdf)
+    key = f"{CACHE_VERSION}:{_extraction_settings()}:{source}:{file_sha256(pdf)}"
+    return shard_name(source, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+
+def _init_worker(threads):
+    """Limita as threads de cada processo do pool (antes de carregar torch/modelos)."""
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+class _Task(NamedTuple):
+    index: int             # posição em pdf_files
+    first: Optional[int]   # None = PDF inteiro
+    last: Optional[int]
+    pages: int
+
+
+def _page_count(pdf):
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(str(pdf)).pages)
+    except Exception:
+        return 0  # ilegível ao pypdf: vai inteiro, e o erro aparece na extração
+
+
+def _plan_tasks(pdf_files, pending, split_pages):
+    """
+    Tarefas do pool: PDFs com mais de ``split_pages`` páginas viram trechos de
+    tamanho igual (até ``split_pages`` páginas cada). As maiores vão primeiro,
+    para o fim da ingestão não ficar com um arquivo grande num só núcleo.
+    """
+    tasks = []
+    for i in pending:
+        pages = _page_count(pdf_files[i])
+        if split_pages and pages > split_pages:
+            size = math.ceil(pages / math.ceil(pages / split_pages))
+            tasks += [
+                _Task(i, first, min(first + size - 1, pages), min(size, pages - first + 1))
+                for first in range(1, pages + 1, size)
+            ]
+        else:
+            tasks.append(_Task(i, None, None, pages))
+    return sorted(tasks, key=lambda t: t.pages, reverse=True)
+
+
+def _save_result(pdf, cache_dir, name, chunks, stats, seconds, ranges=1):
+    """
+    Classifica os chunks e grava o shard do PDF (atômico: um processo morto no
+    meio não deixa shard pela metade). Devolve o resumo da extração, sem os
+    chunks: só ele volta do processo do pool.
+    """
+    from .chunk_cache import write_shard
+    from .pdf_utils import classify_chunks
+
+    texts, tables, images, metadata = classify_chunks(chunks, pdf)
+    source = relative_source(pdf)
+    extraction = {"chunks": len(chunks), "seconds": round(seconds, 2), "ranges": ranges, "strategy": stats}
+    shard = write_shard(cache_dir, source, {"texts": texts, "tables": tables, "images": images}, metadata, name, extraction)
+    return {"source": source, **extraction, "shard": shard}
+
+
+def _process_pdf(pdf, cache_dir, name):
+    """Extrai, classifica e grava o resultado de um PDF inteiro (roda no processo do pool)."""
+    from .pdf_utils import extract_chunks_from_pdf
+
+    start = time.perf_counter()
+    stats = {}
+    chunks = extract_chunks_from_pdf(pdf, raise_errors=True, stats=stats)
+    return _save_result(pdf, cache_dir, name, chunks, stats, time.perf_counter() - start)
+
+
+def _partition_range(pdf, first, last):
+    """Elementos (sem chunking) de um trecho de páginas (roda no processo do pool)."""
+    from .pdf_utils import partition_page_range
+
+    start = time.perf_counter()
+    stats = {}
+    elements = partition_page_range(pdf, first, last, stats)
+    return elements, stats, time.perf_counter() - start
+
+
+def _merge_stats(parts):
+    merged = {}
+    for stats in parts:
+        for key, value in stats.items():
+            if value is not None:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _merge_ranges(pdf, cache_dir, name, parts):
+    """Junta os trechos em ordem de página, aplica o ``by_title`` uma vez (emendas corrigidas) e grava o cache."""
+    from .pdf_utils import chunk_elements, strategy_summary
+
+    ordered = [parts[first] for first in sorted(parts)]
+    chunks = chunk_elements([element for elements, _, _ in ordered for element in elements])
+    stats = _merge_stats([stats for _, stats, _ in ordered])
+    print(f"{pdf.name}: {len(chunks)} chunks de {len(ordered)} trechos{strategy_summary(stats)}")
+    elapsed = sum(seconds for _, _, seconds in ordered)
+    return _save_result(pdf, cache_dir, name, chunks, stats, elapsed, len(ordered))
+
+
+def _load_cached(cache_dir, name):
+    """Resumo da extração de um shard já gravado, ou None (PDF a extrair)."""
+    from .chunk_cache import read_info
+
+    info = read_info(cache_dir, name)
+    if info is None or "extraction" not in info:
+        return None
+    return {"source": info["source"], **info["extraction"], "shard": info["shard"]}
+
+
+def _print_report(pdf_files, results, pending, failed, elapsed):
+    extracted = [results[i] for i in pending if results[i] is not None]
+    if extracted:
+        busy = sum(r["seconds"] for r in extracted)
+        print(f"[ingest] {len(extracted)} PDFs extraídos em {elapsed:.1f}s "
+              f"(soma dos tempos por arquivo: {busy:.1f}s, {busy / max(elapsed, 1e-9):.1f}x)")
+        slowest = sorted(extracted, key=lambda r: r["seconds"], reverse=True)[:SLOWEST_REPORTED]
+        print("[ingest] Mais lentos: " + ", ".join(f"{r['source']} ({r['seconds']:.1f}s)" for r in slowest))
+        _print_strategy_report(extracted)
+    if failed:
+        print(f"[ingest] {len(failed)} PDFs falharam e ficaram de fora (sem cache; a próxima extração tenta de novo):")
+        for i, error in failed.items():
+            print(f"  - {pdf_files[i].name}: {error}")
+
+
+def _hi_res_seconds_per_page(stats):
+    """Custo do hi_res por página medido em toda a execução, ou PDF_HI_RES_SECONDS_PER_PAGE se nenhuma página foi por ele."""
+    from ..config import PDF_HI_RES_SECONDS_PER_PAGE
+
+    pages = sum(s.get("hi_res_pages", 0) for s in stats)
+    if pages:
+        return sum(s.get("hi_res_seconds", 0.0) for s in stats) / pages, "medido nesta execução"
+    return PDF_HI_RES_SECONDS_PER_PAGE, "PDF_HI_RES_SECONDS_PER_PAGE"
+
+
+def _print_strategy_report(extracted):
+    """Páginas por estratégia e tempo economizado por documento, estimado depois de todos os resultados."""
+    from .pdf_utils import estimate_savings, strategy_summary
+
+    stats = [r.get("strategy") or {} for r in extracted]
+    fast, hi_res = sum(s.get("fast_pages", 0) for s in stats), sum(s.get("hi_res_pages", 0) for s in stats)
+    if not fast and not hi_res:
+        return
+    line = f"[ingest] Páginas: {fast} fast, {hi_res} hi_res"
+    if not fast:
+        print(line)
+        return
+    per_page, origin = _hi_res_seconds_per_page(stats)
+    saved = [(r["source"], s, estimate_savings(s, per_page)) for r, s in zip(extracted, stats) if s.get("fast_pages")]
+    print(f"{line}; ~{sum(seconds for _, _, seconds in saved):.0f}s economizados em relação a tudo em hi_res "
+          f"({per_page:.1f}s/página no hi_res, {origin}):")
+    for source, s, seconds in saved:
+        print(f"  - {source}{strategy_summary(s, seconds)}")
+
+
+def extract_pdfs(pdf_files, workers=1, threads=1, cache_dir=None, failed_sources=None, split_pages=0, shards=None):
+    """
+    Extrai e classifica ``pdf_files`` usando os shards do cache de chunks e um pool de processos.
+    Com ``split_pages`` (e mais de um processo), PDFs maiores que isso são
+    particionados em trechos de páginas em paralelo e juntados em ordem.
+    Retorna (texts, tables, images, metadata) na ordem de ``pdf_files``, como o laço sequencial.
+    Se ``failed_sources`` (lista) for dado, recebe o ``source`` dos PDFs que falharam;
+    se ``shards`` (lista) for dado, recebe as entradas do índice dos extraídos, na mesma ordem.
+    """
+    from ..config import CHUNKS_DIR
+    from .chunk_cache import read_shard
+
+    pdf_files = [Path(p) for p in pdf_files]
+    cache_dir = Path(cache_dir or CHUNKS_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    names = [pdf_shard_name(pdf) for pdf in pdf_files]
+    results = [_load_cached(cache_dir, name) for name in names]
+    pending = [i for i, r in enumerate(results) if r is None]
+    tasks = _plan_tasks(pdf_files, pending, split_pages) if workers > 1 else []
+    workers = max(1, min(workers, len(tasks) or len(pending)))
+    split = sum(1 for t in tasks if t.first == 1)
+    print(f"[ingest] {len(pdf_files)} PDFs: {len(pdf_files) - len(pending)} do cache, {len(pending)} a extrair "
+          f"({workers} processos x {threads} threads" + (f"; {split} PDFs grandes em trechos" if split else "") + ")")
+
+    failed = {}
+    start = time.perf_counter()
+
+    def collect(i, get_result):
+        try:
+            results[i] = get_result()
+        except Exception as e:
+            failed[i] = e
+            print(f"[ingest] Erro ao processar {pdf_files[i].name}: {e}")
+            return
+        done = sum(1 for j in pending if results[j] is not None)
+        print(f"[ingest] ({done}/{len(pending)}) {pdf_files[i].name}: "
+              f"{results[i]['chunks']} chunks em {results[i]['seconds']:.1f}s")
+
+    if workers == 1:
+        for i in pending:
+            collect(i, lambda i=i: _process_pdf(pdf_files[i], cache_dir, names[i]))
+    elif pending:
+        expected = Counter(task.index for task in tasks)
+        parts = defaultdict(dict)
+
+        def collect_part(task, get_part):
+            i = task.index
+            if i in failed:
+                return
+            try:
+                parts[i][task.first] = part = get_part()
+            except Exception as e:
+                failed[i] = e
+                print(f"[ingest] Erro ao processar {pdf_files[i].name} (págs {task.first}-{task.last}): {e}")
+                return
+            print(f"[ingest] {pdf_files[i].name} págs {task.first}-{task.last}: {len(part[0])} elementos em {part[2]:.1f}s")
+            if len(parts[i]) == expected[i]:
+                collect(i, lambda: _merge_ranges(pdf_files[i], cache_dir, names[i], parts.pop(i)))
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = {}
+            for task in tasks:
+                if task.first is None:
+                    futures[pool.submit(_process_pdf, pdf_files[task.index], cache_dir, names[task.index])] = task
+                else:
+                    futures[pool.submit(_partition_range, pdf_files[task.index], task.first, task.last)] = task
+            # Um processo que morre (ex.: falta de memória) quebra o pool: os PDFs restantes
+            # caem em ``failed`` e os já gravados no cache não são perdidos.
+            for future in as_completed(futures):
+                task = futures[future]
+                if task.first is None:
+                    collect(task.index, future.result)
+                else:
+                    collect_part(task, future.result)
+
+    _print_report(pdf_files, results, pending, failed, time.perf_counter() - start)
+    if failed_sources is not None:
+        failed_sources.extend(relative_source(pdf_files[i]) for i in failed)
+
+    extracted = [result["shard"] for result in results if result is not None]
+    if shards is not None:
+        shards.extend(extracted)
+    lists = {"texts": [], "tables": [], "images": []}
+    metadata = {"texts": [], "tables": [], "images": []}
+    for shard in extracted:
+        chunks, shard_metadata = read_shard(cache_dir, shard)
+        for kind in lists:
+            lists[kind].extend(chunks[kind])
+            metadata[kind].extend(shard_metadata[kind])
+    return lists["texts"], lists["tables"], lists["images"], metadata
+
+
+def main():
+    from ..config import CHUNKS_DIR, INGEST_SPLIT_PAGES, INGEST_THREADS_PER_WORKER, INGEST_WORKERS
+
+    parser = argparse.ArgumentParser(description="Extrai os PDFs em paralelo para os shards do cache de chunks.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Processos de extração.")
+    parser.add_argument("--threads", type=int, default=INGEST_THREADS_PER_WORKER, help="Threads de torch/OMP por processo.")
+    parser.add_argument("--split-pages", type=int, default=INGEST_SPLIT_PAGES, help="Páginas por trecho de PDFs grandes (0 = não divide).")
+    parser.add_argument("--cache-dir", default=str(CHUNKS_DIR), help="Diretório do cache de chunks.")
+    args = parser.parse_args()
+
+    pdf_files = sorted(PDF_DIR.rglob("*.pdf"))
+    texts, tables, images, _ = extract_pdfs(pdf_files, args.workers, args.threads, args.cache_dir, split_pages=args.split_pages)
+    print(f"\nTextos: {len(texts)}, Tabelas: {len(tables)}, Imagens: {len(images)}")
+
+
+if __name__ == "__main__":
+    main()
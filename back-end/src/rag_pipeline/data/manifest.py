@@ -0,0 +1,106 @@
+"""
+Manifesto da indexação: para cada PDF (caminho relativo a PDF_DIR), o hash do
+conteúdo e os doc_ids que ele gerou, por tipo (textos, tabelas e imagens, na
+ordem em que aparecem no cache de chunks).
+
+Com ele a reindexação é incremental (``get_rag_components(update_index=True)``):
+só PDFs novos ou alterados passam por extração, resumo e embeddings, e os
+vetores e originais de PDFs removidos (ou da versão anterior dos alterados)
+são apagados. Fica em PERSIST_DIR, junto do índice que descreve: apagar o
+chroma_store (ou ``force_regenerate``) descarta o manifesto também.
+"""
+import json
+import os
+from pathlib import Path
+from typing import List, NamedTuple
+
+from .ingestion import file_sha256, relative_source
+
+MANIFEST_VERSION = 1
+KINDS = ("texts", "tables", "images")
+MODALITY_BY_KIND = {"texts": "text", "tables": "table", "images": "image"}
+
+
+class SourceChanges(NamedTuple):
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+def empty_manifest():
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def load_manifest(path):
+    """Manifesto gravado, ou None se não existe ou é de outra versão."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(manifest, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def scan_sources(pdf_files):
+    """{source: sha256} dos PDFs atuais."""
+    return {relative_source(pdf): file_sha256(pdf) for pdf in pdf_files}
+
+
+def diff_sources(manifest, hashes):
+    files = manifest["files"]
+    return SourceChanges(
+        added=sorted(s for s in hashes if s not in files),
+        changed=sorted(s for s in hashes if s in files and files[s]["sha256"] != hashes[s]),
+        removed=sorted(s for s in files if s not in hashes),
+    )
+
+
+def doc_ids_of(manifest, sources):
+    files = manifest["files"]
+    return [doc_id for s in sources if s in files for kind in KINDS for doc_id in files[s]["doc_ids"].get(kind, [])]
+
+
+def record_documents(manifest, hashes, metadata, ids, sources):
+    """
+    Registra no manifesto os ``sources`` indexados: hash atual e doc_ids por tipo.
+    ``metadata``/``ids``: {tipo: [...]} alinhados, como em ``add_documents``.
+    """
+    grouped = {source: {kind: [] for kind in KINDS} for source in sources}
+    for kind in KINDS:
+        for meta, doc_id in zip(metadata.get(kind, []), ids.get(kind, [])):
+            source = meta.get("source")
+            if source in grouped:
+                grouped[source][kind].append(doc_id)
+    for source, doc_ids in grouped.items():
+        manifest["files"][source] = {"sha256": hashes[source], "doc_ids": doc_ids}
+    return manifest
+
+
+def forget_sources(manifest, sources):
+    for source in sources:
+        manifest["files"].pop(source, None)
+    return manifest
+
+
+def source_pairs(source, entry, chunks):
+    """(doc_id, original, modalidade) dos chunks de um PDF (``chunks``: {tipo: [...]}), pela posição em cada tipo."""
+    pairs = []
+    for kind in KINDS:
+        doc_ids, originals = entry["doc_ids"].get(kind, []), chunks.get(kind, [])
+        if len(doc_ids) != len(originals):
+            print(f"[manifest] Aviso: {source} ({kind}) tem {len(doc_ids)} doc_ids e {len(originals)} chunks.")
+        pairs.extend((doc_id, original, MODALITY_BY_KIND[kind]) for doc_id, original in zip(doc_ids, originals))
+    return pairs
+
@@ -0,0 +1,136 @@
+"""
+Escolha da estratégia do ``partition_pdf`` por página (PDF_STRATEGY=auto).
+
+``hi_res`` (detecção de layout + OCR) custa segundos por página, e PDFs nascidos
+digitais com camada de texto boa não precisam dele. Uma pré-passada com o
+pdfminer (dependência do unstructured) mede, por página, os caracteres da
+camada de texto, a fração da página coberta por imagens e as linhas/retângulos
+(réguas, indício de tabela). Vai para ``fast`` a página com texto suficiente,
+sem imagens relevantes e sem cara de tabela; o resto continua em ``hi_res``.
+
+Imagens pequenas (ex.: logotipos) em páginas de texto não são extraídas pelo
+``fast``; ajuste PDF_AUTO_MAX_IMAGE_COVERAGE para mandá-las ao ``hi_res``.
+"""
+import re
+from typing import List, NamedTuple, Optional
+
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LTChar, LTFigure, LTImage, LTLine, LTRect
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+# Glifos sem mapeamento para Unicode: camada de texto inútil
+_CID_RE = re.compile(r"\(cid:\d+\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class PageInfo(NamedTuple):
+    page: int             # 1 = primeira página
+    text_chars: int       # 0 se a leitura parou cedo (página já decidida como hi_res)
+    image_coverage: float
+    rulings: int
+    strategy: str
+
+
+class PageRun(NamedTuple):
+    strategy: str
+    first: int
+    last: int
+
+    @property
+    def pages(self):
+        return self.last - self.first + 1
+
+
+class _HiResPage(Exception):
+    """A página já tem imagens ou réguas demais: o resto do conteúdo não muda a decisão."""
+
+
+class _PageProbe(PDFPageAggregator):
+    """
+    Agregador do pdfminer sem análise de layout (só caracteres e formas) que
+    soma área de imagens e réguas enquanto a página é interpretada e a
+    interrompe assim que ela passa dos limites: páginas de gráficos vetoriais
+    têm milhões de operadores, e ler tudo custaria quase tanto quanto o hi_res.
+    """
+
+    def __init__(self, resources, max_image_coverage, max_rulings):
+        super().__init__(resources, laparams=None)
+        self.max_image_coverage = max_image_coverage
+        self.max_rulings = max_rulings
+
+    def begin_page(self, page, ctm):
+        super().begin_page(page, ctm)
+        self.page_area = max(self.cur_item.width * self.cur_item.height, 1.0)
+        self.image_area = 0.0
+        self.rulings = 0
+
+    def paint_path(self, gstate, stroke, fill, evenodd, path):
+        start = len(self.cur_item._objs)
+        super().paint_path(gstate, stroke, fill, evenodd, path)
+        self.rulings += sum(isinstance(obj, (LTLine, LTRect)) for obj in self.cur_item._objs[start:])
+        if self.rulings > self.max_rulings:
+            raise _HiResPage
+
+    def render_image(self, name, stream):
+        super().render_image(name, stream)
+        image = self.cur_item._objs[-1] if self.cur_item._objs else None
+        if isinstance(image, LTImage):
+            self.image_area += image.width * image.height
+            if self.image_area / self.page_area > self.max_image_coverage:
+                raise _HiResPage
+
+
+def _walk(container):
+    for element in container:
+        yield element
+        if isinstance(element, LTFigure):
+            yield from _walk(element)
+
+
+def choose_strategy(text_chars, image_coverage, rulings, min_text_chars, max_image_coverage, max_rulings):
+    if text_chars < min_text_chars or image_coverage > max_image_coverage or rulings > max_rulings:
+        return "hi_res"
+    return "fast"
+
+
+def analyze_pages(path, min_text_chars=200, max_image_coverage=0.05, max_rulings=20,
+                  first_page=None, last_page=None) -> Optional[List[PageInfo]]:
+    """
+    Estratégia de cada página (ou só de ``first_page``..``last_page``), ou None
+    se o pdfminer não consegue ler o PDF (tudo vai para ``hi_res``).
+    """
+    pagenos = set(range(first_page - 1, last_page)) if first_page else None
+    pages = []
+    try:
+        with open(path, "rb") as f:
+            resources = PDFResourceManager()
+            device = _PageProbe(resources, max_image_coverage, max_rulings)
+            interpreter = PDFPageInterpreter(resources, device)
+            for number, page in enumerate(PDFPage.get_pages(f, pagenos), start=first_page or 1):
+                try:
+                    interpreter.process_page(page)
+                except _HiResPage:
+                    coverage = min(device.image_area / device.page_area, 1.0)
+                    pages.append(PageInfo(number, 0, round(coverage, 3), device.rulings, "hi_res"))
+                    continue
+                text = "".join(el.get_text() for el in _walk(device.get_result()) if isinstance(el, LTChar))
+                chars = len(_SPACE_RE.sub("", _CID_RE.sub("", text)))
+                coverage = min(device.image_area / device.page_area, 1.0)
+                strategy = choose_strategy(chars, coverage, device.rulings, min_text_chars, max_image_coverage, max_rulings)
+                pages.append(PageInfo(number, chars, round(coverage, 3), device.rulings, strategy))
+    except Exception as e:
+        print(f"[pdf_strategy] Pré-passada falhou em {path}: {e}; usando hi_res.")
+        return None
+    return pages
+
+
+def plan_runs(pages: List[PageInfo]) -> List[PageRun]:
+    """Agrupa páginas consecutivas com a mesma estratégia."""
+    runs = []
+    for page in pages:
+        if runs and runs[-1].strategy == page.strategy and runs[-1].last == page.page - 1:
+            runs[-1] = runs[-1]._replace(last=page.page)
+        else:
+            runs.append(PageRun(page.strategy, page.page, page.page))
+    return runs
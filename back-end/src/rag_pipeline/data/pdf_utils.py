@@ -1,30 +1,157 @@
 import time
 import html
 import re
+import tempfile
+from pathlib import Path
 from unstructured.partition.pdf import partition_pdf
+from .page_strategy import PageRun, analyze_pages, plan_runs
 from .tables import reestruturar_tabelas
+from ..config import PDF_DIR, PDF_STRATEGY, PDF_AUTO_MIN_TEXT_CHARS, PDF_AUTO_MAX_IMAGE_COVERAGE, PDF_AUTO_MAX_RULINGS
 
-def extract_chunks_from_pdf(file_path):
+_YEAR_RE = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+
+# Parâmetros do partition_pdf / chunk_by_title usados em toda a ingestão
+PARTITION_KWARGS = dict(
+    infer_table_structure=True,
+    languages=["por"],
+    extract_image_block_types=["Image"],
+    extract_image_block_to_payload=True,
+)
+CHUNKING_KWARGS = dict(
+    max_characters=3000,
+    combine_text_under_n_chars=500,
+    new_after_n_chars=1500,
+)
+
+
+def _partition(file_path, strategy, chunk=True):
+    kwargs = dict(chunking_strategy="by_title", **CHUNKING_KWARGS) if chunk else {}
+    return partition_pdf(filename=str(file_path), strategy=strategy, **PARTITION_KWARGS, **kwargs)
+
+
+def _partition_runs(file_path, runs, stats):
+    """
+    Elementos (sem chunking) de cada trecho de páginas, com a sua estratégia
+    (PDFs temporários com pypdf), com o número de página do PDF original.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(str(file_path))
+    elements = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in runs:
+            writer = PdfWriter()
+            for index in range(run.first - 1, run.last):
+                writer.add_page(reader.pages[index])
+            part = Path(tmp) / f"{run.first}-{run.last}.pdf"
+            with open(part, "wb") as f:
+                writer.write(f)
+            start = time.perf_counter()
+            part_elements = _partition(part, run.strategy, chunk=False)
+            stats[f"{run.strategy}_seconds"] += time.perf_counter() - start
+            for element in part_elements:
+                element.metadata.page_number = (element.metadata.page_number or 1) + run.first - 1
+                element.metadata.filename = Path(file_path).name
+            elements.extend(part_elements)
+    return elements
+
+
+def chunk_elements(elements):
+    """``by_title`` sobre elementos já em ordem de página: os chunks atravessam as emendas entre trechos."""
+    from unstructured.chunking.title import chunk_by_title
+
+    return chunk_by_title(elements, **CHUNKING_KWARGS)
+
+
+def _new_stats(stats):
+    stats = stats if stats is not None else {}
+    stats.update(fast_pages=0, hi_res_pages=0, fast_seconds=0.0, hi_res_seconds=0.0)
+    return stats
+
+
+def _plan_page_runs(file_path, first_page=None, last_page=None):
+    """Trechos (estratégia, páginas) da pré-passada do ``auto``; [] com estratégia fixa ou PDF ilegível ao pdfminer."""
+    if PDF_STRATEGY != "auto":
+        return []
+    pages = analyze_pages(file_path, PDF_AUTO_MIN_TEXT_CHARS, PDF_AUTO_MAX_IMAGE_COVERAGE,
+                          PDF_AUTO_MAX_RULINGS, first_page, last_page)
+    return plan_runs(pages) if pages else []
+
+
+def _fixed_strategy():
+    return PDF_STRATEGY if PDF_STRATEGY != "auto" else "hi_res"
+
+
+def estimate_savings(stats, hi_res_seconds_per_page):
+    """Tempo economizado num PDF: páginas em fast x custo por página do hi_res, menos o tempo do fast."""
+    if not stats or not stats.get("fast_pages"):
+        return 0.0
+    return max(0.0, stats["fast_pages"] * hi_res_seconds_per_page - stats["fast_seconds"])
+
+
+def partition_with_strategy(file_path, stats=None):
+    """
+    ``partition_pdf`` + ``by_title`` conforme PDF_STRATEGY. No ``auto``, as páginas
+    vão para ``fast`` ou ``hi_res`` (data/page_strategy.py); um PDF de uma só
+    estratégia é particionado inteiro, como antes. ``stats`` recebe páginas e
+    segundos por estratégia (a estimativa do tempo economizado é feita pela
+    ingestão, com todos os PDFs, em ``estimate_savings``).
+    """
+    stats = _new_stats(stats)
+    runs = _plan_page_runs(file_path)
+    for run in runs:
+        stats[f"{run.strategy}_pages"] += run.pages
+    if len(runs) <= 1:
+        strategy = runs[0].strategy if runs else _fixed_strategy()
+        start = time.perf_counter()
+        chunks = _partition(file_path, strategy)
+        stats[f"{strategy}_seconds"] = time.perf_counter() - start
+    else:
+        chunks = chunk_elements(_partition_runs(file_path, runs, stats))
+    return chunks
+
+
+def partition_page_range(file_path, first_page, last_page, stats=None):
+    """
+    Elementos (sem chunking) das páginas ``first_page``..``last_page``, cada página
+    com a sua estratégia: um trecho de um PDF grande, particionado em paralelo
+    com os outros (data/ingestion.py). O ``by_title`` roda depois, sobre todos.
+    """
+    stats = _new_stats(stats)
+    runs = _plan_page_runs(file_path, first_page, last_page) or [PageRun(_fixed_strategy(), first_page, last_page)]
+    for run in runs:
+        stats[f"{run.strategy}_pages"] += run.pages
+    return _partition_runs(file_path, runs, stats)
+
+
+def strategy_summary(stats, saved_seconds=None):
+    """Trecho do relatório: páginas/tempo por estratégia e, se dado, o tempo economizado."""
+    if not stats or not (stats.get("fast_pages") or stats.get("hi_res_pages")):
+        return ""
+    summary = (f" (fast: {stats['fast_pages']} págs em {stats['fast_seconds']:.1f}s, "
+               f"hi_res: {stats['hi_res_pages']} págs em {stats['hi_res_seconds']:.1f}s")
+    if saved_seconds is not None:
+        summary += f"; ~{saved_seconds:.0f}s economizados"
+    return summary + ")"
+
+
+def extract_chunks_from_pdf(file_path, raise_errors=False, stats=None):
     """
     Extrai chunks de texto, tabelas e imagens de um PDF usando Unstructured.
+    Com raise_errors=True o erro é propagado (a ingestão paralela não grava
+    cache de um PDF que falhou); senão devolve []. ``stats`` (dict), se dado,
+    recebe páginas e tempos por estratégia (ver ``partition_with_strategy``).
     """
+    file_path = Path(file_path)
+    stats = stats if stats is not None else {}
     try:
         start_time = time.time()
-        chunks = partition_pdf(
-            filename=str(file_path),
-            infer_table_structure=True,
-            strategy="hi_res",
-            languages=["por"],
-            extract_image_block_types=["Image"],
-            extract_image_block_to_payload=True,
-            chunking_strategy="by_title",
-            max_characters=3000,
-            combine_text_under_n_chars=500,
-            new_after_n_chars=1500,
-        )
-        print(f"{file_path.name}: {len(chunks)} chunks extraídos em {time.time()-start_time:.2f}s")
+        chunks = partition_with_strategy(file_path, stats)
+        print(f"{file_path.name}: {len(chunks)} chunks extraídos em {time.time()-start_time:.2f}s{strategy_summary(stats)}")
         return chunks
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Erro ao processar {file_path.name}: {e}")
         return []
 
@@ -43,7 +170,35 @@ def limpar_html(html_text: str) -> str:
     html_text = re.sub(r"\s+", " ", html_text)
     return html_text.strip()
 
-def classify_chunks(chunks):
+def source_provenance(file_path):
+    """
+    Proveniência do PDF: caminho relativo a PDF_DIR, departamento (primeira
+    pasta, ex.: "Calendarios", "Matrícula") e ano (do nome do arquivo/pastas).
+    """
+    file_path = Path(file_path)
+    try:
+        relative = file_path.resolve().relative_to(PDF_DIR)
+    except ValueError:
+        relative = Path(file_path.name)
+    provenance = {"source": relative.as_posix()}
+    # PDF na raiz de PDF_DIR: sem departamento (campo ausente, e não "", para o filtro)
+    if len(relative.parts) > 1:
+        provenance["department"] = relative.parts[0]
+    years = _YEAR_RE.findall(relative.as_posix())
+    if years:
+        provenance["year"] = int(years[-1])
+    return provenance
+
+
+def _chunk_metadata(provenance, modality, element):
+    meta = {**provenance, "modality": modality}
+    page = getattr(element.metadata, "page_number", None)
+    if page is not None:
+        meta["page"] = int(page)
+    return meta
+
+
+def classify_chunks(chunks, file_path=None):
     """
     Classifica os chunks em textos, tabelas (convertidas para Markdown) e imagens.
 
@@ -52,9 +207,15 @@ def classify_chunks(chunks):
     - Textos (CompositeElement):
         guardados como texto cru, sem limpar_html.
     - Imagens:
-        extraídas em base64 dos orig_elements.
+        extraídas em base64 dos orig_elements (o cache de chunks é JSON); no
+        docstore vão em binário, com a modalidade (core/doc_values.py).
+
+    Retorna também a proveniência de cada chunk ({"texts": [...], "tables": [...],
+    "images": [...]}, na mesma ordem): source, department, year, page e modality.
     """
     texts, tables, images = [], [], []
+    metadata = {"texts": [], "tables": [], "images": []}
+    provenance = source_provenance(file_path) if file_path else {}
 
     for chunk in chunks:
         # Caso o Unstructured tenha identificado HTML (normalmente tabelas)
@@ -62,15 +223,18 @@ def classify_chunks(chunks):
             html_bruto = chunk.metadata.text_as_html
             html_limpo = limpar_html(html_bruto)
             tables.append(html_limpo)
+            metadata["tables"].append(_chunk_metadata(provenance, "table", chunk))
 
         # Caso seja texto corrido
         elif "CompositeElement" in str(type(chunk)):
             texts.append(chunk.text)  # aqui não roda limpar_html
+            metadata["texts"].append(_chunk_metadata(provenance, "text", chunk))
 
             # Se o chunk original tiver imagens embutidas
             for el in getattr(chunk.metadata, "orig_elements", []):
                 if "Image" in str(type(el)):
                     images.append(el.metadata.image_base64)
+                    metadata["images"].append(_chunk_metadata(provenance, "image", el))
     
     tabelas_final = [reestruturar_tabelas(tbl) for tbl in tables]
-    return texts, tabelas_final, images
\ No newline at end of file
+    return texts, tabelas_final, images, metadata
\ No newline at end of file
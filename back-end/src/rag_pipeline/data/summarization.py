@@ -1,14 +1,119 @@
+import hashlib
 import json
+import os
+import threading
 import uuid
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage
 from langchain.schema.document import Document
 from .retry import retry_with_backoff
+from ..config import MODEL_PROVIDER, SUMMARY_CONCURRENCY, SUMMARY_CHECKPOINT_EVERY
+from ..core.doc_values import encode_value
 from ..core.models import get_llama_model, get_llava_model
 
-def summarize_elements(elements, is_table=False):
+# Progresso impresso a cada N resumos
+PROGRESS_EVERY = 25
+
+
+class SummaryCheckpoint:
+    """
+    Resumos já prontos, por tipo e hash do conteúdo, gravados na chave "partial"
+    do arquivo de resumos (as listas finais, se houver, ficam intactas) a cada
+    ``every`` resumos. Uma sumarização interrompida retoma sem refazer os
+    elementos prontos; gravar as listas finais descarta o checkpoint.
+    """
+
+    def __init__(self, path, every=SUMMARY_CHECKPOINT_EVERY):
+        self.path = Path(path)
+        self.every = every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._done = self._read().get("partial") or {}
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def key(content):
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get(self, kind, key):
+        return self._done.get(kind, {}).get(key)
+
+    def __len__(self):
+        return sum(len(done) for done in self._done.values())
+
+    def put(self, kind, key, summary):
+        with self._lock:
+            self._done.setdefault(kind, {})[key] = summary
+            self._unsaved += 1
+            if self._unsaved >= self.every:
+                self._save()
+
+    def flush(self):
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _save(self):
+        data = self._read()
+        data["partial"] = self._done
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+
+
+def _summarize_all(items, summarize_one, concurrency, kind, checkpoint=None, error_text="Erro ao resumir."):
+    """
+    Resumos de ``items`` na MESMA ordem (cada resultado vai para a posição do seu
+    elemento), com no máximo ``concurrency`` chamadas ao modelo ao mesmo tempo.
+    Elementos já no ``checkpoint`` não são resumidos de novo; falhas viram
+    ``error_text`` e não entram no checkpoint (são refeitas na próxima vez).
+    """
+    summaries = [None] * len(items)
+    keys = [SummaryCheckpoint.key(item) for item in items] if checkpoint is not None else []
+    pending = []
+    for i, item in enumerate(items):
+        done = checkpoint.get(kind, keys[i]) if checkpoint is not None else None
+        if done is not None:
+            summaries[i] = done
+        else:
+            pending.append(i)
+    if len(pending) < len(items):
+        print(f"[resumo] {kind}: {len(items) - len(pending)} de {len(items)} retomados do checkpoint.")
+    if not pending:
+        return summaries
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(summarize_one, items[i]): i for i in pending}
+        for count, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                summaries[i] = future.result()
+                if checkpoint is not None:
+                    checkpoint.put(kind, keys[i], summaries[i])
+            except Exception as e:
+                failures += 1
+                summaries[i] = error_text
+                print(f"[resumo] {kind}: falha no elemento {i}: {e}")
+            if count % PROGRESS_EVERY == 0 or count == len(pending):
+                print(f"[resumo] {kind}: {count}/{len(pending)} resumidos ({concurrency} em paralelo, {failures} falhas).")
+    if checkpoint is not None:
+        checkpoint.flush()
+    return summaries
+
+
+def summarize_elements(elements, is_table=False, checkpoint=None):
     prompt_template = """
     Você é um assistente encarregado de resumir textos institucionais da UFABC.
     Resuma o conteúdo sem perder nenhuma informação importante, incluindo números, fórmulas ou regras específicas como "C = 16 + 5CR".
@@ -19,26 +124,19 @@ def summarize_elements(elements, is_table=False):
     prompt = ChatPromptTemplate.from_template(prompt_template)
     chain = {"element": lambda x: x} | prompt | model | StrOutputParser()
 
-    summaries = []
     def summarize_single(element):
         return retry_with_backoff(lambda: chain.invoke({"element": element}))
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(summarize_single, el) for el in elements]
-        for future in as_completed(futures):
-            try:
-                summaries.append(future.result())
-            except Exception:
-                summaries.append("Erro ao resumir.")
-    return summaries
 
-def summarize_images(images):
+    kind = "tables" if is_table else "texts"
+    return _summarize_all(elements, summarize_single, SUMMARY_CONCURRENCY[MODEL_PROVIDER], kind, checkpoint)
+
+def summarize_images(images, checkpoint=None):
     prompt_text = (
     "Resuma objetivamente o conteúdo da imagem. "
     "A imagem pertence a um documento acadêmico da Universidade Federal do ABC (UFABC). "
     "Foque em identificar informações relevantes como logotipos, textos institucionais, títulos, ou elementos gráficos com significado acadêmico, e seja bem específico. "
     "Resuma apenas o conteúdo informativo.")
     model = get_llava_model()
-    summaries = []
 
     def summarize_image(img_b64):
         prompt = ChatPromptTemplate.from_messages([HumanMessage(content=[
@@ -48,28 +146,33 @@ def summarize_images(images):
         chain = prompt | model | StrOutputParser()
         return retry_with_backoff(lambda: chain.invoke({}))
 
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(summarize_image, img) for img in images]
-        for future in as_completed(futures):
-            try:
-                summaries.append(future.result())
-            except Exception:
-                summaries.append("Erro ao resumir imagem.")
-    return summaries
+    # O llava roda sempre no Ollama
+    return _summarize_all(images, summarize_image, SUMMARY_CONCURRENCY["ollama"], "images", checkpoint,
+                          error_text="Erro ao resumir imagem.")
 
-def add_documents(originals, summaries, retriever):
+def add_documents(originals, summaries, retriever, metadatas=None):
+    """
+    Indexa os resumos (com a proveniência de cada chunk nos metadados) e guarda os
+    originais no docstore. Retorna os doc_ids gerados, na ordem de ``originals``.
+    """
     if not originals or not summaries or len(originals) != len(summaries):
-        return
+        return []
     ids = [str(uuid.uuid4()) for _ in originals]
+    metadatas = metadatas or [{} for _ in originals]
     retriever.vectorstore.add_documents([
-        Document(page_content=s, metadata={"doc_id": ids[i]})
+        Document(page_content=s, metadata={**metadatas[i], "doc_id": ids[i]})
         for i, s in enumerate(summaries)
     ])
     pairs = []
     for i, orig in enumerate(originals):
-        if isinstance(orig, str):
+        modality = metadatas[i].get("modality")
+        if modality:
+            # Modalidade junto do valor; imagens em binário (sem base64)
+            pairs.append((ids[i], encode_value(orig, modality)))
+        elif isinstance(orig, str):
             pairs.append((ids[i], orig.encode("utf-8")))   # <- transforma em bytes
         else:
             # já é bytes (ex.: base64 de imagem), mantém
             pairs.append((ids[i], orig))
-    retriever.docstore.mset(pairs)
\ No newline at end of file
+    retriever.docstore.mset(pairs)
+    return ids
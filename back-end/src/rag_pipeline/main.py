@@ -1,9 +1,9 @@
 from .core.retriever_pipeline import get_rag_pipeline
-from .utils.display_utils import display_base64_image
+from .utils.display_utils import display_image
 
 def main():
-    regenerate = input("🔄 Deseja gerar os chunks novamente? (s/n): ").strip().lower() == "s"
-    chain_with_sources = get_rag_pipeline(force_regenerate=regenerate)
+    option = input("🔄 Deseja gerar os chunks novamente? (s = tudo, a = só PDFs novos/alterados, n): ").strip().lower()
+    chain_with_sources = get_rag_pipeline(force_regenerate=option == "s", update_index=option == "a")
     
     if not chain_with_sources:
         print("Não foi possível inicializar a pipeline.")
@@ -22,7 +22,7 @@ def main():
             print(t)
             print("\n" + "-" * 50 + "\n")
         for img in response["context"]["images"]:
-            display_base64_image(img)
+            display_image(img)
 
 if __name__ == "__main__":
     main()
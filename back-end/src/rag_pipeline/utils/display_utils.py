@@ -4,3 +4,6 @@ from IPython.display import Image, display
 def display_base64_image(base64_code):
     image_data = base64.b64decode(base64_code)
     display(Image(data=image_data))
+
+def display_image(image_data):
+    display(Image(data=image_data))
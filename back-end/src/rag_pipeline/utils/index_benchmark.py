@@ -0,0 +1,144 @@
+"""
+Benchmark dos backends de busca vetorial: compara o Chroma com o índice mmap
+(precisão cheia e quantizado, int8/binary + reordenação) e, com faiss-cpu
+instalado, FAISS flat/IVF/HNSW. Mede tamanho em disco, memória da primeira
+passada, latência por pergunta e recall@k em relação aos resultados do Chroma,
+para escolher VECTORSTORE_BACKEND conforme o tamanho do corpus.
+
+As perguntas são vetores da própria coleção com ruído gaussiano (sem chamar o
+provedor de embeddings), ou perguntas reais de um arquivo (uma por linha),
+embedadas com o modelo configurado como na API (``Pergunta: ...``, embedding
+de pergunta, não de documento: no Nomic, task_type search_query).
+
+Uso:
+    python -m rag_pipeline.utils.index_benchmark [--k 10] [--queries 200] [--questions perguntas.txt]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ..core.vector_backends import FAISS_FILE, FAISS_INDEX_TYPES, FaissBackend, NumpyBackend
+from ..core.vector_index import QUANTIZATIONS
+
+
+def _dir_bytes(path):
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+
+def _sample_queries(collection, n, noise, seed):
+    data = collection.get(include=["embeddings"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), n)]
+    scale = noise * np.linalg.norm(picked, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return picked + rng.standard_normal(picked.shape).astype(np.float32) * scale
+
+
+def _embed_questions(embeddings, questions):
+    """Vetores das perguntas como o retriever os calcula ao servir."""
+    payloads = [f"Pergunta: {q}" for q in questions]
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(payloads)
+    return [embeddings.embed_query(p) for p in payloads]
+
+
+def _latencies_ms(search, queries):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.95)]
+
+
+def _first_pass_bytes(store, index_dir):
+    """Bytes lidos na primeira passada: códigos quantizados, índice FAISS (em memória) ou vetores."""
+    if hasattr(store, "_faiss"):
+        return (Path(index_dir) / FAISS_FILE).stat().st_size
+    if store.quantization != "none":
+        return store._codes.nbytes
+    return store._vectors.nbytes
+
+
+def _recall(results, truth):
+    hits = [len(set(r) & set(t)) / len(t) for r, t in zip(results, truth) if t]
+    return sum(hits) / len(hits) if hits else 0.0
+
+
+def main():
+    from langchain_community.vectorstores import Chroma
+
+    from ..config import FAISS_EF_SEARCH, FAISS_HNSW_M, FAISS_NLIST, FAISS_NPROBE, MMAP_INDEX_DTYPE, get_runtime_chroma_path
+    from ..core.models import get_embeddings_model
+
+    parser = argparse.ArgumentParser(description="Compara os backends de busca vetorial (Chroma, NumPy, FAISS).")
+    parser.add_argument("--k", type=int, default=10, help="Vizinhos por pergunta (recall@k).")
+    parser.add_argument("--queries", type=int, default=200, help="Perguntas sintéticas (vetores da coleção + ruído).")
+    parser.add_argument("--noise", type=float, default=0.3, help="Ruído relativo das perguntas sintéticas.")
+    parser.add_argument("--questions", help="Arquivo com perguntas reais (uma por linha), embedadas com o modelo configurado.")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default=MMAP_INDEX_DTYPE)
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Candidatos reordenados = k x fator.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings = get_embeddings_model()
+    vectorstore = Chroma(
+        collection_name="multi_modal_rag",
+        embedding_function=embeddings,
+        persist_directory=get_runtime_chroma_path(),
+    )
+    collection = vectorstore._collection
+    count = collection.count()
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        queries = np.asarray(_embed_questions(embeddings, questions), dtype=np.float32)
+    else:
+        queries = _sample_queries(collection, args.queries, args.noise, args.seed)
+    k = min(args.k, count)
+
+    def chroma_search(query):
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["metadatas"])
+        return [m.get("doc_id") for m in result["metadatas"][0]]
+
+    truth = [chroma_search(q) for q in queries]
+    dim = queries.shape[1]
+    rows = [("chroma (float32)", _dir_bytes(get_runtime_chroma_path()), count * dim * 4,
+             *_latencies_ms(chroma_search, queries), 1.0)]
+
+    backends = [NumpyBackend(args.dtype, q, args.rescore_factor) for q in QUANTIZATIONS]
+    if FaissBackend.available():
+        backends += [
+            FaissBackend(args.dtype, t, FAISS_NLIST, FAISS_NPROBE, FAISS_HNSW_M, FAISS_EF_SEARCH)
+            for t in FAISS_INDEX_TYPES
+        ]
+    else:
+        print("[benchmark] faiss-cpu não instalado; FAISS fora da comparação.")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, backend in enumerate(backends):
+            index_dir = Path(tmp) / str(i)
+            backend.build(vectorstore, index_dir)
+            store = backend.load(index_dir, embeddings)
+
+            def search(query):
+                return store.search_doc_ids(query, k)[0]
+
+            recall = _recall([search(q) for q in queries], truth)
+            rows.append((backend.describe(), _dir_bytes(index_dir), _first_pass_bytes(store, index_dir),
+                         *_latencies_ms(search, queries), recall))
+
+    print(f"\nColeção: {count} vetores ({dim}d), {len(queries)} perguntas, k={k}\n")
+    header = f"{'backend':<36}{'disco (MB)':>12}{'1ª passada (MB)':>17}{'p50 (ms)':>10}{'p95 (ms)':>10}{'recall@k':>10}"
+    print(header)
+    print("-" * len(header))
+    for label, disk, first_pass, p50, p95, recall in rows:
+        print(f"{label:<36}{disk / 1e6:>12.2f}{first_pass / 1e6:>17.2f}{p50:>10.2f}{p95:>10.2f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
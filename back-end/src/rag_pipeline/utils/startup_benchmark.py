@@ -0,0 +1,99 @@
+"""
+Benchmark de cold start: mede, num processo Python novo, o tempo de import
+do módulo de entrada (padrão: a API), a memória residente e quais módulos
+pesados foram carregados. Opcionalmente mede também a inicialização da
+pipeline (``get_rag_components``).
+
+Uso:
+    python -m rag_pipeline.utils.startup_benchmark [--module rag_pipeline.api] [--init] [--runs 3] [--importtime 15]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+HEAVY_MODULES = [
+    "torch", "unstructured", "bs4", "cv2", "nltk",
+    "langchain_groq", "langchain_openai", "langchain_ollama", "chromadb",
+]
+
+_PROBE = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+__import__({module!r})
+import_seconds = time.perf_counter() - start
+init_seconds = None
+if {init!r}:
+    from rag_pipeline.core.retriever_pipeline import get_rag_components
+    start = time.perf_counter()
+    get_rag_components(False)
+    init_seconds = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print("__RESULT__" + json.dumps({{"import_seconds": import_seconds, "init_seconds": init_seconds,
+                                  "max_rss_mb": rss_mb, "heavy_modules": heavy}}))
+"""
+
+
+def _src_dir():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = _src_dir() + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def run_probe(module, init=False):
+    """Roda o import num subprocesso novo e retorna as medidas."""
+    code = _PROBE.format(module=module, init=init, heavy=HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=_env())
+    for line in proc.stdout.splitlines():
+        if line.startswith("__RESULT__"):
+            return json.loads(line[len("__RESULT__"):])
+    raise RuntimeError(f"Falha ao importar {module}:\n{proc.stderr[-2000:]}")
+
+
+def slowest_imports(module, top=15):
+    """Os ``top`` imports mais lentos (tempo cumulativo, em s) segundo ``-X importtime``."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=_env())
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.+)", line)
+        if m:
+            rows.append((int(m.group(2)) / 1e6, m.group(3).strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o cold start (import + init) da API.")
+    parser.add_argument("--module", default="rag_pipeline.api", help="Módulo de entrada a importar.")
+    parser.add_argument("--init", action="store_true", help="Mede também get_rag_components (precisa do índice).")
+    parser.add_argument("--runs", type=int, default=3, help="Número de processos novos a medir.")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="Lista os N imports mais lentos (-X importtime).")
+    args = parser.parse_args()
+
+    results = [run_probe(args.module, args.init) for _ in range(args.runs)]
+    import_times = sorted(r["import_seconds"] for r in results)
+    print(f"Módulo: {args.module} ({args.runs} execuções)")
+    print(f"Import: mediana {import_times[len(import_times) // 2]:.3f}s, mín {import_times[0]:.3f}s, máx {import_times[-1]:.3f}s")
+    if args.init:
+        init_times = sorted(r["init_seconds"] for r in results)
+        print(f"Inicialização da pipeline: mediana {init_times[len(init_times) // 2]:.3f}s")
+    print(f"RSS máximo: {max(r['max_rss_mb'] for r in results):.1f} MB")
+    heavy = results[-1]["heavy_modules"]
+    print(f"Módulos pesados carregados: {', '.join(heavy) if heavy else 'nenhum'}")
+
+    if args.importtime:
+        print("\nImports mais lentos (cumulativo):")
+        for seconds, name in slowest_imports(args.module, args.importtime):
+            print(f"  {seconds:8.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
+from ..core.doc_values import to_base64
 from ..core.prompt_utils import parse_docs
 
 def test_response_with_openai(retriever):
@@ -24,7 +25,7 @@ def test_response_with_openai(retriever):
             """}
         ]
         for image in docs["images"]:
-            prompt_content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image}"}})
+            prompt_content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{to_base64(image)}"}})
         return ChatPromptTemplate.from_messages([HumanMessage(content=prompt_content)])
 
     return {
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# Os testes importam o pacote direto de back-end/src, como a imagem do Lambda
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# config.py exige estas variáveis no import; os testes não chamam modelos
+for name, value in (("GROQ_API_KEY", "teste"), ("OLLAMA_BASE_URL", "http://localhost:11434"), ("MODEL_PROVIDER", "ollama")):
+    os.environ.setdefault(name, value)
@@ -0,0 +1,64 @@
+import re
+
+import pytest
+
+from rag_pipeline.core import context_packer
+from rag_pipeline.core.context_packer import count_tokens, pack_context, truncate_to_tokens
+
+
+class WordEncoder:
+    """Tokenizer de teste: uma palavra (com o espaço seguinte) por token."""
+
+    def encode(self, text, disallowed_special=()):
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def context(texts):
+    return {"texts": texts, "images": [], "image_ids": []}
+
+
+def test_output_keeps_rank_order():
+    # O 2º é quase cópia do 1º: o MMR prefere o 3º (diverso) antes dele, mas a saída segue o ranking
+    texts = [
+        "matrícula de calouros no primeiro quadrimestre de 2025 pelo portal do aluno",
+        "matrícula de calouros no primeiro quadrimestre de 2025 pelo portal do aluno, turma noturna",
+        "ônibus fretado entre os campi de Santo André e São Bernardo",
+        "bolsas de iniciação científica com inscrições abertas em março",
+    ]
+    packed = pack_context(context(texts), budget=10_000, dedup_threshold=1.1, mmr_lambda=0.3, provider="groq")
+    assert packed["texts"] == texts
+
+
+def test_budget_picks_chunks_but_keeps_their_order():
+    texts = ["a " * 40, "b " * 40, "c " * 40]
+    budget = count_tokens(texts[0], "groq") + count_tokens(texts[2], "groq")
+    packed = pack_context(context(texts), budget=budget, dedup_threshold=1.1, mmr_lambda=1.0, provider="groq")
+    assert packed["texts"] == texts[:2]
+    assert packed["packing"]["tokens_out"] <= budget
+
+
+def test_duplicates_are_dropped():
+    text = "calendário acadêmico com as datas de rematrícula e ajuste de turmas do quadrimestre"
+    packed = pack_context(context([text, text + ".", "outro assunto completamente diferente"]), provider="groq")
+    assert packed["texts"] == [text, "outro assunto completamente diferente"]
+    assert packed["packing"]["dropped_duplicates"] == 1
+
+
+@pytest.mark.parametrize("provider", ["groq", "openai"])
+def test_truncated_chunk_fits_budget(provider, monkeypatch):
+    monkeypatch.setattr(context_packer, "_encoder", WordEncoder())
+    text = "palavra " * 500
+    for budget in (1, 7, 50):
+        packed = pack_context(context([text]), budget=budget, provider=provider)
+        assert len(packed["texts"]) == 1 and text.startswith(packed["texts"][0])
+        assert count_tokens(packed["texts"][0], provider) <= budget
+        assert packed["packing"]["tokens_out"] <= budget
+
+
+def test_truncate_to_tokens_with_encoder(monkeypatch):
+    monkeypatch.setattr(context_packer, "_encoder", WordEncoder())
+    assert truncate_to_tokens("um dois três quatro", 2, "openai") == "um dois "
+    assert truncate_to_tokens("um dois", 5, "openai") == "um dois"
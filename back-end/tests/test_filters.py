@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from rag_pipeline.core.filters import FILTERABLE_FIELDS, INT_FIELDS, MISSING_INT, matches, normalize_where, present_fields, where_mask
+
+METADATA = [
+    {"modality": "text", "department": "Matrícula", "year": 2025, "source": "Matrícula/faq.pdf", "page": 1},
+    {"modality": "table", "department": "Matrícula", "year": 2025, "source": "Matrícula/faq.pdf", "page": 3},
+    {"modality": "image", "department": "Fretado", "year": 2024, "source": "Fretado/onibus.pdf", "page": 2},
+    {"modality": "text", "department": "Fretado", "source": "Fretado/transportes.pdf", "page": 1},
+    {"modality": "text", "source": "calendario.pdf", "page": 4},
+    # Caches gravados antes de o departamento vazio ser omitido
+    {"modality": "text", "department": "", "source": "raiz.pdf", "page": 1},
+    # Índices antigos: só a modalidade
+    {"modality": "table"},
+    {},
+]
+
+WHERES = [
+    {"modality": "table"},
+    {"modality": {"$ne": "text"}},
+    {"department": {"$ne": "Matrícula"}},
+    {"department": {"$nin": ["Fretado"]}},
+    {"department": {"$in": ["Fretado", "Reitoria"]}},
+    {"year": 2025},
+    {"year": "2024"},
+    {"year": {"$gte": 2025}},
+    {"year": {"$lt": 2025}},
+    {"year": {"$ne": 2025}},
+    {"page": {"$in": [1, 2]}},
+    {"page": {"$nin": [1]}},
+    {"modality": "text", "page": 1},
+    {"$or": [{"modality": "image"}, {"year": 2025}]},
+    {"$and": [{"department": "Fretado"}, {"$or": [{"page": 1}, {"year": {"$gt": 2020}}]}]},
+    {"$or": [{"source": "calendario.pdf"}]},
+]
+
+
+def columns_of(metadata):
+    """Colunas como ``export_vector_index`` grava no índice mmap."""
+    columns = {}
+    for field in FILTERABLE_FIELDS:
+        missing = MISSING_INT if field in INT_FIELDS else ""
+        dtype = np.int32 if field in INT_FIELDS else np.str_
+        columns[field] = np.array([m.get(field, missing) for m in metadata], dtype=dtype)
+    return columns
+
+
+@pytest.mark.parametrize("where", WHERES)
+def test_where_mask_agrees_with_matches(where):
+    where = normalize_where(where)
+    expected = [matches(m, where) for m in METADATA]
+    assert where_mask(columns_of(METADATA), where, len(METADATA)).tolist() == expected
+
+
+def test_missing_field_never_matches():
+    where = normalize_where({"department": {"$ne": "Matrícula"}})
+    assert [matches(m, where) for m in METADATA] == [False, False, True, True, False, False, False, False]
+    assert not matches({"department": ""}, where)
+
+
+def test_column_absent_from_index():
+    where = normalize_where({"year": {"$ne": 2025}})
+    columns = {"modality": columns_of(METADATA)["modality"]}
+    assert not where_mask(columns, where, len(METADATA)).any()
+
+
+def test_no_filter():
+    assert normalize_where(None) is None and normalize_where({}) is None
+    assert matches({}, None)
+    assert where_mask({}, None, 3).tolist() == [True, True, True]
+
+
+def test_normalize_where():
+    assert normalize_where({"modality": "table", "year": "2025"}) == {
+        "$and": [{"modality": {"$eq": "table"}}, {"year": {"$eq": 2025}}]
+    }
+    assert normalize_where({"$or": [{"page": 2}]}) == {"page": {"$eq": 2}}
+
+
+@pytest.mark.parametrize("where", [
+    "modality",
+    {"autor": "x"},
+    {"year": "dois mil"},
+    {"modality": 1},
+    {"modality": {"$regex": "t"}},
+    {"modality": {"$eq": "text", "$ne": "table"}},
+    {"page": {"$in": []}},
+    {"$and": []},
+])
+def test_invalid_filters(where):
+    with pytest.raises(ValueError):
+        normalize_where(where)
+
+
+def test_present_fields():
+    assert present_fields(METADATA) == {"modality", "department", "year", "source", "page"}
+    assert present_fields([{"modality": "table"}, {"department": ""}, {}]) == {"modality"}
+    assert present_fields([]) == frozenset()
+
+
+@pytest.mark.parametrize("where", [
+    {"year": 2025},
+    {"modality": "text", "department": "Fretado"},
+    {"$or": [{"modality": "image"}, {"page": {"$gt": 1}}]},
+])
+def test_field_absent_from_index_is_rejected(where):
+    with pytest.raises(ValueError, match="Campos disponíveis: modality"):
+        normalize_where(where, frozenset({"modality"}))
+
+
+def test_available_fields_accept_filter():
+    where = {"modality": "table", "year": 2025}
+    assert normalize_where(where, present_fields(METADATA)) == normalize_where(where)
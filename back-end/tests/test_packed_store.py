@@ -0,0 +1,99 @@
+import pytest
+
+from rag_pipeline.core.packed_store import PackedFileStore, migrate_docstore
+
+
+@pytest.fixture(params=["none", "zlib"])
+def store(request, tmp_path):
+    return PackedFileStore(tmp_path / "docstore.pack", request.param)
+
+
+def reopen(store):
+    store.close()
+    return PackedFileStore(store.path, store.compression)
+
+
+def test_mset_mget(store):
+    store.mset([("a", b"um"), ("b", b"dois" * 1000), ("c", b"")])
+    assert store.mget(["c", "x", "a", "b"]) == [b"", None, b"um", b"dois" * 1000]
+    assert len(store) == 3
+    assert reopen(store).mget(["a", "b", "c"]) == [b"um", b"dois" * 1000, b""]
+
+
+def test_overwrite_keeps_last_version(store):
+    store.mset([("a", b"v1"), ("b", b"b")])
+    store.mset([("a", b"v2")])
+    assert store.mget(["a", "b"]) == [b"v2", b"b"]
+    assert len(store) == 2
+    assert reopen(store).mget(["a"]) == [b"v2"]
+
+
+def test_mdelete(store):
+    store.mset([("a", b"1"), ("b", b"2")])
+    store.mdelete(["a", "inexistente"])
+    assert store.mget(["a", "b"]) == [None, b"2"]
+    assert sorted(store.yield_keys()) == ["b"]
+    reopened = reopen(store)
+    assert reopened.mget(["a", "b"]) == [None, b"2"]
+    # Regravar uma chave apagada a traz de volta
+    reopened.mset([("a", b"3")])
+    assert reopen(reopened).mget(["a"]) == [b"3"]
+
+
+def test_compact_drops_old_versions(store):
+    store.mset([("a", b"x" * 5000), ("b", b"y" * 5000), ("c", b"z")])
+    store.mset([("a", b"novo")])
+    store.mdelete(["b"])
+    size = store.path.stat().st_size
+    store.compact()
+    assert store.path.stat().st_size < size
+    assert store.mget(["a", "b", "c"]) == [b"novo", None, b"z"]
+    assert not store.path.with_name(store.path.name + ".compact").exists()
+    assert reopen(store).mget(["a", "b", "c"]) == [b"novo", None, b"z"]
+
+
+def test_compact_empty_store(store):
+    store.mset([("a", b"1")])
+    store.mdelete(["a"])
+    store.compact()
+    assert len(store) == 0
+    assert len(reopen(store)) == 0
+
+
+def test_torn_index_line_is_ignored(store):
+    store.mset([("a", b"1"), ("b", b"2")])
+    # Gravação interrompida no meio da linha do índice
+    with open(store.index_path, "a", encoding="utf-8") as f:
+        f.write('{"key": "c", "offs')
+    reopened = reopen(store)
+    assert reopened.mget(["a", "b", "c"]) == [b"1", b"2", None]
+    assert len(reopened) == 2
+
+
+def test_index_entry_past_end_of_data_is_ignored(store):
+    store.mset([("a", b"1")])
+    store.mset([("b", b"valor longo")])
+    # Dados cortados depois do índice gravado (ex.: cópia parcial do arquivo)
+    with open(store.path, "r+b") as f:
+        f.truncate(store.path.stat().st_size - 1)
+    assert reopen(store).mget(["a", "b"]) == [b"1", None]
+
+
+def test_mget_reads_distant_values(store, monkeypatch):
+    monkeypatch.setattr("rag_pipeline.core.packed_store.READ_GAP_BYTES", 1)
+    pairs = [(f"k{i}", bytes([i]) * (i + 1)) for i in range(20)]
+    store.mset(pairs)
+    keys = [k for k, _ in reversed(pairs)]
+    assert store.mget(keys) == [v for _, v in reversed(pairs)]
+
+
+def test_migrate_docstore(store, tmp_path):
+    source = PackedFileStore(tmp_path / "origem.pack", "none")
+    source.mset([(f"k{i}", str(i).encode()) for i in range(7)])
+    assert migrate_docstore(source, store, batch_size=3) == 7
+    assert store.mget([f"k{i}" for i in range(7)]) == [str(i).encode() for i in range(7)]
+
+
+def test_invalid_compression(tmp_path):
+    with pytest.raises(ValueError):
+        PackedFileStore(tmp_path / "docstore.pack", "gzip")
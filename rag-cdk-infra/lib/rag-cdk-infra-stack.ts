@@ -50,6 +50,11 @@ export class RagCdkInfraStack extends cdk.Stack {
         MODEL_PROVIDER: "openai",
         EMBEDDINGS_PROVIDER: "nomic", 
         NOMIC_KEY: envVars.NOMIC_KEY || "",
+        // Busca no índice mmap (sem copiar o Chroma p/ /tmp). O índice e o BM25 são gerados no
+        // build da imagem (RUN do Dockerfile), já que o Lambda não escreve em .cache_chunks
+        USE_MMAP_INDEX: "true",
+        // Embeddings de perguntas reaproveitados entre invocações quentes
+        QUERY_EMBEDDING_CACHE_DIR: "/tmp/query_embeddings",
         TABLE_NAME: envVars.TABLE_NAME || "",
         NLTK_DATA: "/tmp/nltk_data",
         MPLCONFIGDIR: "/tmp/matplotlib",
@@ -75,6 +80,8 @@ export class RagCdkInfraStack extends cdk.Stack {
       deployOptions: {
         stageName: "prod",
       },
+      // Imagens de /assets/{doc_id} voltam do Mangum em base64 e são decodificadas pelo API Gateway
+      binaryMediaTypes: ["image/*"],
     });
 
     const lambdaIntegration = new apigateway.LambdaIntegration(apiFunction, {
@@ -86,9 +93,18 @@ export class RagCdkInfraStack extends cdk.Stack {
 
     const askResource = api.root.addResource("ask");
     askResource.addMethod("POST", lambdaIntegration, { apiKeyRequired: true });
+    // API Gateway REST não faz response streaming: o corpo SSE chega bufferizado.
+    askResource.addResource("stream").addMethod("POST", lambdaIntegration, { apiKeyRequired: true });
+    askResource.addResource("batch").addMethod("POST", lambdaIntegration, { apiKeyRequired: true });
+
+    // Exige x-api-key, que um <img src> não envia: o cliente busca com fetch + header (blob URL)
+    // ou passa por um proxy com a chave (ASSETS_BASE_URL no back-end aponta para ele).
+    const assetsResource = api.root.addResource("assets").addResource("{doc_id}");
+    assetsResource.addMethod("GET", lambdaIntegration, { apiKeyRequired: true });
 
     const chatResource = api.root.addResource("chat");
     chatResource.addMethod("POST", lambdaIntegration, { apiKeyRequired: true });
+    chatResource.addResource("stream").addMethod("POST", lambdaIntegration, { apiKeyRequired: true });
 
     // Ensure API_KEY is defined
     const apiKeyValue = envVars.API_KEY;